@@ -3,12 +3,26 @@ import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import datetime
+import uuid
+
 import pandas as pd
-import pulp
 import streamlit as st
 
+from src.shift_scheduler import solve_service
+from src.shift_scheduler.greedy import greedy_schedule
+from src.shift_scheduler.history import HistoryStore, calendar_weekend_dates
+from src.shift_scheduler.profiler import PhaseProfiler
+from src.shift_scheduler.result_store import ResultStore
+from src.shift_scheduler.schedule_checker import ScheduleChecker
 from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+from src.shift_scheduler.validator import load_schedule, validate
+from src.shift_scheduler.workbook import read_workbook
 
+# アプリ側（CSV・ワークブックの読み込み）の処理時間の計測
+perf = PhaseProfiler()
+# 最適化結果はディスクに保存し、session_stateにはハンドルだけを持つ
+result_store = ResultStore.default()
 
 # タイトル
 st.title("シフトスケジューリングアプリ")
@@ -17,16 +31,44 @@ st.title("シフトスケジューリングアプリ")
 st.sidebar.header("データのアップロード")
 calendar_file = st.sidebar.file_uploader("カレンダー", type=["csv"])
 staff_file = st.sidebar.file_uploader("スタッフ", type=["csv"])
+external_schedule_file = st.sidebar.file_uploader("検証するシフト表", type=["csv"])
+# スタッフ・カレンダー・ペナルティ・休暇希望のシートを持つ1つのワークブック
+workbook_file = st.sidebar.file_uploader("ワークブック", type=["xlsx"])
+
+# ピークメモリの計測（tracemallocを使うため、読み込みと最適化が遅くなる）
+perf.trace_memory = st.sidebar.checkbox(
+    "メモリ使用量を計測する", value=perf.trace_memory
+)
+
+# ワークブックがあれば、カレンダーとスタッフのCSVの代わりにそのシートを使う
+# （同じファイルの解析結果はキャッシュされ、再実行のたびに読み直さない）
+workbook_penalty = {}
+workbook_ng_date = {}
+if workbook_file is not None:
+    with perf.phase("read_workbook"):
+        (
+            workbook_staff,
+            workbook_calendar,
+            workbook_penalty,
+            workbook_ng_date,
+        ) = read_workbook(workbook_file.getvalue())
+    calendar_file = staff_file = workbook_file
 
 # タブ
-tab1, tab2, tab3 = st.tabs(["カレンダー情報", "スタッフ情報", "シフト表作成"])
+tab1, tab2, tab3, tab4 = st.tabs(
+    ["カレンダー情報", "スタッフ情報", "シフト表作成", "シフト表の検証"]
+)
 
 with tab1:
     if calendar_file is None:
         st.write("カレンダー情報をアップロードしてください")
     else:
         st.markdown("## カレンダー情報")
-        calendar_data = pd.read_csv(calendar_file)
+        if workbook_file is not None:
+            calendar_data = workbook_calendar
+        else:
+            with perf.phase("read_csv_calendar"):
+                calendar_data = pd.read_csv(calendar_file)
         st.table(calendar_data)
 
 with tab2:
@@ -34,7 +76,11 @@ with tab2:
         st.write("スタッフ情報をアップロードしてください")
     else:
         st.markdown("## スタッフ情報")
-        staff_data = pd.read_csv(staff_file)
+        if workbook_file is not None:
+            staff_data = workbook_staff
+        else:
+            with perf.phase("read_csv_staff"):
+                staff_data = pd.read_csv(staff_file)
         st.table(staff_data)
 
         ## 休暇希望の設定
@@ -43,17 +89,28 @@ with tab2:
             st.write("カレンダー情報をアップロードしてください")
         else:
             staff_ng_date_radio_button = {}
+            # calendar_builderで作ったカレンダーは日付が日番号なので、年月日を表示する
+            date_labels = {}
+            if "年月日" in calendar_data.columns:
+                date_labels = dict(zip(calendar_data["日付"], calendar_data["年月日"]))
+            ng_date_options = ["すべてOK"] + [
+                calendar_data.loc[j, "日付"] for j in range(calendar_data.shape[0])
+            ]
             # スタッフIDごとにいずれかの日付、またはすべてOKにするためのラジオボタンを作成
+            # （ワークブックの休暇希望のシートにあれば、その日付を初期値にする）
             for i in range(len(staff_data)):
                 staff_id = staff_data.loc[i, "スタッフID"]
+                ng_date = workbook_ng_date.get(staff_id, "すべてOK")
                 st.write()
                 staff_ng_date_radio_button[staff_id] = st.radio(
                     staff_id,
-                    ["すべてOK"]
-                    + [
-                        calendar_data.loc[j, "日付"]
-                        for j in range(calendar_data.shape[0])
-                    ],
+                    ng_date_options,
+                    index=(
+                        ng_date_options.index(ng_date)
+                        if ng_date in ng_date_options
+                        else 0
+                    ),
+                    format_func=lambda d: str(date_labels.get(d, d)),
                     horizontal=True,
                 )
 
@@ -70,71 +127,275 @@ with tab3:
                 f"{row['スタッフID']}の希望違反ペナルティ",
                 0,  # 最小値
                 100,  # 最大値
-                50,  # デフォルト値は50
+                # デフォルト値は50（ワークブックのペナルティのシートにあればその値）
+                int(workbook_penalty.get(row["スタッフID"], 50)),
                 key=row["スタッフID"],
             )
         # 希望休暇ペナルティをStreamlitのレバーで設定
         penalty_off = st.slider("希望休暇ペナルティ", 0, 100, 50)
+
+        # 過去の勤務履歴（history.pyで取り込んだもの）があれば、
+        # 出勤日数・土日の出勤日数・休暇希望の違反の偏りを公平性のコストにできる
+        history_df = None
+        history_weekend = []
+        history_store = HistoryStore.default()
+        if history_store is not None and st.checkbox(
+            "過去の勤務履歴で公平性を考慮する"
+        ):
+            history_year = st.number_input(
+                "シフト表の年（土日の判定に使う）",
+                2000,
+                2100,
+                datetime.date.today().year,
+            )
+            try:
+                history_weekend = calendar_weekend_dates(
+                    calendar_data, int(history_year)
+                )
+                history_df = history_store.load()
+            except ValueError as e:
+                st.warning(f"土日を判定できないため、勤務履歴は使いません: {e}")
+
+        # 最適化の前に、貪欲法で作ったシフト表をすぐに表示する
+        with st.expander("シフト表のプレビュー（貪欲法）"):
+            preview_scheduler = ShiftScheduler()
+            preview_scheduler.telemetry = None
+            preview_scheduler.set_data(
+                staff_data,
+                calendar_data,
+                staff_penalty,
+                staff_ng_date_radio_button,
+                penalty_off,
+            )
+            if history_df is not None:
+                preview_scheduler.set_history(history_df, history_weekend)
+            preview_df, preview_feasible = greedy_schedule(preview_scheduler)
+            if not preview_feasible:
+                st.warning("貪欲法では必要人数を満たせませんでした")
+            st.write("目的関数値:", preview_scheduler.evaluate(preview_df))
+            st.dataframe(preview_df.astype(bool))
+
+        # 目的関数値が同じシフト表の候補をいくつ求めるか
+        pool_size = st.number_input("シフト表の候補数", 1, 10, 1)
+        # 下書きはLP緩和を丸めるため速いが、最適とは限らない
+        draft_mode = (
+            st.radio(
+                "最適化モード",
+                ["厳密解", "下書き（LP緩和）"],
+                horizontal=True,
+            )
+            != "厳密解"
+        )
         optimize_button = st.button("最適化実行")
         if optimize_button:
-            # ShiftSchedulerクラスのインスタンスを作成
-            shift_scheduler = ShiftScheduler()
-            # データをセット
-            shift_scheduler.set_data(
+            # 最適化サービスに送るデータを作成
+            payload = solve_service.build_payload(
                 staff_data,
                 calendar_data,
                 staff_penalty,
                 staff_ng_date_radio_button,  # 休暇希望のラジオボタン
                 penalty_off,  # 休暇希望のペナルティ
             )
-            # モデルを構築
-            shift_scheduler.build_model()
-            # 最適化を実行
-            shift_scheduler.solve()
+            payload["pool_size"] = int(pool_size)
+            payload["relaxed"] = draft_mode
+            # 必要人数と希望出勤日数の限界値もサービス側で求める
+            payload["sensitivity"] = True
+            payload["profile_memory"] = perf.trace_memory
+            if history_df is not None:
+                payload["history"] = solve_service.encode_frame(history_df)
+                payload["weekend_dates"] = [str(d) for d in history_weekend]
+            # セッションごとのIDで最適化サービスのキューを分ける
+            if "client_id" not in st.session_state:
+                st.session_state["client_id"] = str(uuid.uuid4())
+            result = None
+            try:
+                # 最適化サービスで最適化を実行
+                result = solve_service.submit(
+                    payload, client_id=st.session_state["client_id"]
+                )
+            except OSError:
+                # アプリ内での最適化は、環境変数で有効にした場合だけ行う
+                # （セッションごとにCBCが動くとマシンが過負荷になるため）
+                if solve_service.local_fallback_enabled():
+                    st.warning(
+                        "最適化サービスに接続できないため、アプリ内で最適化を実行します"
+                    )
+                    result = solve_service.solve_local(payload)
+                else:
+                    st.error(
+                        "最適化サービスに接続できません。"
+                        "python -m src.shift_scheduler.solve_service で起動してください"
+                    )
+
+            if result is not None:
+                # 候補の切り替えで再実行されても結果が消えないように、ディスクに保存する
+                artifacts = {
+                    name: result.get(name)
+                    for name in ["status", "objective", "objectives", "gap", "perf"]
+                }
+                artifacts["queue_time"] = result.get("queue_time", 0.0)
+                artifacts["solve_time"] = result.get("solve_time")
+                artifacts["num_candidates"] = len(result["sch_pool"])
+                for i, candidate_df in enumerate(result["sch_pool"]):
+                    artifacts[f"schedule_{i}"] = candidate_df
+                for name in ["lp_bound", "sensitivity_dates", "sensitivity_staff"]:
+                    if name in result:
+                        artifacts[name] = result[name]
+                previous = st.session_state.get("result")
+                if previous is not None:
+                    result_store.remove(previous)
+                st.session_state["result"] = result_store.put(artifacts)
+                # 前回の結果に対する手修正の内容は破棄する
+                for key in list(st.session_state.keys()):
+                    if key.startswith("editor_"):
+                        del st.session_state[key]
 
+        result = None
+        if "result" in st.session_state:
+            result = result_store.meta(st.session_state["result"])
+            if result is None:
+                del st.session_state["result"]
+                st.session_state.pop("checkers", None)
+                st.warning(
+                    "保存期間が過ぎたため最適化結果が削除されました。再度最適化してください"
+                )
+        if result is not None:
+            handle = st.session_state["result"]
             st.markdown("## 最適化結果")
 
             # 最適化結果の出力
-            st.write("実行ステータス:", pulp.LpStatus[shift_scheduler.status])
-            st.write("目的関数値:", pulp.value(shift_scheduler.model.objective))
+            st.write("実行ステータス:", result["status"])
+            st.write("目的関数値:", result["objective"])
+            if result.get("gap") is not None:
+                st.write("下界との差（相対）:", result["gap"])
 
             st.markdown("## シフト表")
-            st.table(shift_scheduler.sch_df)
+            # 候補が複数ある場合は、表示するシフト表を切り替える
+            selected = st.radio(
+                "表示するシフト表",
+                range(result["num_candidates"]),
+                format_func=lambda i: f"候補{i + 1}（目的関数値: {result['objectives'][i]}）",
+                horizontal=True,
+            )
+            # 選んだ候補のシフト表だけをディスクから読む
+            # （限界値の表もこの時点で読み、以降は読み直さない）
+            sch_df = result_store.frame(handle, f"schedule_{selected}")
+            sensitivity_frames = {
+                name: result_store.frame(handle, name)
+                for name in ["sensitivity_dates", "sensitivity_staff"]
+                if result.get("lp_bound") is not None
+            }
+            if sch_df is None or any(df is None for df in sensitivity_frames.values()):
+                # meta()で読んだ後に、保存期間や容量の上限で削除された場合
+                result_store.remove(handle)
+                del st.session_state["result"]
+                st.session_state.pop("checkers", None)
+                st.warning(
+                    "最適化結果が保存先から削除されたため表示できません。再度最適化してください"
+                )
+                result = None
+
+        if result is not None:
+            # チェッカーは最適化結果と候補ごとにセッションに保持し、再実行のたびには作り直さない
+            # （ペナルティなどの入力が変わった場合だけ作り直す）
+            # 手修正の内容はデータエディタの状態に残っているため、前回から変わったマスだけを反映する
+            inputs = (
+                tuple(staff_penalty.items()),
+                tuple(staff_ng_date_radio_button.items()),
+                penalty_off,
+            )
+            checkers = {
+                key: value
+                for key, value in st.session_state.get("checkers", {}).items()
+                if key[0] == handle
+            }
+            if checkers.get((handle, selected), (None,))[0] != inputs:
+                checkers[handle, selected] = (
+                    inputs,
+                    ScheduleChecker(
+                        sch_df,
+                        staff_data,
+                        calendar_data,
+                        staff_ng_date_radio_button,
+                        staff_penalty,
+                        penalty_off,
+                    ),
+                )
+            st.session_state["checkers"] = checkers
+            checker = checkers[handle, selected][1]
+
+            # シフト表を編集可能な表で表示し、修正したマスだけをチェッカーに反映する
+            editor_key = f"editor_{selected}"
+            st.data_editor(sch_df.astype(bool), key=editor_key)
+            edited_rows = st.session_state.get(editor_key, {}).get("edited_rows", {})
+            checker.sync_editor(edited_rows)
+
+            st.markdown("## 制約の充足確認")
+            st.table(pd.Series(checker.summary(), name="値"))
 
             st.markdown("## シフト数の充足確認")
             # 各スタッフの合計シフト数をstreamlitのbar chartで表示
-            shift_sum = shift_scheduler.sch_df.sum(axis=1)
+            shift_sum = pd.Series(checker.staff_total, index=checker.S)
             st.bar_chart(shift_sum)
 
             st.markdown("## スタッフの希望の確認")
             # 各スロットの合計シフト数をstreamlitのbar chartで表示
-            shift_sum_slot = shift_scheduler.sch_df.sum(axis=0)
+            shift_sum_slot = pd.Series(checker.date_total, index=checker.D)
             st.bar_chart(shift_sum_slot)
 
-            st.markdown("## 責任者の合計シフト数の充足確認")
-            # shift_scheduleに対してstaff_dataをマージして責任者の合計シフト数を計算
-            shift_schedule_with_staff_data = pd.merge(
-                shift_scheduler.sch_df,
-                staff_data,
-                left_index=True,
-                right_on="スタッフID",
-            )
-            shift_chief_only = shift_schedule_with_staff_data.query("責任者フラグ == 1")
-            shift_chief_only = shift_chief_only.drop(
-                columns=[
-                    "スタッフID",
-                    "責任者フラグ",
-                    "希望最小出勤日数",
-                    "希望最大出勤日数",
-                ]
-            )
-            shift_chief_sum = shift_chief_only.sum(axis=0)
-            st.bar_chart(shift_chief_sum)
+            st.markdown("## 責任者などスキルごとの合計シフト数の充足確認")
+            # 各日のスキルごとの合計シフト数をstreamlitのbar chartで表示
+            st.bar_chart(checker.date_skill_frame())
 
-            # シフト表のダウンロード
+            # シフト表（手修正を含む）のダウンロード
             st.download_button(
                 label="シフト表をダウンロード",
-                data=shift_scheduler.sch_df.to_csv().encode("utf-8"),
+                data=checker.to_frame().to_csv().encode("utf-8"),
                 file_name="output.csv",
                 mime="text/csv",
             )
+
+            # 必要人数・希望出勤日数を1増やしたときの目的関数値の増分（LP緩和の双対変数）
+            with st.expander("必要人数と希望出勤日数の限界値（シャドウプライス）"):
+                if result.get("lp_bound") is None:
+                    st.write("LP緩和が解けなかったため、限界値を計算できませんでした")
+                else:
+                    st.write("LP緩和の目的関数値:", result["lp_bound"])
+                    st.markdown("### 日ごとの必要人数を1人増やした場合")
+                    st.bar_chart(sensitivity_frames["sensitivity_dates"])
+                    st.table(sensitivity_frames["sensitivity_dates"])
+                    st.markdown("### スタッフごとの希望出勤日数を1日増やした場合")
+                    st.table(sensitivity_frames["sensitivity_staff"])
+
+            # 今回の実行の処理時間とモデルサイズ
+            with st.expander("パフォーマンス"):
+                phases = dict(perf.phases)
+                phases.update(result["perf"]["phases"])
+                st.table(pd.DataFrame.from_dict(phases, orient="index"))
+                st.write("モデルサイズ:", result["perf"]["model_size"])
+                st.write("最適化サービスの待ち時間[秒]:", result.get("queue_time", 0))
+
+with tab4:
+    if external_schedule_file is None:
+        st.write("検証するシフト表をアップロードしてください")
+    elif staff_file is None or calendar_file is None:
+        st.write("スタッフ情報とカレンダー情報をアップロードしてください")
+    else:
+        # 他のツールで作成したシフト表を、シフト表作成タブと同じペナルティで採点
+        report = validate(
+            load_schedule(external_schedule_file),
+            staff_data,
+            calendar_data,
+            staff_penalty,
+            staff_ng_date_radio_button,
+            penalty_off,
+        )
+        for error in report["errors"]:
+            st.error(error)
+        st.write("制約の充足:", "OK" if report["feasible"] else "NG")
+        st.write("目的関数値:", report["objective"])
+
+        st.markdown("## 日ごとの充足")
+        st.table(report["dates"])
+        st.markdown("## スタッフごとの希望違反")
+        st.table(report["staff"])
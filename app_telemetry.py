@@ -0,0 +1,96 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+import japanize_matplotlib  # noqa: F401
+import matplotlib.pyplot as plt
+import pandas as pd
+import streamlit as st
+
+from src.shift_scheduler.telemetry import DEFAULT_PATH, TelemetryStore
+
+# タイトル
+st.title("最適化の実行履歴")
+
+# サイドバー
+st.sidebar.header("実行履歴")
+telemetry_path = st.sidebar.text_input(
+    "実行履歴のファイル", os.environ.get("SHIFT_TELEMETRY_DB") or DEFAULT_PATH
+)
+
+if not os.path.isfile(telemetry_path):
+    st.write("実行履歴がありません")
+    st.stop()
+
+telemetry_df = TelemetryStore(telemetry_path).load()
+if telemetry_df.empty:
+    st.write("実行履歴がありません")
+    st.stop()
+
+# ソルバーとインスタンス名で絞り込み
+backends = st.sidebar.multiselect(
+    "ソルバー", telemetry_df["backend"].unique().tolist(), default=None
+)
+if backends:
+    telemetry_df = telemetry_df[telemetry_df["backend"].isin(backends)]
+
+st.markdown("## 概要")
+col1, col2, col3 = st.columns(3)
+col1.metric("実行回数", len(telemetry_df))
+col2.metric("打ち切り率", f"{telemetry_df['limit_reached'].mean():.1%}")
+col3.metric("処理時間の中央値[秒]", f"{telemetry_df['total_time'].median():.2f}")
+
+st.markdown("## インスタンスの大きさと処理時間")
+# スタッフ数×日数に対する処理時間の散布図
+fig, ax = plt.subplots()
+for limit_reached, group in telemetry_df.groupby("limit_reached"):
+    ax.scatter(
+        group["size"],
+        group["total_time"],
+        label="打ち切り" if limit_reached else "完了",
+        alpha=0.6,
+    )
+ax.set_xscale("log")
+ax.set_yscale("log")
+ax.set_xlabel("スタッフ数×日数")
+ax.set_ylabel("処理時間[秒]")
+ax.legend()
+st.pyplot(fig)
+
+st.markdown("## 大きさごとの処理時間のパーセンタイル")
+# スタッフ数×日数を対数スケールで区切り、各区間の処理時間のパーセンタイルを計算
+size_bins = [0, 100, 1000, 10000, 100000, float("inf")]
+telemetry_df["size_bin"] = pd.cut(telemetry_df["size"], size_bins, right=False)
+percentile_df = (
+    telemetry_df.groupby("size_bin", observed=True)["total_time"]
+    .quantile([0.5, 0.9, 0.99])
+    .unstack()
+    .rename(columns={0.5: "p50", 0.9: "p90", 0.99: "p99"})
+)
+percentile_df.index = percentile_df.index.astype(str)
+st.table(percentile_df)
+st.line_chart(percentile_df)
+
+st.markdown("## フェーズごとの処理時間")
+# フェーズごとの処理時間の平均
+phase_df = pd.DataFrame(
+    telemetry_df["phases"].map(json.loads).tolist(), index=telemetry_df.index
+)
+st.bar_chart(phase_df.mean())
+
+st.markdown("## 処理時間の長いインスタンス")
+# インスタンス名ごとの処理時間の平均（上位10件）
+slow_df = (
+    telemetry_df.dropna(subset=["instance_name"])
+    .groupby("instance_name")["total_time"]
+    .agg(["count", "mean", "max"])
+    .sort_values("mean", ascending=False)
+    .head(10)
+)
+st.table(slow_df)
+
+st.markdown("## 実行履歴")
+st.dataframe(telemetry_df.drop(columns=["phases", "size_bin"]))
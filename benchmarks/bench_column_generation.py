@@ -0,0 +1,97 @@
+"""列生成法（column_generation）とスタッフごとの変数を持つモデル（ShiftScheduler_8_2）の比較
+
+同じ条件のスタッフが多いインスタンス（num_types種類の条件をスタッフ数まで複製したもの）で、
+スタッフ数を変えながらモデルサイズ、処理時間、目的関数値を比較する。
+
+使い方:
+    python -m benchmarks.bench_column_generation --staff 100 300 1000 --time-limit 60
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.column_generation import ColumnGenerationScheduler
+from src.shift_scheduler.instance_generator import generate_instance
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+
+def homogeneous_instance(num_staff, num_dates, num_types, seed=0):
+    # num_types人分のインスタンスを作り、スタッフの条件を複製してnum_staff人にする
+    staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty = (
+        generate_instance(
+            num_types, num_dates, seed=seed, num_skills=1, skill_ratio=0.5
+        )
+    )
+    copies = -(-num_staff // num_types)
+    types = staff_df["スタッフID"].tolist()
+    staff_df = pd.concat([staff_df] * copies, ignore_index=True).head(num_staff)
+    type_of = [types[i % num_types] for i in range(num_staff)]
+    staff_df["スタッフID"] = [f"S{i:05d}" for i in range(num_staff)]
+
+    # 必要人数はスタッフ数に合わせて増やす
+    scale = num_staff / num_types
+    for column in calendar_df.columns[1:]:
+        calendar_df[column] = (calendar_df[column] * scale).astype(int)
+    staff_penalty = {
+        s: staff_penalty[t] for s, t in zip(staff_df["スタッフID"], type_of)
+    }
+    staff_ng_date = {
+        s: staff_ng_date[t] for s, t in zip(staff_df["スタッフID"], type_of)
+    }
+    return staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty
+
+
+def run(scheduler_class, data, max_consecutive, time_limit):
+    shift_sch = scheduler_class()
+    shift_sch.telemetry = None
+    shift_sch.set_data(*data, max_consecutive=max_consecutive)
+
+    start = time.perf_counter()
+    shift_sch.build_model()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shift_sch.solve(timeLimit=time_limit)
+    solve_time = time.perf_counter() - start
+
+    return {
+        "staff": len(shift_sch.S),
+        "engine": scheduler_class.__name__,
+        "build_time": build_time,
+        "solve_time": solve_time,
+        **shift_sch.perf.model_size,
+        "status": pulp.LpStatus[shift_sch.status],
+        # 列生成の解は下界に一致しなければ「Solution Found」（最適とは限らない）
+        "solution": pulp.LpSolution[shift_sch.model.sol_status],
+        "objective": shift_sch.evaluate(shift_sch.sch_df),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--dates", type=int, default=31)
+    parser.add_argument("--types", type=int, default=10)
+    parser.add_argument("--max-consecutive", type=int, default=5)
+    parser.add_argument("--time-limit", type=float, default=60)
+    args = parser.parse_args(argv)
+
+    results = []
+    for num_staff in args.staff:
+        data = homogeneous_instance(num_staff, args.dates, args.types)
+        for scheduler_class in [ShiftScheduler, ColumnGenerationScheduler]:
+            results.append(
+                run(scheduler_class, data, args.max_consecutive, args.time_limit)
+            )
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""連続勤務・休日の規則の定式化の比較
+
+期間ごとに出勤日数の和をとる素朴な定式化（naive）、
+累積出勤日数の補助変数を使う定式化（prefix）、
+1つ前の期間の式をずらして使い回す定式化（sliding、既定）について、
+31日・90日のカレンダーでモデル構築時間、モデルサイズ、求解時間を比較する。
+
+使い方:
+    python -m benchmarks.bench_work_windows --staff 50 --time-limit 60
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.instance_generator import generate_instance
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+
+def run(num_staff, num_dates, formulation, max_consecutive, min_rest, time_limit):
+    shift_sch = ShiftScheduler()
+    shift_sch.telemetry = None
+    shift_sch.window_formulation = formulation
+    shift_sch.set_data(
+        *generate_instance(num_staff, num_dates),
+        max_consecutive=max_consecutive,
+        min_rest=min_rest,
+    )
+
+    start = time.perf_counter()
+    shift_sch.build_model()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shift_sch.solve(timeLimit=time_limit)
+    solve_time = time.perf_counter() - start
+
+    return {
+        "dates": num_dates,
+        "formulation": formulation,
+        "build_time": build_time,
+        "solve_time": solve_time,
+        **shift_sch.perf.model_size,
+        "status": pulp.LpStatus[shift_sch.status],
+        "objective": shift_sch.evaluate(shift_sch.sch_df),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", type=int, default=50)
+    parser.add_argument("--dates", type=int, nargs="+", default=[31, 90])
+    parser.add_argument("--max-consecutive", type=int, default=5)
+    parser.add_argument("--min-rest", type=int, nargs=2, default=[14, 4])
+    parser.add_argument("--time-limit", type=float, default=60)
+    args = parser.parse_args(argv)
+
+    results = [
+        run(
+            args.staff,
+            num_dates,
+            formulation,
+            args.max_consecutive,
+            tuple(args.min_rest),
+            args.time_limit,
+        )
+        for num_dates in args.dates
+        for formulation in ["naive", "prefix", "sliding"]
+    ]
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""ベンチマークの結果からソルバー設定の選択ルール（solver_rules.json）を作成する
+
+大きさ・休暇希望の割合を変えたインスタンスを、候補の設定（presolve・cutsの有無）で
+それぞれ解き、特徴量の区間ごとに、目的関数値の悪化が許容範囲内で最も速い設定を選ぶ。
+候補は最適値を変えない設定だけとし、制限時間やgapRelはルールに書かない
+（--time-limitはベンチマークの実行を打ち切るためだけに使う）。
+スレッド数は実行したマシンのCPU数とするため、本番と同じマシンで実行する
+（実行時にはtuning.max_threadsの値で制限される）。
+出力には、どのインスタンスと引数で作成したか（provenance）もあわせて書く。
+
+使い方:
+    python -m benchmarks.fit_solver_rules --staff 20 100 300 700 --dates 7 31
+    python -m benchmarks.fit_solver_rules --output src/shift_scheduler/solver_rules.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from src.shift_scheduler.instance_generator import generate_instance
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+from src.shift_scheduler.tuning import DEFAULT_RULES_PATH, instance_features
+
+# 候補の設定（スレッド数は全候補に共通）
+CANDIDATES = [
+    {},
+    {"cuts": False},
+    {"presolve": False},
+    {"presolve": False, "cuts": False},
+]
+
+# ルールの区間を分ける特徴量と境界値
+SPLITS = {"num_variables": [2000, 20000], "ng_ratio": [0.3]}
+
+
+def run(data, max_consecutive, settings, time_limit):
+    shift_sch = ShiftScheduler()
+    shift_sch.telemetry = None
+    shift_sch.solver_rules = None
+    shift_sch.set_data(*data, max_consecutive=max_consecutive)
+    shift_sch.build_model()
+    shift_sch.solve(timeLimit=time_limit, **settings)
+    return {
+        **instance_features(shift_sch),
+        "solve_time": shift_sch.perf.phases["solver"]["wall_time"],
+        "objective": shift_sch.evaluate(shift_sch.sch_df),
+    }
+
+
+def cell_of(features):
+    # 特徴量ごとに、境界値で区切った区間の番号
+    return tuple(
+        sum(features[name] >= bound for bound in bounds)
+        for name, bounds in SPLITS.items()
+    )
+
+
+def condition_of(cell):
+    condition = {}
+    for (name, bounds), index in zip(SPLITS.items(), cell):
+        edges = [None] + bounds + [None]
+        condition[name] = [edges[index], edges[index + 1]]
+    return condition
+
+
+def fit(results, threads, tolerance):
+    # インスタンスごとの最良の目的関数値からの相対的な悪化
+    best = results.groupby("instance")["objective"].transform("min")
+    results["loss"] = (results["objective"] - best) / best.abs().clip(lower=1)
+
+    rules = []
+    for cell, group in results.groupby("cell"):
+        summary = group.groupby("candidate").agg(
+            loss=("loss", "max"), solve_time=("solve_time", "sum")
+        )
+        accepted = summary[summary["loss"] <= tolerance]
+        if accepted.empty:
+            accepted = summary[summary["loss"] == summary["loss"].min()]
+        candidate = accepted["solve_time"].idxmin()
+        rules.append(
+            {
+                "if": condition_of(cell),
+                "settings": {"threads": threads, **CANDIDATES[candidate]},
+            }
+        )
+    # どの区間にも当てはまらない場合（ベンチマークにない区間）はスレッド数だけ指定する
+    rules.append({"if": {}, "settings": {"threads": threads}})
+    return rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", type=int, nargs="+", default=[20, 100, 300, 700])
+    parser.add_argument("--dates", type=int, nargs="+", default=[7, 31])
+    parser.add_argument("--ng-ratio", type=float, nargs="+", default=[0.1, 0.5])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--max-consecutive", type=int, default=5)
+    parser.add_argument("--time-limit", type=float, default=120)
+    parser.add_argument("--tolerance", type=float, default=0.001)
+    parser.add_argument("--output", default=DEFAULT_RULES_PATH)
+    args = parser.parse_args(argv)
+
+    threads = os.cpu_count() or 1
+    results = []
+    grid = itertools.product(args.staff, args.dates, args.ng_ratio, args.seeds)
+    for instance, (num_staff, num_dates, ng_ratio, seed) in enumerate(grid):
+        data = generate_instance(num_staff, num_dates, seed=seed, ng_ratio=ng_ratio)
+        for candidate, settings in enumerate(CANDIDATES):
+            result = run(
+                data,
+                args.max_consecutive,
+                {"threads": threads, **settings},
+                args.time_limit,
+            )
+            result.update(instance=instance, candidate=candidate)
+            result["cell"] = cell_of(result)
+            results.append(result)
+    results = pd.DataFrame(results)
+    print(
+        results[
+            ["instance", "num_variables", "ng_ratio", "candidate"]
+            + ["solve_time", "objective"]
+        ].to_string(index=False)
+    )
+
+    rules = fit(results, threads, args.tolerance)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "cpu_count": threads,
+                "instances": int(results["instance"].nunique()),
+                "provenance": {
+                    "script": "benchmarks/fit_solver_rules.py",
+                    "created_at": datetime.date.today().isoformat(),
+                    "staff": args.staff,
+                    "dates": args.dates,
+                    "ng_ratio": args.ng_ratio,
+                    "seeds": args.seeds,
+                    "max_consecutive": args.max_consecutive,
+                    "time_limit": args.time_limit,
+                    "tolerance": args.tolerance,
+                    "candidates": CANDIDATES,
+                },
+                "rules": rules,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(json.dumps(rules, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
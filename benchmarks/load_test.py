@@ -0,0 +1,357 @@
+"""Streamlitアプリの同時利用の負荷試験
+
+生成したインスタンスのCSVをアップロードし、スライダーを動かして「最適化実行」を押す
+利用者をN人分、ブラウザなしで同時に模擬する。最適化サービス（solve_service）を起動し、
+各セッションはそこに最適化を依頼する（--workers 0ならアプリ内で最適化し、
+同時に最適化できる数はセッション数とする）。
+
+Streamlit 1.24にはアプリのテスト用API（AppTest、1.28以降）がなく、AppTestでも
+ファイルのアップロードは扱えないため、アップロードしたファイルとウィジェットの値を
+セッションごとのsession_stateに持たせてアプリのスクリプトを再実行する。
+Streamlitのサーバーと同じく、各セッションは1つのプロセスの中のスレッドとして動かすため、
+モジュールレベルのキャッシュ（モデルのキャッシュ、ワークブックの読み込みなど）は
+セッション間で共有され、プロセスのRSSはサーバー全体のメモリに相当する。
+
+再実行の所要時間のパーセンタイル、最適化サービスの待ち時間と求解時間、
+アプリのプロセス（アプリ内で最適化した場合のCBCの子プロセスを含む）のCPU時間とRSSの最大値、
+セッションごとのスレッドのCPU時間の合計、最適化サービス（ワーカーを含む）のCPU時間とRSSの最大値を表示する。
+RSSとCPU時間は/procから読むため、Linuxでのみ計測できる。
+
+使い方:
+    python -m benchmarks.load_test --sessions 4 --staff 50 --dates 31 --workers 2
+    python -m benchmarks.load_test --app app_8_2.py --sessions 8 --rounds 3 --moves 2
+"""
+
+import argparse
+import io
+import os
+import resource
+import runpy
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import numpy as np
+import pandas as pd
+
+from src.shift_scheduler.instance_generator import generate_instance
+from src.shift_scheduler.result_store import ResultStore
+
+OPTIMIZE_LABEL = "最適化実行"
+
+
+_current = threading.local()  # 実行中のスレッドのセッション
+
+
+class SessionStateProxy(MutableMapping):
+    # st.session_stateの代わりに、実行中のスレッドのセッションのsession_stateを使う
+    def _state(self):
+        return _current.session.session_state
+
+    def __getitem__(self, key):
+        return self._state()[key]
+
+    def __setitem__(self, key, value):
+        self._state()[key] = value
+
+    def __delitem__(self, key):
+        del self._state()[key]
+
+    def __iter__(self):
+        return iter(list(self._state()))
+
+    def __len__(self):
+        return len(self._state())
+
+
+def patch_streamlit():
+    # ウィジェットの関数を、実行中のスレッドのセッションの値を返す関数に置き換える
+    import streamlit as st
+    from streamlit.delta_generator import DeltaGenerator
+
+    # DeltaGeneratorのメソッドとして呼ばれた場合はselfが先頭に入るため、
+    # 最初の文字列の引数をラベルとする
+    def file_uploader(*args, **kwargs):
+        label = next(a for a in args if isinstance(a, str))
+        data = _current.session.session_state["_uploads"].get(label)
+        if data is None:
+            return None
+        buffer = io.BytesIO(data)
+        buffer.name = f"{label}.csv"
+        return buffer
+
+    def slider(*args, **kwargs):
+        label = next(a for a in args if isinstance(a, str))
+        numbers = [a for a in args if isinstance(a, (int, float))]
+        default = kwargs.get("value", numbers[2] if len(numbers) > 2 else None)
+        return _current.session.session_state["_widgets"].get(label, default)
+
+    def button(*args, **kwargs):
+        label = next(a for a in args if isinstance(a, str))
+        return _current.session.press and label == OPTIMIZE_LABEL
+
+    for name, function in [
+        ("file_uploader", file_uploader),
+        ("slider", slider),
+        ("button", button),
+    ]:
+        setattr(st, name, function)
+        setattr(DeltaGenerator, name, function)
+    st.session_state = SessionStateProxy()
+
+
+class HeadlessSession:
+    # 1人の利用者のセッション。アップロードしたファイルとウィジェットの値をsession_stateに持つ
+    def __init__(self, app, uploads, seed=0):
+        self.app = app
+        self.rng = np.random.default_rng(seed)
+        self.session_state = {"_uploads": uploads, "_widgets": {}}
+        self.press = False  # 今回の再実行で「最適化実行」を押すか
+        self.results = []  # 最適化結果（待ち時間と求解時間）
+
+    def rerun(self, press=False):
+        # このスレッドでアプリのスクリプトを1回実行し、所要時間を返す
+        _current.session = self
+        self.press = press
+        if press and "result" in self.session_state:
+            ResultStore.default().remove(self.session_state.pop("result"))
+        start = time.perf_counter()
+        runpy.run_path(self.app, run_name="__main__")
+        latency = time.perf_counter() - start
+        if press and "result" in self.session_state:
+            # session_stateには結果のハンドルだけがあるため、保存先から読む
+            result = ResultStore.default().meta(self.session_state["result"])
+            self.results.append(
+                {
+                    "queue_time": result.get("queue_time", 0.0),
+                    "solve_time": result.get("solve_time"),
+                }
+            )
+        return latency
+
+    def move_slider(self, labels):
+        # ランダムに選んだスライダーを動かす
+        label = labels[self.rng.integers(len(labels))]
+        self.session_state["_widgets"][label] = int(self.rng.integers(0, 101))
+
+
+def run_session(args):
+    # 1つのスレッドで1人分の操作を行い、再実行の所要時間、最適化結果、スレッドのCPU時間を返す
+    app, uploads, slider_labels, rounds, moves, seed = args
+    start_cpu = time.thread_time()
+    session = HeadlessSession(app, uploads, seed)
+    reruns = [("upload", session.rerun())]
+    for _ in range(rounds):
+        for _ in range(moves):
+            session.move_slider(slider_labels)
+            reruns.append(("slider", session.rerun()))
+        reruns.append(("optimize", session.rerun(press=True)))
+    if "result" in session.session_state:
+        ResultStore.default().remove(session.session_state["result"])
+    return reruns, session.results, time.thread_time() - start_cpu
+
+
+def process_tree_usage(pid):
+    # pidとその子孫プロセスのRSS[バイト]とCPU時間[秒]の合計
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                parents[int(entry)] = int(fields[1])
+            except OSError:
+                continue
+    tree = {pid}
+    while True:
+        children = {p for p, parent in parents.items() if parent in tree} - tree
+        if not children:
+            break
+        tree |= children
+
+    rss = cpu = 0
+    tick = os.sysconf("SC_CLK_TCK")
+    for p in tree:
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{p}/statm") as f:
+                rss += int(f.read().split()[1]) * resource.getpagesize()
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / tick
+    return rss, cpu
+
+
+class ProcessMonitor:
+    # プロセス（子孫プロセスを含む）のRSSの最大値とCPU時間を一定間隔で記録する
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu_time = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.start_cpu = process_tree_usage(pid)[1]
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            rss, cpu = process_tree_usage(self.pid)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.cpu_time = max(self.cpu_time, cpu - self.start_cpu)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def start_service(port, workers, env):
+    service = subprocess.Popen(
+        [sys.executable, "-m", "src.shift_scheduler.solve_service"]
+        + ["--port", str(port), "--workers", str(workers)],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        # ワーカーのプロセスもまとめて終了できるように、別のプロセスグループにする
+        start_new_session=True,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/status", timeout=1).read()
+            return service, url
+        except OSError:
+            time.sleep(0.1)
+    service.kill()
+    raise RuntimeError("最適化サービスが起動しませんでした")
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {}
+    return {
+        "count": len(values),
+        "p50": np.percentile(values, 50),
+        "p90": np.percentile(values, 90),
+        "p99": np.percentile(values, 99),
+        "max": values.max(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="app_8_2.py")
+    parser.add_argument("--sessions", type=int, default=4, help="同時セッション数")
+    parser.add_argument("--staff", type=int, default=20)
+    parser.add_argument("--dates", type=int, default=14)
+    parser.add_argument("--rounds", type=int, default=2, help="最適化実行の回数")
+    parser.add_argument(
+        "--moves", type=int, default=2, help="最適化ごとのスライダー操作"
+    )
+    parser.add_argument("--workers", type=int, default=2, help="0ならアプリ内で最適化")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # 生成したインスタンスをアップロードするCSVにする
+    staff_df, calendar_df, _, _, _ = generate_instance(
+        args.staff, args.dates, seed=args.seed
+    )
+    uploads = {
+        "スタッフ": staff_df.to_csv(index=False).encode("utf-8"),
+        "カレンダー": calendar_df.to_csv(index=False).encode("utf-8"),
+    }
+    slider_labels = [f"{s}の希望違反ペナルティ" for s in staff_df["スタッフID"]]
+    slider_labels.append("希望休暇ペナルティ")
+
+    # 負荷試験の実行は実行履歴に記録しない
+    env = dict(os.environ, SHIFT_TELEMETRY_DB="")
+    service = monitor = None
+    if args.workers > 0:
+        service, url = start_service(args.port, args.workers, env)
+        env["SHIFT_SOLVE_SERVICE_URL"] = url
+        monitor = ProcessMonitor(service.pid)
+    else:
+        # 最適化サービスに接続できず、アプリ内で最適化する
+        # （比較のため、セッションごとにCBCを同時に動かせるようにする）
+        env["SHIFT_SOLVE_SERVICE_URL"] = "http://127.0.0.1:9"
+        env["SHIFT_SOLVE_LOCAL_FALLBACK"] = "1"
+        env["SHIFT_SOLVE_LOCAL_WORKERS"] = str(args.sessions)
+    os.environ.update(env)
+
+    # ブラウザなしで実行した場合の警告を表示しない
+    from streamlit import config
+
+    config.set_option("global.showWarningOnDirectExecution", False)
+    os.chdir(ROOT)
+    patch_streamlit()
+    app_monitor = ProcessMonitor(os.getpid())
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(args.sessions) as executor:
+            outputs = executor.map(
+                run_session,
+                [
+                    (
+                        os.path.join(ROOT, args.app),
+                        uploads,
+                        slider_labels,
+                        args.rounds,
+                        args.moves,
+                        args.seed + i,
+                    )
+                    for i in range(args.sessions)
+                ],
+            )
+            outputs = list(outputs)
+    finally:
+        app_monitor.stop()
+        if monitor is not None:
+            monitor.stop()
+        if service is not None:
+            os.killpg(service.pid, signal.SIGTERM)
+            service.wait()
+    elapsed = time.perf_counter() - start
+
+    reruns = pd.DataFrame(
+        [(kind, latency) for output in outputs for kind, latency in output[0]],
+        columns=["kind", "latency"],
+    )
+    solves = pd.DataFrame([r for output in outputs for r in output[1]])
+    report = {
+        f"rerun ({kind})": percentiles(group["latency"])
+        for kind, group in reruns.groupby("kind")
+    }
+    report["rerun (all)"] = percentiles(reruns["latency"])
+    if not solves.empty:
+        report["queue_time"] = percentiles(solves["queue_time"])
+        report["solve_time"] = percentiles(solves["solve_time"])
+    print(pd.DataFrame(report).T.to_string(float_format="{:.3f}".format))
+
+    print("sessions:", args.sessions, "elapsed [s]:", round(elapsed, 2))
+    print("optimize per second:", round(len(solves) / elapsed, 3))
+    print("app CPU time [s]:", round(app_monitor.cpu_time, 2))
+    print(
+        "session CPU time (sum of threads) [s]:",
+        round(sum(output[2] for output in outputs), 2),
+    )
+    print("app peak RSS [MB]:", round(app_monitor.peak_rss / 2**20, 1))
+    if monitor is not None:
+        print("service CPU time [s]:", round(monitor.cpu_time, 2))
+        print("service peak RSS [MB]:", round(monitor.peak_rss / 2**20, 1))
+
+
+if __name__ == "__main__":
+    main()
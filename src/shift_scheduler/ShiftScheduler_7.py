@@ -1,6 +1,8 @@
 import pulp
 import pandas as pd
 
+from src.shift_scheduler.profiler import PhaseProfiler, profile_phase
+
 
 class ShiftScheduler:
     def __init__(self):
@@ -28,9 +30,13 @@ class ShiftScheduler:
         self.status = -1  # 最適化結果のステータス
         self.sch_df = None  # シフト表を表すデータフレーム
 
+        # 処理時間とモデルサイズの計測
+        self.perf = PhaseProfiler()
+
         # スタッフごとの重みペナルティ、各スタッフについてデフォルトは50として辞書を作成
         self.S2penalty_weight = {s: 50 for s in self.S}
 
+    @profile_phase("set_data")
     def set_data(self, staff_df, calendar_df, staff_penalty):
         # リストの設定
         self.S = staff_df["スタッフID"].tolist()
@@ -66,6 +72,7 @@ class ShiftScheduler:
         print("Staff Penalty Weight:", self.S2penalty_weight)
         print("=" * 50)
 
+    @profile_phase("build_model")
     def build_model(self):
         ### 数理モデルの定義 ###
         self.model = pulp.LpProblem("ShiftScheduler", pulp.LpMinimize)
@@ -121,15 +128,20 @@ class ShiftScheduler:
                 <= self.y_over[s]
             )
 
+        # モデルサイズの記録
+        self.perf.record_pulp_model_size(self.model)
+
     def solve(self):
         solver = pulp.PULP_CBC_CMD(msg=0)
-        self.status = self.model.solve(solver)
+        with self.perf.phase("solver"):
+            self.status = self.model.solve(solver)
 
         print("status:", pulp.LpStatus[self.status])
         print("objective:", self.model.objective.value())
 
-        Rows = [[int(self.x[s, d].value()) for d in self.D] for s in self.S]
-        self.sch_df = pd.DataFrame(Rows, index=self.S, columns=self.D)
+        with self.perf.phase("extract"):
+            Rows = [[int(self.x[s, d].value()) for d in self.D] for s in self.S]
+            self.sch_df = pd.DataFrame(Rows, index=self.S, columns=self.D)
 
 
 if __name__ == "__main__":
@@ -1,20 +1,61 @@
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
 import pulp
 import pandas as pd
 
+from src.shift_scheduler.greedy import greedy_schedule, lower_bound, round_schedule
+from src.shift_scheduler.profiler import PhaseProfiler, profile_phase
+from src.shift_scheduler.telemetry import TelemetryStore, input_hash
+from src.shift_scheduler.tuning import instance_features, load_rules, select_settings
+
+# LP緩和を内点法で解く変数の数の下限
+BARRIER_MIN_VARIABLES = 20000
+
+
+def read_cbc_log(path):
+    # CBCのログから終了理由（「Optimal solution found」「Stopped on time limit」など）と
+    # 下界を読む（読めなければNone）
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    result = re.search(r"^Result - (.+?)\s*$", text, re.MULTILINE)
+    bound = re.search(r"^Lower bound:\s+(\S+)", text, re.MULTILINE)
+    return {
+        "result": result[1] if result else None,
+        "lower_bound": float(bound[1]) if bound else None,
+    }
+
+
+def find_skills(staff_df, calendar_df):
+    # スタッフ情報の「◯◯フラグ」列とカレンダー情報の「◯◯人数」列の組をスキルとする
+    # （責任者フラグと責任者人数もスキル「責任者」として扱う）
+    return [
+        column[: -len("フラグ")]
+        for column in staff_df.columns
+        if column.endswith("フラグ")
+        and f"{column[: -len('フラグ')]}人数" in calendar_df.columns
+    ]
+
 
 class ShiftScheduler:
     def __init__(self):
         # リスト
         self.S = []  # スタッフのリスト
         self.D = []  # 日付のリスト
-        self.SD = []  # スタッフと日付の組のリスト
+        self.SD = []  # 出勤可能なスタッフと日付の組のリスト
+        self.S2dates = {}  # 各スタッフの出勤可能な日付のリスト
+        self.D2staff = {}  # 各日の出勤可能なスタッフのリスト
 
         # 定数
-        self.S2leader_flag = {}  # スタッフの責任者フラグ
         self.S2min_shift = {}  # スタッフの希望最小出勤日数
         self.S2max_shift = {}  # スタッフの希望最大出勤日数
         self.D2required_staff = {}  # 各日の必要人数
-        self.D2required_leader = {}  # 各日の必要責任者数
+        self.K = []  # スキルのリスト（責任者を含む）
+        self.K2staff = {}  # 各スキルを持つスタッフのリスト（スキル行列の非ゼロ要素）
+        self.KD2required = {}  # 各スキル・各日の必要人数
 
         # 変数
         self.x = {}  # 各スタッフが各日にシフトに入るか否かを表す変数
@@ -22,12 +63,37 @@ class ShiftScheduler:
         self.y_over = {}  # 各スタッフの希望勤務日数の超過数を表すスラック変数
         self.z_over = {}  # 各スタッフの休暇希望の違反数を表すスラック変数
 
+        # 制約式（双対変数を読むために保持する）
+        self.cover = {}  # 各日の必要人数の制約式
+        self.cover_skill = {}  # 各スキル・各日の必要人数の制約式
+        self.shift_under = {}  # 各スタッフの希望最小出勤日数の制約式
+        self.shift_over = {}  # 各スタッフの希望最大出勤日数の制約式
+
         # 数理モデル
         self.model = None
 
         # 最適化結果
         self.status = -1  # 最適化結果のステータス
         self.sch_df = None  # シフト表を表すデータフレーム
+        self.lp_bound = None  # LP緩和の目的関数値（relaxed=Trueの場合）
+        self.gap = None  # 目的関数値と下界の相対的な差
+        self.solver_log = {}  # 直前のCBCの終了理由と下界
+        self.solve_mode = None  # 直前のsolveの解き方（"exact"または"relaxed"）
+
+        # 処理時間とモデルサイズの計測
+        self.perf = PhaseProfiler()
+        # 前回実行履歴に記録した時点のフェーズごとの経過時間
+        # （スケジューラーを使い回しても、1行にはその回の処理時間だけを記録する）
+        self.telemetry_mark = {}
+
+        # インスタンスの特徴量によるソルバー設定の選択ルール（Noneなら選択しない）
+        self.solver_rules = load_rules()
+        self.solver_settings = {}  # 直前のsolveで使ったソルバーの設定
+
+        # 実行履歴の記録先（環境変数で無効にした場合はNone。ファイルは記録するときに開く）
+        self.telemetry = TelemetryStore.default()
+        self.instance_name = None  # 実行履歴に記録するインスタンス名
+        self.input_hash = None  # 入力データのハッシュ
 
         # スタッフごとの重みペナルティ、各スタッフについてデフォルトは50として辞書を作成
         self.S2penalty_weight = {s: 50 for s in self.S}
@@ -38,23 +104,78 @@ class ShiftScheduler:
         # 希望休暇のペナルティーの設定
         self.penalty_off = 50
 
+        # 連続勤務・休日の規則（期間の長さ, その期間の最大出勤日数）のリスト
+        self.work_windows = []
+        # 規則の定式化
+        # "sliding": 1つ前の期間の式を1日ずらして使い回す
+        # "prefix": 累積出勤日数の補助変数を使う
+        # "naive": 期間ごとにlpSumで和をとる（比較用）
+        self.window_formulation = "sliding"
+        self.P = {}  # 各スタッフの累積出勤日数を表す補助変数
+
+        # 過去の勤務履歴による公平性のコスト（スタッフと日付の組 -> シフトに入る場合のコスト）
+        self.SD2fairness = {}
+
+        # 休暇申請（スタッフと日付の組 -> 申請の種類）
+        # "leave"は休暇希望日と同じくpenalty_offのペナルティ、"unavailable"は出勤不可
+        # 休暇希望日と違い、1人のスタッフが複数の日を申請できる
+        self.SD2leave = {}
+
+    @profile_phase("set_data")
     def set_data(
-        self, staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty
+        self,
+        staff_df,
+        calendar_df,
+        staff_penalty,
+        staff_ng_date,
+        off_penalty,
+        max_consecutive=None,
+        min_rest=None,
+        availability=None,
     ):
         # リストの設定
         self.S = staff_df["スタッフID"].tolist()
         self.D = calendar_df["日付"].tolist()
-        self.SD = [(s, d) for s in self.S for d in self.D]
+
+        # 出勤可能なスタッフと日付の組の設定
+        # availabilityはシフト表と同じ形式（行がスタッフID、列が日付）で、
+        # 0の組は出勤不可として変数を作らない（ない行・列は出勤可能とする）
+        if availability is None:
+            available = np.ones((len(self.S), len(self.D)), dtype=bool)
+        else:
+            available = (
+                availability.reindex(index=self.S, columns=self.D, fill_value=1)
+                .fillna(1)
+                .to_numpy()
+                > 0
+            )
+        self.SD = [(self.S[i], self.D[j]) for i, j in zip(*np.nonzero(available))]
+        self.S2dates = {s: [] for s in self.S}
+        self.D2staff = {d: [] for d in self.D}
+        for s, d in self.SD:
+            self.S2dates[s].append(d)
+            self.D2staff[d].append(s)
 
         # 定数の設定
         S2Dic = staff_df.set_index("スタッフID").to_dict()
-        self.S2leader_flag = S2Dic["責任者フラグ"]
         self.S2min_shift = S2Dic["希望最小出勤日数"]
         self.S2max_shift = S2Dic["希望最大出勤日数"]
 
         D2Dic = calendar_df.set_index("日付").to_dict()
         self.D2required_staff = D2Dic["出勤人数"]
-        self.D2required_leader = D2Dic["責任者人数"]
+
+        # スキルの設定
+        # スキル行列（スキル×スタッフ）の非ゼロ要素だけをスキルごとのリストとして持つ
+        self.K = find_skills(staff_df, calendar_df)
+        skill_matrix = staff_df[[f"{k}フラグ" for k in self.K]].to_numpy().T
+        self.K2staff = {k: [] for k in self.K}
+        for k_index, s_index in zip(*np.nonzero(skill_matrix)):
+            self.K2staff[self.K[k_index]].append(self.S[s_index])
+        self.KD2required = {
+            (k, d): n
+            for k in self.K
+            for d, n in zip(self.D, calendar_df[f"{k}人数"].tolist())
+        }
 
         # スタッフ希望違反のペナルティーの設定
         self.S2penalty_weight = staff_penalty
@@ -65,30 +186,93 @@ class ShiftScheduler:
         # 休暇希望違反のペナルティーの設定
         self.penalty_off = off_penalty
 
+        # 連続勤務・休日の規則の設定
+        # max_consecutive日を超えて連続で出勤しない
+        # min_rest=(w, r)のとき、連続するw日の中に少なくともr日の休日をとる
+        self.work_windows = []
+        if max_consecutive is not None:
+            self.work_windows.append((max_consecutive + 1, max_consecutive))
+        if min_rest is not None:
+            window, rest_days = min_rest
+            self.work_windows.append((window, window - rest_days))
+
+        # 実行履歴で同じ入力を識別するためのハッシュ
+        self.input_hash = input_hash(
+            staff_df,
+            calendar_df,
+            staff_penalty,
+            staff_ng_date,
+            off_penalty,
+            self.work_windows,
+            availability,
+        )
+
+    def set_history(
+        self,
+        history_df,
+        weekend_dates=(),
+        work_weight=1.0,
+        weekend_weight=1.0,
+        ng_weight=1.0,
+    ):
+        # history_dfはHistoryStore.loadの結果（スタッフIDを行とする累計）
+        # weekend_datesは土日の日付（history.calendar_weekend_datesで求める）
+        # 過去の月平均の出勤日数・土日の出勤日数が全体の平均より多いスタッフほど、
+        # 今月シフトに入るコストを大きくする。過去に休暇希望の違反が多いスタッフほど、
+        # 今月の休暇希望日にシフトに入るコストを大きくする
+        # 履歴のスタッフIDは文字列なので、整数のIDなども文字列にして突き合わせる
+        history_df = history_df.set_axis(history_df.index.astype(str))
+        history_df = history_df.reindex([str(s) for s in self.S]).fillna(0)
+        months = np.maximum(1, history_df["months"].to_numpy())
+        work_rate = history_df["work_days"].to_numpy() / months
+        weekend_rate = history_df["weekend_days"].to_numpy() / months
+        has_history = history_df["months"].to_numpy() > 0
+        if not has_history.any():
+            self.SD2fairness = {}
+            return
+        work_excess = np.maximum(0, work_rate - work_rate[has_history].mean())
+        weekend_excess = np.maximum(0, weekend_rate - weekend_rate[has_history].mean())
+        ng_violations = history_df["ng_violations"].to_numpy()
+
+        weekend_dates = set(weekend_dates)
+        self.SD2fairness = {}
+        for i, s in enumerate(self.S):
+            for d in self.S2dates[s]:
+                cost = work_weight * work_excess[i]
+                if d in weekend_dates:
+                    cost += weekend_weight * weekend_excess[i]
+                if d == self.S2ng_date[s]:
+                    cost += ng_weight * ng_violations[i]
+                if cost > 0:
+                    self.SD2fairness[s, d] = float(cost)
+
     def show(self):
         print("=" * 50)
         print("Staffs:", self.S)
         print("Dates:", self.D)
         print("Staff-Date Pairs:", self.SD)
 
-        print("Staff Leader Flag:", self.S2leader_flag)
         print("Staff Max Shift:", self.S2max_shift)
         print("Staff Min Shift:", self.S2min_shift)
 
         print("Date Required Staff:", self.D2required_staff)
-        print("Date Required Leader:", self.D2required_leader)
+        print("Skill Staffs:", self.K2staff)
+        print("Skill Required Staff:", self.KD2required)
 
         print("Staff Penalty Weight:", self.S2penalty_weight)
         print("NG Date Penalty Weight:", self.penalty_off)
         print("=" * 50)
 
+    @profile_phase("build_model")
     def build_model(self):
         ### 数理モデルの定義 ###
         self.model = pulp.LpProblem("ShiftScheduler", pulp.LpMinimize)
 
         ### 変数の定義 ###
-        # 各スタッフの各日に対して、シフトに入るなら1、シフトに入らないなら0
+        # 出勤可能な各スタッフの各日に対して、シフトに入るなら1、シフトに入らないなら0
+        # （出勤不可の組には変数を作らず、以下の和も出勤可能な組だけでとる）
         self.x = pulp.LpVariable.dicts("x", self.SD, cat="Binary")
+        self.set_leave_bounds()
 
         # 各スタッフの勤務希望日数の不足数を表すためのスラック変数
         self.y_under = pulp.LpVariable.dicts(
@@ -105,60 +289,586 @@ class ShiftScheduler:
         )
 
         ### 制約式の定義 ###
-        # 各日に対して、必要な人数がシフトに入る
-        for d in self.D:
-            self.model += (
-                pulp.lpSum(self.x[s, d] for s in self.S) >= self.D2required_staff[d]
-            )
-
-        # 各日に対して、必要なリーダーの人数がシフトに入る
-        for d in self.D:
-            self.model += (
-                pulp.lpSum(self.x[s, d] * self.S2leader_flag[s] for s in self.S)
-                >= self.D2required_leader[d]
-            )
+        # 必要人数とスキルごとの人数
+        self.cover = {}
+        self.cover_skill = {}
+        self.add_coverage_constraints()
 
         ### 目的関数とスラック変数の定義 ###
-        # 各スタッフの勤務希望日数の不足数、超過数と希望休暇違反を重みペナルティを考慮して最小化する
-        self.model += pulp.lpSum(
-            [
-                self.S2penalty_weight[s] * (self.y_under[s] + self.y_over[s])
-                for s in self.S
-            ]
-            + [self.penalty_off * self.z_over[s] for s in self.S]
-        )
+        self.set_objective()
 
         # 各スタッフに対して、y_under[s]は勤務希望日数の不足数を表す
         for s in self.S:
-            self.model += (
-                self.S2min_shift[s] - pulp.lpSum(self.x[s, d] for d in self.D)
+            self.shift_under[s] = (
+                self.S2min_shift[s] - pulp.lpSum(self.x[s, d] for d in self.S2dates[s])
                 <= self.y_under[s]
             )
+            self.model += self.shift_under[s]
 
         # 各スタッフに対して、y_over[s]は勤務希望日数の超過数を表す
         for s in self.S:
-            self.model += (
-                pulp.lpSum(self.x[s, d] for d in self.D) - self.S2max_shift[s]
+            self.shift_over[s] = (
+                pulp.lpSum(self.x[s, d] for d in self.S2dates[s]) - self.S2max_shift[s]
                 <= self.y_over[s]
             )
+            self.model += self.shift_over[s]
         # 各スタッフに対して、z_over[s]は休暇希望の違反数を表す
         for s in self.S:
             if self.S2ng_date[s] != "すべてOK":
                 self.model += (
-                    pulp.lpSum(self.x[s, d] for d in self.D if d == self.S2ng_date[s])
+                    pulp.lpSum(
+                        self.x[s, d] for d in self.S2dates[s] if d == self.S2ng_date[s]
+                    )
                     == self.z_over[s]
                 )
 
-    def solve(self):
-        solver = pulp.PULP_CBC_CMD(msg=0)
-        self.status = self.model.solve(solver)
+        # 連続勤務・休日の規則
+        self.add_window_constraints()
 
+        # モデルサイズの記録
+        self.perf.record_pulp_model_size(self.model)
+
+    def set_objective(self):
+        # 各スタッフの勤務希望日数の不足数、超過数と希望休暇違反を重みペナルティを考慮して最小化する
+        self.model.setObjective(
+            pulp.lpSum(
+                [
+                    self.S2penalty_weight[s] * (self.y_under[s] + self.y_over[s])
+                    for s in self.S
+                ]
+                + [self.penalty_off * self.z_over[s] for s in self.S]
+                # 過去の勤務履歴による公平性の項と休暇申請の項
+                # （出勤可能でない組の休暇申請は変数がないため含めない）
+                + [
+                    cost * self.x[s, d]
+                    for (s, d), cost in self.pair_costs().items()
+                    if (s, d) in self.x
+                ]
+            )
+        )
+
+    def update_model(self):
+        # スタッフ・日付・出勤可能な組・休暇希望日などの構造が同じモデルについて、
+        # 必要人数、希望出勤日数、ペナルティの数値だけを作り直さずに反映する
+        for d in self.D:
+            self.cover[d].changeRHS(self.D2required_staff[d])
+        for (k, d), constraint in self.cover_skill.items():
+            constraint.changeRHS(self.KD2required[k, d])
+        for s in self.S:
+            self.shift_under[s].changeRHS(-self.S2min_shift[s])
+            self.shift_over[s].changeRHS(self.S2max_shift[s])
+        # repairなどで固定された変数を元に戻す
+        for s, d in self.SD:
+            self.x[s, d].lowBound = 0
+            self.x[s, d].upBound = 1
+        self.set_leave_bounds()
+        self.set_objective()
+
+    def pair_costs(self):
+        # スタッフと日付の組ごとのシフトに入る場合のコスト（公平性の項と休暇申請の項の和）
+        costs = dict(self.SD2fairness)
+        for (s, d), kind in self.SD2leave.items():
+            if kind == "leave":
+                costs[s, d] = costs.get((s, d), 0) + self.penalty_off
+        return costs
+
+    def set_leave_bounds(self):
+        # 出勤不可の申請がある組は、変数の上限を0にする
+        for (s, d), kind in self.SD2leave.items():
+            if kind == "unavailable" and (s, d) in self.x:
+                self.x[s, d].upBound = 0
+
+    def apply_leave_requests(self, changes):
+        # changesはスタッフと日付の組 -> 申請の種類（取り消しならNone）
+        # 構築済みのモデルは作り直さず、変わった組の目的関数の係数と変数の上限だけを更新する
+        for (s, d), kind in changes.items():
+            previous = self.SD2leave.pop((s, d), None)
+            if kind is not None:
+                self.SD2leave[s, d] = kind
+            if self.model is None or (s, d) not in self.x:
+                continue
+            if previous == "leave":
+                self.model.objective.addterm(self.x[s, d], -self.penalty_off)
+            if kind == "leave":
+                self.model.objective.addterm(self.x[s, d], self.penalty_off)
+            self.x[s, d].upBound = 0 if kind == "unavailable" else 1
+
+    def add_coverage_constraints(self):
+        # 各日に対して、必要な人数がシフトに入る
+        for d in self.D:
+            self.cover[d] = (
+                pulp.lpSum(self.x[s, d] for s in self.D2staff[d])
+                >= self.D2required_staff[d]
+            )
+            self.model += self.cover[d]
+
+        # 各スキル・各日に対して、そのスキルを持つスタッフが必要な人数シフトに入る
+        # （責任者もスキルの1つ。スキル行列×割り当ての積を、スキル行列の非ゼロ要素と
+        # 出勤可能な日の組だけから一度に作り、必要人数が0の組には制約式を作らない）
+        KD2terms = {kd: [] for kd, n in self.KD2required.items() if n > 0}
+        for k, skill_staff in self.K2staff.items():
+            for s in skill_staff:
+                for d in self.S2dates[s]:
+                    if (k, d) in KD2terms:
+                        KD2terms[k, d].append((self.x[s, d], 1))
+        for (k, d), terms in KD2terms.items():
+            self.cover_skill[k, d] = pulp.LpConstraint(
+                pulp.LpAffineExpression(terms),
+                pulp.LpConstraintGE,
+                rhs=self.KD2required[k, d],
+            )
+            self.model.addConstraint(self.cover_skill[k, d])
+
+    def active_windows(self):
+        # 期間の最大出勤日数が期間の長さ以上なら、その規則は常に満たされる
+        windows = sorted((w, m) for w, m in self.work_windows if m < w <= len(self.D))
+
+        # 短い期間の規則から導かれる長い期間の規則は制約式にしない
+        # （長さw1で最大m1日なら、長さwではw // w1 * m1 + min(w % w1, m1)日以下）
+        active = []
+        for w, m in windows:
+            implied = min(
+                (w // w1 * m1 + min(w % w1, m1) for w1, m1 in active), default=w
+            )
+            if implied > m:
+                active.append((w, m))
+        return active
+
+    def add_window_constraints(self):
+        windows = self.active_windows()
+        if not windows:
+            return
+
+        # 期間内の出勤可能日数が最大出勤日数以下なら、その期間の制約式は作らない
+        # 比較用の素朴な定式化: 各スタッフ・各期間について出勤日数の和をとる
+        if self.window_formulation == "naive":
+            for w, m in windows:
+                for s in self.S:
+                    for t in range(len(self.D) - w + 1):
+                        period = [d for d in self.D[t : t + w] if (s, d) in self.x]
+                        if len(period) > m:
+                            self.model += pulp.lpSum(self.x[s, d] for d in period) <= m
+            return
+
+        # 累積出勤日数P[s, t]（最初のt日間の出勤日数）を補助変数とし、
+        # 期間の出勤日数をP[s, t] - P[s, t - w]の2項で表す
+        if self.window_formulation == "prefix":
+            T = range(1, len(self.D) + 1)
+            self.P = pulp.LpVariable.dicts(
+                "P", [(s, t) for s in self.S for t in T], lowBound=0, cat="Continuous"
+            )
+            for s in self.S:
+                for t in T:
+                    previous = self.P[s, t - 1] if t > 1 else 0
+                    self.model += self.P[s, t] == previous + self.x.get(
+                        (s, self.D[t - 1]), 0
+                    )
+                available = np.cumsum([0] + [(s, d) in self.x for d in self.D])
+                for w, m in windows:
+                    for t in range(w, len(self.D) + 1):
+                        if available[t] - available[t - w] > m:
+                            previous = self.P[s, t - w] if t > w else 0
+                            self.model += self.P[s, t] - previous <= m
+            return
+
+        # 期間の式を最初の1つだけ作り、以降は1日ずらす（先頭を消して末尾を足す）
+        for w, m in windows:
+            for s in self.S:
+                expr = pulp.LpAffineExpression(
+                    [(self.x[s, d], 1) for d in self.D[:w] if (s, d) in self.x]
+                )
+                for t in range(len(self.D) - w + 1):
+                    if t > 0:
+                        expr = expr.copy()
+                        if (s, self.D[t - 1]) in self.x:
+                            del expr[self.x[s, self.D[t - 1]]]
+                        if (s, self.D[t + w - 1]) in self.x:
+                            expr[self.x[s, self.D[t + w - 1]]] = 1
+                    if len(expr) > m:
+                        self.model.addConstraint(
+                            pulp.LpConstraint(expr, pulp.LpConstraintLE, rhs=m)
+                        )
+
+    def solve(self, greedy=False, relaxed=False, **solver_options):
+        # solver_optionsはPULP_CBC_CMDにそのまま渡す（timeLimit, threadsなど）
+        # greedy=Trueなら先に貪欲法でシフト表を作り、目的関数値が下界に一致すれば
+        # ソルバーを使わずにその解を返し、一致しなければ初期解としてソルバーに渡す
+        # relaxed=TrueならLP緩和だけを解き、丸めたシフト表と下界との差を返す（下書き用）
+        # ソルバーの設定はsolver_rulesで選んだものを既定値とし、solver_optionsで上書きする
+        self.lp_bound = None
+        self.gap = None
+        self.solver_settings = {}
+        self.solver_log = {}
+        self.solve_mode = "relaxed" if relaxed else "exact"
+        if greedy:
+            with self.perf.phase("greedy"):
+                greedy_df, feasible = greedy_schedule(self)
+                bound = lower_bound(self)
+            if feasible:
+                self.set_solution(greedy_df)
+                if self.evaluate(greedy_df) <= bound + 1e-9:
+                    self.status = pulp.LpStatusOptimal
+                    self.model.sol_status = pulp.LpSolutionOptimal
+                    self.sch_df = greedy_df
+                    # 下界に達しているので、ギャップは0
+                    self.gap = 0.0
+                    print("status:", pulp.LpStatus[self.status])
+                    print("backend: greedy")
+                    print("objective:", self.model.objective.value())
+                    if self.telemetry is not None:
+                        self.record_telemetry(backend="greedy", gap=self.gap)
+                    return
+                solver_options.setdefault("warmStart", True)
+
+        if relaxed:
+            solver_options.pop("warmStart", None)
+            self.solve_relaxed(**solver_options)
+            return
+
+        self.solver_settings = {
+            **select_settings(instance_features(self), self.solver_rules),
+            **solver_options,
+        }
+        # 下界を読むため、CBCのログを一時ファイルに書く
+        log_fd, log_path = tempfile.mkstemp(suffix=".log")
+        os.close(log_fd)
+        solver = pulp.PULP_CBC_CMD(
+            msg=0, **{"logPath": log_path, **self.solver_settings}
+        )
+        try:
+            with self.perf.phase("solver"):
+                self.status = self.model.solve(solver)
+            self.solver_log = read_cbc_log(solver.optionsDict["logPath"])
+        finally:
+            os.remove(log_path)
+
+        # 整数解が得られた場合だけ、目的関数値とCBCの下界から差を求める
+        objective = self.model.objective.value()
+        if self.model.sol_status == pulp.LpSolutionOptimal:
+            self.gap = 0.0
+        elif (
+            self.model.sol_status == pulp.LpSolutionIntegerFeasible
+            and self.solver_log["lower_bound"] is not None
+        ):
+            self.gap = max(0.0, objective - self.solver_log["lower_bound"]) / max(
+                1, abs(objective)
+            )
         print("status:", pulp.LpStatus[self.status])
-        print("objective:", self.model.objective.value())
+        print("objective:", objective)
+
+        with self.perf.phase("extract"):
+            self.extract_schedule()
+
+        if self.telemetry is not None:
+            self.record_telemetry(gap=self.gap)
+
+    def solve_relaxed(self, **solver_options):
+        # LP緩和を解き、その解を貪欲法と同じ手順で丸めて改善する
+        # 丸めで必要人数を満たせなければ、丸めたシフト表を初期解として整数計画を解く
+        self.solver_settings = dict(solver_options, mip=False)
+        with self.perf.phase("solver"):
+            self.status = self.model.solve(self.lp_solver(**solver_options))
+        if self.status != pulp.LpStatusOptimal:
+            print("status:", pulp.LpStatus[self.status])
+            print("mode:", self.solve_mode)
+            self.extract_schedule()
+            if self.telemetry is not None:
+                self.record_telemetry(backend="lp-rounding")
+            return
+        self.lp_bound = pulp.value(self.model.objective)
+
+        with self.perf.phase("rounding"):
+            values_df = pd.DataFrame(
+                [
+                    [
+                        self.x[s, d].value() or 0 if (s, d) in self.x else 0
+                        for d in self.D
+                    ]
+                    for s in self.S
+                ],
+                index=self.S,
+                columns=self.D,
+            )
+            sch_df, feasible = round_schedule(self, values_df)
+            self.set_solution(sch_df)
+        if not feasible:
+            print("status: rounding failed, solving the integer model")
+            self.solve(warmStart=True, **solver_options)
+            return
+
+        self.sch_df = sch_df
+        objective = pulp.value(self.model.objective)
+        self.gap = max(0.0, objective - self.lp_bound) / max(1, abs(objective))
+        self.model.sol_status = (
+            pulp.LpSolutionOptimal
+            if self.gap <= 1e-9
+            else pulp.LpSolutionIntegerFeasible
+        )
+        # LP緩和が最適でも、丸めたシフト表は下界に一致しなければ最適とは限らない
+        print("status:", pulp.LpSolution[self.model.sol_status])
+        print("mode:", self.solve_mode)
+        print("objective:", objective, "bound:", self.lp_bound, "gap:", self.gap)
+        if self.telemetry is not None:
+            self.record_telemetry(backend="lp-rounding", gap=self.gap)
+
+    def lp_solver(self, **solver_options):
+        # LP緩和を解くソルバー
+        # 大きなLPでは単体法より内点法のほうが速い
+        # （内点法の解は端点にならず丸めの質が少し落ちるため、小さなLPでは単体法を使う）
+        if len(self.x) >= BARRIER_MIN_VARIABLES:
+            solver_options = {"options": ["barrier"], **solver_options}
+        return pulp.PULP_CBC_CMD(msg=0, mip=False, **solver_options)
+
+    def set_solution(self, sch_df):
+        # シフト表を変数の値（初期解）として設定する
+        x = sch_df.loc[self.S, self.D].to_numpy()
+        S2index = {s: i for i, s in enumerate(self.S)}
+        D2index = {d: j for j, d in enumerate(self.D)}
+        for s, d in self.SD:
+            self.x[s, d].setInitialValue(int(x[S2index[s], D2index[d]]))
+        total_shift = dict(zip(self.S, x.sum(axis=1).tolist()))
+        for s in self.S:
+            self.y_under[s].setInitialValue(
+                max(0, self.S2min_shift[s] - total_shift[s])
+            )
+            self.y_over[s].setInitialValue(max(0, total_shift[s] - self.S2max_shift[s]))
+            ng_date = self.S2ng_date[s]
+            self.z_over[s].setInitialValue(
+                int(x[S2index[s], D2index[ng_date]]) if ng_date in D2index else 0
+            )
 
-        Rows = [[int(self.x[s, d].value()) for d in self.D] for s in self.S]
+    def extract_schedule(self):
+        # 解が得られなかった場合（値がNone）と出勤不可の組は0とする
+        Rows = [
+            [
+                round(self.x[s, d].value() or 0) if (s, d) in self.x else 0
+                for d in self.D
+            ]
+            for s in self.S
+        ]
         self.sch_df = pd.DataFrame(Rows, index=self.S, columns=self.D)
 
+    def record_telemetry(self, backend="pulp-cbc", gap=None, **fields):
+        # fieldsはステータスや目的関数値など、既定の値を上書きする項目
+        # 前回記録した後のフェーズの処理時間（初回はset_dataやbuild_modelも含む）
+        phases = self.perf.since(self.telemetry_mark)
+        self.telemetry_mark = self.perf.snapshot()
+        record = {
+            "instance_name": self.instance_name,
+            "input_hash": self.input_hash,
+            "num_staff": len(self.S),
+            "num_dates": len(self.D),
+            "backend": backend,
+            **self.perf.model_size,
+            "phases": phases,
+            "total_time": sum(phases.values()),
+            "status": pulp.LpStatus[self.status],
+            "mode": self.solve_mode,
+            "limit_reached": self.limit_reached(),
+            "objective": pulp.value(self.model.objective),
+            "gap": gap,
+            "solver_settings": self.solver_settings,
+        }
+        record.update(fields)
+        self.telemetry.append(record)
+
+    def limit_reached(self):
+        # 直前のsolveが制限時間などで打ち切られたか（1なら打ち切り）
+        # CBCの終了理由から判定する（下書きの丸めで下界との差が残った場合は打ち切りではない）
+        return int((self.solver_log.get("result") or "").startswith("Stopped"))
+
+    @contextmanager
+    def telemetry_paused(self):
+        # 内部で繰り返すsolveは記録せず、呼び出し元でまとめて1行として記録する
+        telemetry, self.telemetry = self.telemetry, None
+        try:
+            yield
+        finally:
+            self.telemetry = telemetry
+
+    def solve_pool(self, k=3, tolerance=0.0, **solver_options):
+        # 目的関数値が最良値から相対的にtolerance以内のシフト表を、互いに異なるものとしてk個まで列挙する
+        # モデルには除外のための制約式が追加されるため、再利用する場合はbuild_modelし直す
+        # 実行履歴には、内部で繰り返すsolveをまとめて1行として記録する
+        self.sch_pool = []  # シフト表のリスト
+        self.objective_pool = []  # 各シフト表の目的関数値
+
+        with self.telemetry_paused():
+            # 貪欲法は最初の1つにだけ使う（除外のための制約式は考慮しないため）
+            self.solve(greedy=solver_options.pop("greedy", False), **solver_options)
+            first = {
+                "status": pulp.LpStatus[self.status],
+                "limit_reached": self.limit_reached(),
+                "objective": pulp.value(self.model.objective),
+                "gap": self.gap,
+            }
+            if self.status == pulp.LpStatusOptimal:
+                self.enumerate_pool(k, tolerance, **solver_options)
+        if self.telemetry is not None:
+            self.record_telemetry(backend="solve-pool", **first)
+        return self.sch_pool
+
+    def enumerate_pool(self, k, tolerance, **solver_options):
+        # 最良のシフト表を求めた直後のモデルに除外の制約式を加えながら解き直す
+        best = pulp.value(self.model.objective)
+
+        # 目的関数値が許容範囲を超える解は探さない
+        self.model += self.model.objective.copy() <= best + tolerance * max(
+            1, abs(best)
+        )
+
+        while True:
+            self.sch_pool.append(self.sch_df)
+            self.objective_pool.append(pulp.value(self.model.objective))
+            if len(self.sch_pool) >= k:
+                break
+
+            # 直前のシフト表と1か所以上異なるようにするno-good cut
+            self.model += (
+                pulp.lpSum(
+                    1 - self.x[s, d] if self.sch_df.loc[s, d] == 1 else self.x[s, d]
+                    for s, d in self.SD
+                )
+                >= 1
+            )
+
+            # 直前のシフト表を初期解として渡し、モデルを作り直さずに解き直す
+            for s, d in self.SD:
+                self.x[s, d].setInitialValue(int(self.sch_df.loc[s, d]))
+            solver_options.setdefault("warmStart", True)
+            self.solve(**solver_options)
+            if self.status != pulp.LpStatusOptimal:
+                break
+
+        self.sch_df = self.sch_pool[0]
+
+    def evaluate(self, sch_df):
+        # ソルバーを使わずに、シフト表に対する目的関数値を計算する
+        total_shift = sch_df.loc[self.S, self.D].sum(axis=1)
+        objective = 0
+        for s in self.S:
+            under = max(0, self.S2min_shift[s] - total_shift[s])
+            over = max(0, total_shift[s] - self.S2max_shift[s])
+            objective += self.S2penalty_weight[s] * (under + over)
+            if self.S2ng_date[s] != "すべてOK":
+                objective += self.penalty_off * sch_df.loc[s, self.S2ng_date[s]]
+        for (s, d), cost in self.pair_costs().items():
+            objective += cost * sch_df.loc[s, d]
+        return objective
+
+    def is_feasible(self, sch_df):
+        # ソルバーを使わずに、シフト表が制約式（出勤できない組、出勤人数・スキルごとの人数、
+        # 連続勤務・休日の規則）をすべて満たすかを判定する
+        # （validatorと同じ検証を、repairなどで変更した後の現在のデータに対して行う）
+        S2index = {s: i for i, s in enumerate(self.S)}
+        D2index = {d: j for j, d in enumerate(self.D)}
+        x = sch_df.loc[self.S, self.D].to_numpy(dtype=np.int64)
+        allowed = np.zeros(x.shape, dtype=bool)
+        for s, d in self.SD:
+            if self.SD2leave.get((s, d)) != "unavailable":
+                allowed[S2index[s], D2index[d]] = True
+        if (x[~allowed] > 0).any():
+            return False
+
+        if (x.sum(axis=0) < [self.D2required_staff[d] for d in self.D]).any():
+            return False
+        for k in self.K:
+            rows = [S2index[s] for s in self.K2staff[k]]
+            if (x[rows].sum(axis=0) < [self.KD2required[k, d] for d in self.D]).any():
+                return False
+
+        cumsum = np.concatenate(
+            [np.zeros((len(self.S), 1), dtype=np.int64), x.cumsum(axis=1)], axis=1
+        )
+        for w, m in self.active_windows():
+            if (cumsum[:, w:] - cumsum[:, :-w] > m).any():
+                return False
+        return True
+
+    def fix_assignments(self, sch_df, free_pairs):
+        # free_pairs以外のスタッフと日付の組は、sch_dfのシフトに固定する
+        for s, d in self.SD:
+            value = int(sch_df.loc[s, d])
+            self.x[s, d].setInitialValue(value)
+            if (s, d) in free_pairs:
+                self.x[s, d].lowBound = 0
+                self.x[s, d].upBound = 1
+            else:
+                self.x[s, d].lowBound = value
+                self.x[s, d].upBound = value
+
+    def repair(
+        self,
+        sch_df,
+        unavailable=(),
+        required_staff=None,
+        required_leader=None,
+        radius=1,
+        change_penalty=1,
+        **solver_options,
+    ):
+        # unavailableは出勤できなくなったスタッフと日付の組のリスト
+        # required_staff, required_leaderは変更後の必要人数（日付をキーとする辞書）
+        if required_staff is not None:
+            self.D2required_staff.update(required_staff)
+        # 責任者人数はスキル「責任者」の必要人数として反映する
+        # （責任者のスキルがなければ、左辺が空の制約式で実行不可能になるため受け付けない）
+        if required_leader and "責任者" not in self.K:
+            raise ValueError(
+                "スタッフ情報に責任者フラグ、またはカレンダー情報に責任者人数がないため、"
+                "責任者人数を変更できません"
+            )
+        for d, n in (required_leader or {}).items():
+            self.KD2required["責任者", d] = n
+
+        # 変更のあった日の前後radius日と、出勤できなくなったスタッフを近傍とする
+        D2index = {d: i for i, d in enumerate(self.D)}
+        changed_dates = (
+            {d for _, d in unavailable}
+            | set(required_staff or {})
+            | set(required_leader or {})
+        )
+        near_dates = {
+            self.D[j]
+            for d in changed_dates
+            for j in range(
+                max(0, D2index[d] - radius), min(len(self.D), D2index[d] + radius + 1)
+            )
+        }
+        changed_staff = {s for s, _ in unavailable}
+        free_pairs = {
+            (s, d) for s, d in self.SD if d in near_dates or s in changed_staff
+        }
+
+        # 近傍の外側は元のシフトに固定してモデルを構築する
+        self.build_model()
+        self.fix_assignments(sch_df, free_pairs)
+
+        # 出勤できなくなったスタッフは、その日のシフトに入らない
+        for s, d in unavailable:
+            if (s, d) not in self.x:
+                continue
+            self.x[s, d].setInitialValue(0)
+            self.x[s, d].lowBound = 0
+            self.x[s, d].upBound = 0
+
+        # 近傍の中でも、元のシフトからの変更はできるだけ少なくする
+        self.model.setObjective(
+            self.model.objective
+            + pulp.lpSum(
+                (
+                    change_penalty * (1 - self.x[s, d])
+                    if sch_df.loc[s, d] == 1
+                    else change_penalty * self.x[s, d]
+                )
+                for s, d in free_pairs
+            )
+        )
+
+        solver_options.setdefault("warmStart", True)
+        self.solve(**solver_options)
+        return free_pairs
+
 
 if __name__ == "__main__":
     staff_df = pd.read_csv("data/staff.csv")
@@ -1,6 +1,8 @@
 import cvxpy as cp
 import pandas as pd
 
+from src.shift_scheduler.profiler import PhaseProfiler, profile_phase
+
 
 class ShiftScheduler:
     def __init__(self):
@@ -27,9 +29,13 @@ class ShiftScheduler:
         self.status = -1  # 最適化結果のステータス
         self.sch_df = None  # シフト表を表すデータフレーム
 
+        # 処理時間とモデルサイズの計測
+        self.perf = PhaseProfiler()
+
         # スタッフごとの重みペナルティ、各スタッフについてデフォルトは50として辞書を作成
         self.S2penalty_weight = {s: 50 for s in self.S}
 
+    @profile_phase("set_data")
     def set_data(self, staff_df, calendar_df, staff_penalty):
         # リストの設定
         self.S = staff_df["スタッフID"].tolist()
@@ -65,6 +71,7 @@ class ShiftScheduler:
         print("Staff Penalty Weight:", self.S2penalty_weight)
         print("=" * 50)
 
+    @profile_phase("build_model")
     def build_model(self):
         # 変数の定義
         self.x = cp.Variable((len(self.S), len(self.D)), boolean=True)
@@ -109,14 +116,23 @@ class ShiftScheduler:
         # 問題の定義
         self.prob = cp.Problem(objective, constraints)
 
+        # モデルサイズの記録
+        size_metrics = self.prob.size_metrics
+        self.perf.record_model_size(
+            size_metrics.num_scalar_variables,
+            size_metrics.num_scalar_eq_constr + size_metrics.num_scalar_leq_constr,
+        )
+
     def solve(self):
-        self.prob.solve()
+        with self.perf.phase("solver"):
+            self.prob.solve()
 
         if self.prob.status == cp.OPTIMAL:
             print("Optimal value:", self.prob.value)
-            self.sch_df = pd.DataFrame(
-                self.x.value.astype(int), index=self.S, columns=self.D
-            )
+            with self.perf.phase("extract"):
+                self.sch_df = pd.DataFrame(
+                    self.x.value.astype(int), index=self.S, columns=self.D
+                )
         else:
             print("Problem status:", self.prob.status)
 
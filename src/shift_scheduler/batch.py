@@ -0,0 +1,271 @@
+"""複数店舗のシフト表をまとめて作成するバッチ実行用のコマンドラインツール
+
+使い方:
+    python -m src.shift_scheduler.batch instances/ -o results/ --time-limit 60
+    python -m src.shift_scheduler.batch manifest.csv -o results/ --workers 8
+    python -m src.shift_scheduler.batch instances/ --profile-memory --profile-log
+    python -m src.shift_scheduler.batch instances/ --history history.sqlite --year 2023
+
+入力はディレクトリかマニフェストCSVのどちらか。
+- ディレクトリの場合: 各サブディレクトリを1インスタンスとし、
+  staff.csv, calendar.csv（必須）と penalty.csv, ng_date.csv, availability.csv,
+  history.sqlite（任意）を読み込む（staff.csv等の代わりにworkbook.xlsxがあれば、そのシートから読む）
+- マニフェストの場合: name, staff, calendar 列（必須）と
+  penalty, ng_date, availability, history, off_penalty, time_limit 列（任意）を持つCSV
+  （staff, calendar 列の代わりに workbook 列でワークブックを指定してもよい）
+
+penalty.csv は「スタッフID,ペナルティ」、ng_date.csv は「スタッフID,休暇希望日」の形式。
+availability.csv はシフト表と同じ形式（行がスタッフID、列が日付）で、0の組は出勤不可。
+history.sqlite は history.py で過去のシフト表を取り込んだ勤務履歴で、公平性のコストに使う
+（インスタンスごとに指定がなければ --history の勤務履歴を使う）。
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.history import HistoryStore, calendar_weekend_dates
+from src.shift_scheduler.profiler import LOG_ENV, TRACE_MEMORY_ENV
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+from src.shift_scheduler.tuning import set_max_threads, threads_per_worker
+from src.shift_scheduler.workbook import read_workbook
+
+# ペナルティのデフォルト値
+DEFAULT_PENALTY = 50
+
+
+def load_instances(path):
+    # マニフェストCSVの場合
+    if os.path.isfile(path):
+        manifest = pd.read_csv(path)
+        base_dir = os.path.dirname(os.path.abspath(path))
+        instances = []
+        for _, row in manifest.iterrows():
+            instance = {"name": str(row["name"])}
+            for key in [
+                "staff",
+                "calendar",
+                "penalty",
+                "ng_date",
+                "availability",
+                "history",
+                "workbook",
+            ]:
+                if key in row and pd.notna(row[key]):
+                    instance[key] = os.path.join(base_dir, row[key])
+            for key in ["off_penalty", "time_limit"]:
+                if key in row and pd.notna(row[key]):
+                    instance[key] = row[key]
+            instances.append(instance)
+        return instances
+
+    # ディレクトリの場合
+    instances = []
+    for name in sorted(os.listdir(path)):
+        instance_dir = os.path.join(path, name)
+        instance = {"name": name}
+        workbook_path = os.path.join(instance_dir, "workbook.xlsx")
+        if os.path.isfile(workbook_path):
+            instance["workbook"] = workbook_path
+        elif not os.path.isfile(os.path.join(instance_dir, "staff.csv")):
+            continue
+        for key in ["staff", "calendar", "penalty", "ng_date", "availability"]:
+            file_path = os.path.join(instance_dir, f"{key}.csv")
+            if os.path.isfile(file_path):
+                instance[key] = file_path
+        history_path = os.path.join(instance_dir, "history.sqlite")
+        if os.path.isfile(history_path):
+            instance["history"] = history_path
+        instances.append(instance)
+    return instances
+
+
+def read_instance(instance):
+    if "workbook" in instance:
+        # 1つのワークブックのシートから読む
+        staff_df, calendar_df, penalty, ng_date = read_workbook(instance["workbook"])
+    else:
+        staff_df = pd.read_csv(instance["staff"])
+        calendar_df = pd.read_csv(instance["calendar"])
+        penalty = {}
+        if "penalty" in instance:
+            penalty_df = pd.read_csv(instance["penalty"])
+            penalty = dict(zip(penalty_df["スタッフID"], penalty_df["ペナルティ"]))
+        ng_date = {}
+        if "ng_date" in instance:
+            ng_date_df = pd.read_csv(instance["ng_date"])
+            ng_date = dict(zip(ng_date_df["スタッフID"], ng_date_df["休暇希望日"]))
+
+    # スタッフごとの希望違反ペナルティ（指定がなければデフォルト値）
+    staff_penalty = {s: DEFAULT_PENALTY for s in staff_df["スタッフID"]}
+    staff_penalty.update(penalty)
+
+    # スタッフごとの休暇希望日（指定がなければすべてOK）
+    staff_ng_date = {s: "すべてOK" for s in staff_df["スタッフID"]}
+    staff_ng_date.update(ng_date)
+
+    off_penalty = int(instance.get("off_penalty", DEFAULT_PENALTY))
+    return staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty
+
+
+def read_availability(path, staff_df, calendar_df):
+    # CSVの行名・列名は文字列や整数になるため、スタッフ情報のスタッフIDと
+    # カレンダーの日付（整数の日番号など）に戻す
+    availability = pd.read_csv(path, index_col=0)
+    staff_lookup = {str(s): s for s in staff_df["スタッフID"]}
+    date_lookup = {str(d): d for d in calendar_df["日付"]}
+    index = [staff_lookup.get(str(s)) for s in availability.index]
+    columns = [date_lookup.get(str(d)) for d in availability.columns]
+    # 1つも一致しなければ、黙って全員出勤可能として扱わずにエラーにする
+    if all(s is None for s in index) or all(d is None for d in columns):
+        raise ValueError(
+            f"出勤可能な組のスタッフIDか日付が、スタッフ情報・カレンダー情報と一致しません: {path}"
+        )
+    availability.index = [
+        s if s is not None else label for s, label in zip(index, availability.index)
+    ]
+    availability.columns = [
+        d if d is not None else label for d, label in zip(columns, availability.columns)
+    ]
+    return availability
+
+
+def read_history(path):
+    # 存在しないファイルを指定した場合に、空の勤務履歴を作って黙って進めないようにする
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"勤務履歴がありません: {path}")
+    return HistoryStore(path).load()
+
+
+def solve_instance(instance, output_dir, time_limit=None, history=None, year=None):
+    start = time.perf_counter()
+    shift_scheduler = ShiftScheduler()
+    shift_scheduler.instance_name = instance["name"]
+    with shift_scheduler.perf.phase("read_csv"):
+        data = read_instance(instance)
+    availability = None
+    if "availability" in instance:
+        availability = read_availability(instance["availability"], data[0], data[1])
+    shift_scheduler.set_data(*data, availability=availability)
+    # 勤務履歴があれば、過去の出勤日数・土日の出勤日数・休暇希望の違反の偏りを公平性のコストにする
+    history = instance.get("history", history)
+    if history is not None:
+        shift_scheduler.set_history(
+            read_history(history), calendar_weekend_dates(data[1], year)
+        )
+    shift_scheduler.build_model()
+
+    # インスタンスごとの制限時間が指定されていればそちらを優先する
+    time_limit = instance.get("time_limit", time_limit)
+    # 貪欲法の解が下界に達していればソルバーは使わない
+    solver_options = {"greedy": True}
+    if time_limit is not None:
+        solver_options["timeLimit"] = float(time_limit)
+    shift_scheduler.solve(**solver_options)
+
+    shift_scheduler.sch_df.to_csv(os.path.join(output_dir, f"{instance['name']}.csv"))
+
+    result = {
+        "name": instance["name"],
+        "status": pulp.LpStatus[shift_scheduler.status],
+        "objective": pulp.value(shift_scheduler.model.objective),
+        "runtime": time.perf_counter() - start,
+        "num_staff": len(shift_scheduler.S),
+        "num_dates": len(shift_scheduler.D),
+    }
+    result.update(shift_scheduler.perf.model_size)
+    # フェーズごとの経過時間（計測した場合はピークメモリも）
+    for phase, record in shift_scheduler.perf.phases.items():
+        result[f"time_{phase}"] = record["wall_time"]
+        if record["peak_memory"] is not None:
+            result[f"memory_{phase}"] = record["peak_memory"]
+    return result
+
+
+def run_batch(
+    instances, output_dir, workers=None, time_limit=None, history=None, year=None
+):
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 各インスタンスのCBCはシングルスレッドで動くため、コア数だけプロセスを並べる
+    # （ソルバーのスレッド数は、合計がコア数を超えないようにワーカーごとに制限する）
+    summary = []
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=set_max_threads,
+        initargs=(threads_per_worker(workers),),
+    ) as executor:
+        futures = {
+            executor.submit(
+                solve_instance, instance, output_dir, time_limit, history, year
+            ): instance
+            for instance in instances
+        }
+        for future in as_completed(futures):
+            instance = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"name": instance["name"], "status": f"Error: {e}"}
+            print(f"{result['name']}: {result['status']}", file=sys.stderr)
+            summary.append(result)
+
+    summary_df = pd.DataFrame(summary).sort_values("name").reset_index(drop=True)
+    summary_df.to_csv(os.path.join(output_dir, "summary.csv"), index=False)
+    return summary_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="シフト表のバッチ作成")
+    parser.add_argument("input", help="インスタンスのディレクトリまたはマニフェストCSV")
+    parser.add_argument("-o", "--output", default="results", help="出力先ディレクトリ")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="並列数")
+    parser.add_argument(
+        "-t",
+        "--time-limit",
+        type=float,
+        default=None,
+        help="1インスタンスの制限時間[秒]",
+    )
+    parser.add_argument(
+        "--history", help="勤務履歴（history.sqlite）。インスタンスごとの指定が優先"
+    )
+    parser.add_argument(
+        "--year",
+        type=int,
+        default=None,
+        help="「7月1日」形式の日付の年（土日の判定に使う。省略すると今年）",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="フェーズごとのピークメモリも計測する（遅くなる）",
+    )
+    parser.add_argument(
+        "--profile-log", action="store_true", help="フェーズごとの計測結果をログに出す"
+    )
+    args = parser.parse_args(argv)
+
+    # ワーカーのプロセスにも環境変数で伝える
+    if args.profile_memory:
+        os.environ[TRACE_MEMORY_ENV] = "1"
+    if args.profile_log:
+        os.environ[LOG_ENV] = "1"
+        logging.basicConfig(level=logging.INFO, format="%(processName)s %(message)s")
+
+    instances = load_instances(args.input)
+    summary_df = run_batch(
+        instances, args.output, args.workers, args.time_limit, args.history, args.year
+    )
+    print(summary_df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
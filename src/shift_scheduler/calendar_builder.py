@@ -0,0 +1,111 @@
+"""期間と曜日・祝日ごとの必要人数のテンプレートからカレンダー情報を作る
+
+calendar.csvを手で書く代わりに、開始日・終了日と、曜日・祝日ごとの必要人数
+（出勤人数、責任者人数、スキルごとの人数）のテンプレートから、日ごとの必要人数を
+NumPyの配列演算でまとめて作る（365日分でも数ミリ秒）。
+
+出力の「日付」列は期間の先頭を0とする整数の日番号で、そのままShiftScheduler.set_dataに渡せる。
+実際の日付は「年月日」列、曜日は「曜日」列に入る。
+
+テンプレートの形式（JSON）:
+    {
+        "既定": {"出勤人数": 3, "責任者人数": 1},
+        "土日": {"出勤人数": 4},
+        "祝日": {"出勤人数": 4, "責任者人数": 2},
+        "2024-12-31": {"出勤人数": 5}
+    }
+キーは「既定」「平日」「土日」「月」〜「日」「祝日」と、個別の日付（YYYY-MM-DD）。
+この順に後のキーほど優先し、指定のない人数は0とする。
+
+使い方:
+    python -m src.shift_scheduler.calendar_builder 2024-04-01 2024-06-30 \\
+        --template template.json --holidays holidays.csv -o calendar.csv
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+
+# テンプレートのキー（後のキーほど優先する）
+TEMPLATE_KEYS = ["既定", "平日", "土日"] + WEEKDAYS + ["祝日"]
+
+# set_dataに必須の列
+REQUIRED_COLUMNS = ["出勤人数", "責任者人数"]
+
+
+def build_calendar(start, end, templates, holidays=()):
+    # startからendまで（両端を含む）の日ごとの必要人数
+    dates = pd.date_range(start, end, freq="D")
+    weekday = dates.dayofweek.to_numpy()
+    masks = {
+        "既定": np.ones(len(dates), dtype=bool),
+        "平日": weekday < 5,
+        "土日": weekday >= 5,
+        **{w: weekday == i for i, w in enumerate(WEEKDAYS)},
+        "祝日": dates.isin(pd.to_datetime(list(holidays))),
+    }
+
+    # 個別の日付のキーは、曜日・祝日のキーより後に適用する
+    keys = [key for key in TEMPLATE_KEYS if key in templates]
+    for key in templates:
+        if key in TEMPLATE_KEYS:
+            continue
+        try:
+            masks[key] = dates == pd.Timestamp(key)
+        except ValueError:
+            raise ValueError(f"テンプレートのキー {key} は使えません")
+        keys.append(key)
+
+    columns = list(REQUIRED_COLUMNS)
+    for key in keys:
+        columns += [c for c in templates[key] if c not in columns]
+
+    calendar_df = pd.DataFrame(
+        {
+            "日付": np.arange(len(dates)),
+            "年月日": dates,
+            "曜日": np.array(WEEKDAYS)[weekday],
+        }
+    )
+    for column in columns:
+        values = np.zeros(len(dates), dtype=np.int64)
+        for key in keys:
+            if column in templates[key]:
+                values[masks[key]] = templates[key][column]
+        calendar_df[column] = values
+    return calendar_df
+
+
+def read_holidays(path):
+    # 1列目が日付のCSV
+    return pd.to_datetime(pd.read_csv(path).iloc[:, 0]).tolist()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="カレンダー情報の作成")
+    parser.add_argument("start", help="開始日（YYYY-MM-DD）")
+    parser.add_argument("end", help="終了日（YYYY-MM-DD、この日を含む）")
+    parser.add_argument(
+        "--template", required=True, help="必要人数のテンプレートのJSON"
+    )
+    parser.add_argument("--holidays", help="祝日のCSV（1列目が日付）")
+    parser.add_argument("-o", "--output", default="calendar.csv")
+    args = parser.parse_args(argv)
+
+    with open(args.template, encoding="utf-8") as f:
+        templates = json.load(f)
+    holidays = read_holidays(args.holidays) if args.holidays else ()
+    calendar_df = build_calendar(args.start, args.end, templates, holidays)
+    calendar_df.to_csv(args.output, index=False, date_format="%Y-%m-%d")
+    print(calendar_df.head(10).to_string(index=False))
+    print("dates:", len(calendar_df), "output:", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
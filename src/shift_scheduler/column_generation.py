@@ -0,0 +1,572 @@
+"""勤務パターンを列とする列生成法によるシフト表の作成
+
+同じ条件（希望出勤日数、ペナルティ、休暇希望日、スキル、出勤可能日）のスタッフを
+1つのグループにまとめ、グループごとに期間全体の勤務パターン（日付ごとの0/1）を列とする
+主問題を解く。主問題の線形緩和の双対変数から、価格付け問題（動的計画法）で
+被約費用が負の勤務パターンを生成する。列が増えなくなったら、線形緩和の解を切り捨てて
+大部分のスタッフを勤務パターンに割り当て、残りのスタッフだけをShiftScheduler_8_2のモデルで解く
+（解けなければ、生成した列だけを使って主問題を整数計画で解く）。
+最大連続出勤日数以外の長い期間の規則があり、動的計画法の状態が多すぎる場合は、
+列生成を使わずShiftScheduler_8_2のモデルで解く。
+
+スタッフ数が多く、同じ条件のスタッフが多い場合は、スタッフごとの変数を持つ
+ShiftScheduler_8_2より主問題が小さく、対称な解の探索も起きない。
+ただし列生成の解はヒューリスティックであり、線形緩和の下界に一致した場合だけ最適とする
+（一致しなければmodel.sol_statusはLpSolutionIntegerFeasible）。
+結果のsch_dfはShiftScheduler_8_2と同じ形式（行がスタッフID、列が日付）。
+
+使い方:
+    python -m src.shift_scheduler.column_generation staff.csv calendar.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.batch import read_instance
+from src.shift_scheduler.profiler import profile_phase
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+# 価格付けの動的計画法で保持する状態数（日数×状態×出勤日数）の上限
+# これを超える規則では列生成を使わず、ShiftScheduler_8_2のモデルで解く
+MAX_PRICING_STATES = 2**24
+
+
+def is_run_length(windows):
+    # すべての規則が最大連続出勤日数（長さw + 1の期間でw日以下）の形か
+    return all(m == w - 1 for w, m in windows)
+
+
+def pricing_states(windows, num_dates):
+    # 価格付けの動的計画法で保持する状態数
+    if windows and is_run_length(windows):
+        num_states = min(m for _, m in windows) + 1
+    else:
+        num_states = 2 ** max(max([w for w, _ in windows], default=2) - 1, 1)
+    return num_dates * num_states * (num_dates + 1)
+
+
+def best_pattern(profit, windows, min_shift, max_shift, penalty_weight):
+    # 日ごとの利得profit（出勤不可の日は-inf）の和から希望出勤日数の違反のペナルティを引いた値を
+    # 最大にする勤務パターンを、連続勤務・休日の規則windowsを守る範囲で求める
+    # 最大連続出勤日数の規則だけなら、状態は連続出勤日数と出勤日数（期間の長さに比例）
+    # それ以外の規則があれば、状態は直近H日の勤務（ビット列）と出勤日数（2^H個）
+    if windows and is_run_length(windows):
+        V, choice = run_length_values(profit, min(m for _, m in windows))
+    else:
+        V, choice = mask_values(profit, windows)
+
+    num_dates = len(profit)
+    n = np.arange(num_dates + 1)
+    penalty = penalty_weight * (
+        np.maximum(0, min_shift - n) + np.maximum(0, n - max_shift)
+    )
+    total = V - penalty[None, :]
+    state, count = np.unravel_index(total.argmax(), total.shape)
+    return total[state, count], choice(state, count)
+
+
+def run_length_values(profit, max_consecutive):
+    # 状態は今日までの連続出勤日数r（0〜max_consecutive）と出勤日数
+    num_dates = len(profit)
+    M = max_consecutive
+    V = np.full((M + 1, num_dates + 1), -np.inf)
+    V[0, 0] = 0
+    # 休んだ日の前日の連続出勤日数（出勤した日の前日はr - 1に決まる）
+    rest_from = np.zeros((num_dates, num_dates + 1), dtype=np.int64)
+    for j in range(num_dates):
+        new_V = np.full_like(V, -np.inf)
+        new_V[0] = V.max(axis=0)
+        rest_from[j] = V.argmax(axis=0)
+        if np.isfinite(profit[j]):
+            new_V[1:, 1:] = V[:-1, :-1] + profit[j]
+        V = new_V
+
+    def choice(r, count):
+        # 最良の状態から勤務パターンを復元する
+        pattern = np.zeros(num_dates, dtype=np.int64)
+        for j in range(num_dates - 1, -1, -1):
+            if r > 0:
+                pattern[j] = 1
+                r -= 1
+                count -= 1
+            else:
+                r = rest_from[j, count]
+        return pattern
+
+    return V, choice
+
+
+def mask_values(profit, windows):
+    # 状態は直近H日の勤務（ビット列）と出勤日数
+    num_dates = len(profit)
+    H = max([w for w, _ in windows], default=2) - 1
+    H = max(H, 1)
+    num_masks = 2**H
+    half = num_masks // 2
+
+    # 今日を含む直近H + 1日の勤務について、すべての規則を満たすか
+    full = np.arange(2 ** (H + 1))
+    bits = (full[:, None] >> np.arange(H + 1)) & 1
+    feasible = np.ones(len(full), dtype=bool)
+    for w, m in windows:
+        feasible &= bits[:, :w].sum(axis=1) <= m
+
+    masks = np.arange(num_masks)
+    V = np.full((num_masks, num_dates + 1), -np.inf)
+    V[0, 0] = 0
+    # 各日・各状態で最良だった前日の状態の最上位ビット
+    top_bits = np.zeros((num_dates, num_masks, num_dates + 1), dtype=np.int8)
+    for j in range(num_dates):
+        new_V = np.full_like(V, -np.inf)
+        for b in (0, 1):
+            if b == 1 and not np.isfinite(profit[j]):
+                continue
+            candidate = np.where(feasible[(masks << 1) | b][:, None], V, -np.inf)
+            if b == 1:
+                candidate = np.concatenate(
+                    [np.full((num_masks, 1), -np.inf), candidate[:, :-1] + profit[j]],
+                    axis=1,
+                )
+            # 前日の状態 top * half + rest から今日の状態 rest * 2 + b に移る
+            candidate = candidate.reshape(2, half, num_dates + 1)
+            new_V[b::2] = candidate.max(axis=0)
+            top_bits[j, b::2] = candidate.argmax(axis=0)
+        V = new_V
+
+    def choice(mask, count):
+        # 最良の状態から勤務パターンを復元する
+        pattern = np.zeros(num_dates, dtype=np.int64)
+        for j in range(num_dates - 1, -1, -1):
+            b = mask & 1
+            top = top_bits[j, mask, count]
+            pattern[j] = b
+            mask = top * half + (mask >> 1)
+            count -= b
+        return pattern
+
+    return V, choice
+
+
+class ColumnGenerationScheduler(ShiftScheduler):
+    def __init__(self):
+        super().__init__()
+
+        # 列生成の設定
+        self.max_iterations = 200  # 列生成の最大反復回数
+        self.time_limit = None  # 列生成の制限時間[秒]（整数解の探索は含まない）
+        self.tolerance = 1e-6  # 被約費用がこれより小さい（負の）列だけを追加する
+        self.fallback = False  # 列生成を使わずShiftScheduler_8_2のモデルで解くか
+
+        # スタッフのグループ
+        self.groups = []  # グループのリスト（グループごとの条件の辞書）
+        self.group_staff = []  # 各グループのスタッフのリスト
+
+        # 主問題
+        self.columns = []  # (グループ, 勤務パターン, 変数) のリスト
+        self.cover = {}  # 各日の必要人数の制約式
+        self.cover_skill = {}  # 各スキル・各日の必要人数の制約式
+        self.convexity = {}  # 各グループの人数の制約式
+        self.artificial = {}  # 必要人数の不足を表す人工変数
+
+        # 最適化結果
+        self.lp_bound = None  # 線形緩和の最適値（目的関数値の下界）
+        self.gap = None  # 整数解と下界の相対的な差
+        self.history = []  # 反復ごとの線形緩和の目的関数値と列の数
+
+    def make_groups(self):
+        # 条件が同じスタッフを1つのグループにまとめる
+        S2skills = {
+            s: tuple(k for k in self.K if s in set(self.K2staff[k])) for s in self.S
+        }
+        # 公平性のコストと休暇申請のペナルティ
+        pair_costs = self.pair_costs()
+        S2fairness = {
+            s: tuple(pair_costs.get((s, d), 0.0) for d in self.D) for s in self.S
+        }
+        # 出勤不可の申請がある日は出勤可能な日から除く
+        S2dates = {
+            s: tuple(
+                d for d in self.S2dates[s] if self.SD2leave.get((s, d)) != "unavailable"
+            )
+            for s in self.S
+        }
+        key2index = {}
+        self.groups = []
+        self.group_staff = []
+        for s in self.S:
+            key = (
+                self.S2min_shift[s],
+                self.S2max_shift[s],
+                self.S2penalty_weight[s],
+                self.S2ng_date[s],
+                S2skills[s],
+                S2dates[s],
+                S2fairness[s],
+            )
+            if key not in key2index:
+                key2index[key] = len(self.groups)
+                self.groups.append(
+                    {
+                        "min_shift": self.S2min_shift[s],
+                        "max_shift": self.S2max_shift[s],
+                        "penalty_weight": self.S2penalty_weight[s],
+                        "ng_date": self.S2ng_date[s],
+                        "skills": S2skills[s],
+                        "available": np.isin(self.D, S2dates[s]),
+                        "fairness": np.array(S2fairness[s]),
+                    }
+                )
+                self.group_staff.append([])
+            self.group_staff[key2index[key]].append(s)
+
+    def pattern_cost(self, g, pattern):
+        # 勤務パターンに対するスタッフ1人分の目的関数値
+        group = self.groups[g]
+        n = int(pattern.sum())
+        cost = group["penalty_weight"] * (
+            max(0, group["min_shift"] - n) + max(0, n - group["max_shift"])
+        )
+        if group["ng_date"] in self.D:
+            cost += self.penalty_off * pattern[self.D.index(group["ng_date"])]
+        # 過去の勤務履歴による公平性のコスト
+        cost += float(group["fairness"] @ pattern)
+        return cost
+
+    def add_column(self, g, pattern):
+        var = pulp.LpVariable(f"pattern_{len(self.columns)}", lowBound=0)
+        self.model.objective.addterm(var, self.pattern_cost(g, pattern))
+        self.convexity[g].expr.addterm(var, 1)
+        for j in np.nonzero(pattern)[0]:
+            d = self.D[j]
+            self.cover[d].expr.addterm(var, 1)
+            for k in self.groups[g]["skills"]:
+                if (k, d) in self.cover_skill:
+                    self.cover_skill[k, d].expr.addterm(var, 1)
+        self.columns.append((g, pattern, var))
+
+    def build_model(self):
+        # 価格付けの動的計画法の状態が多すぎる規則なら、ShiftScheduler_8_2のモデルで解く
+        windows = self.active_windows()
+        self.fallback = pricing_states(windows, len(self.D)) > MAX_PRICING_STATES
+        if self.fallback:
+            print("column generation: work windows too long, using the MILP model")
+            super().build_model()
+            return
+        self.build_master()
+
+    @profile_phase("build_model")
+    def build_master(self):
+        self.make_groups()
+
+        ### 数理モデルの定義 ###
+        self.model = pulp.LpProblem("ColumnGeneration", pulp.LpMinimize)
+
+        # 必要人数の不足は、どのシフト表の目的関数値よりも大きいペナルティで許す
+        # （列が少ない最初の主問題でも実行可能にするため）
+        big = (
+            sum(self.S2penalty_weight[s] for s in self.S) * len(self.D)
+            + self.penalty_off * len(self.S)
+            + 1
+        )
+        self.artificial = pulp.LpVariable.dicts("short", self.D, lowBound=0)
+        self.model += pulp.lpSum(big * self.artificial[d] for d in self.D)
+
+        ### 制約式の定義 ###
+        # 各日に対して、必要な人数がシフトに入る
+        self.cover = {}
+        for d in self.D:
+            self.cover[d] = pulp.LpConstraint(
+                pulp.LpAffineExpression([(self.artificial[d], 1)]),
+                pulp.LpConstraintGE,
+                rhs=self.D2required_staff[d],
+            )
+            self.model.addConstraint(self.cover[d])
+
+        # 各スキル・各日に対して、そのスキルを持つスタッフが必要な人数シフトに入る
+        self.cover_skill = {}
+        for k in self.K:
+            for d in self.D:
+                if self.KD2required[k, d] > 0:
+                    self.cover_skill[k, d] = pulp.LpConstraint(
+                        pulp.LpAffineExpression([(self.artificial[d], 1)]),
+                        pulp.LpConstraintGE,
+                        rhs=self.KD2required[k, d],
+                    )
+                    self.model.addConstraint(self.cover_skill[k, d])
+
+        # 各グループに対して、勤務パターンに割り当てる人数の合計はグループの人数
+        self.convexity = {}
+        for g, staff in enumerate(self.group_staff):
+            self.convexity[g] = pulp.LpConstraint(
+                pulp.LpAffineExpression(), pulp.LpConstraintEQ, rhs=len(staff)
+            )
+            self.model.addConstraint(self.convexity[g])
+
+        # 最初の列は、双対変数が0のときの価格付け問題の解（ペナルティが最小の勤務パターン）
+        self.columns = []
+        windows = self.active_windows()
+        for g, group in enumerate(self.groups):
+            profit = np.where(group["available"], 0.0, -np.inf)
+            _, pattern = best_pattern(
+                profit,
+                windows,
+                group["min_shift"],
+                group["max_shift"],
+                group["penalty_weight"],
+            )
+            self.add_column(g, pattern)
+
+        self.perf.record_pulp_model_size(self.model)
+
+    def price(self):
+        # 主問題の双対変数から、各グループについて被約費用が最小の勤務パターンを求める
+        windows = self.active_windows()
+        pi = np.array([self.cover[d].pi or 0.0 for d in self.D])
+        new_columns = []
+        for g, group in enumerate(self.groups):
+            profit = pi.copy()
+            for k in group["skills"]:
+                profit += [
+                    (
+                        self.cover_skill[k, d].pi or 0.0
+                        if (k, d) in self.cover_skill
+                        else 0
+                    )
+                    for d in self.D
+                ]
+            if group["ng_date"] in self.D:
+                profit[self.D.index(group["ng_date"])] -= self.penalty_off
+            profit -= group["fairness"]
+            profit[~group["available"]] = -np.inf
+
+            value, pattern = best_pattern(
+                profit,
+                windows,
+                group["min_shift"],
+                group["max_shift"],
+                group["penalty_weight"],
+            )
+            reduced_cost = -value - (self.convexity[g].pi or 0.0)
+            if reduced_cost < -self.tolerance:
+                new_columns.append((g, pattern))
+        return new_columns
+
+    def solve(self, **solver_options):
+        # solver_optionsは整数解を求める際のPULP_CBC_CMDにそのまま渡す（timeLimitなど）
+        if self.fallback:
+            super().solve(**solver_options)
+            return
+
+        start = time.perf_counter()
+        self.history = []
+        converged = False
+        for iteration in range(self.max_iterations):
+            with self.perf.phase("master"):
+                self.model.solve(pulp.PULP_CBC_CMD(msg=0))
+            self.lp_bound = pulp.value(self.model.objective)
+            self.history.append(
+                {
+                    "iteration": iteration,
+                    "objective": self.lp_bound,
+                    "columns": len(self.columns),
+                }
+            )
+
+            with self.perf.phase("pricing"):
+                new_columns = self.price()
+            if not new_columns:
+                converged = True
+                break
+            for g, pattern in new_columns:
+                self.add_column(g, pattern)
+            if (
+                self.time_limit is not None
+                and time.perf_counter() - start > self.time_limit
+            ):
+                break
+
+        with self.perf.phase("solver"):
+            # 線形緩和の解の切り捨てで大部分のスタッフを割り当て、残りのスタッフだけを解く
+            # 残りを割り当てられなければ、生成した列だけを使って主問題を整数計画で解く
+            if not self.solve_residual(**solver_options):
+                for _, _, var in self.columns:
+                    var.cat = pulp.LpInteger
+                for d in self.D:
+                    self.artificial[d].cat = pulp.LpInteger
+                self.status = self.model.solve(
+                    pulp.PULP_CBC_CMD(msg=0, **solver_options)
+                )
+
+        # 必要人数を満たせない場合は実行不可能とする
+        if any((self.artificial[d].value() or 0) > 0.5 for d in self.D):
+            self.status = pulp.LpStatusInfeasible
+            self.model.sol_status = pulp.LpSolutionInfeasible
+
+        # 収束する前の主問題の線形緩和の値は下界ではないため、差は求めない
+        objective = pulp.value(self.model.objective)
+        self.gap = None
+        if converged and objective is not None and self.lp_bound is not None:
+            self.gap = max(0.0, objective - self.lp_bound) / max(1, abs(objective))
+        # 列生成が収束し、整数解が線形緩和の下界に一致した場合だけ最適とする
+        # （残りのスタッフのモデルや生成した列だけの整数計画の「最適」は、全体の最適を意味しない）
+        if self.status == pulp.LpStatusOptimal and not (
+            converged and self.gap is not None and self.gap <= self.tolerance
+        ):
+            self.model.sol_status = pulp.LpSolutionIntegerFeasible
+        print("status:", pulp.LpSolution[self.model.sol_status])
+        print("objective:", objective)
+        print("columns:", len(self.columns), "gap:", self.gap)
+
+        with self.perf.phase("extract"):
+            self.extract_schedule()
+        self.perf.record_pulp_model_size(self.model)
+
+        if self.telemetry is not None:
+            # 反復回数・制限時間で列生成を打ち切った場合を打ち切りとする
+            self.record_telemetry(
+                backend="column-generation",
+                gap=self.gap,
+                limit_reached=int(not converged),
+            )
+
+    def solve_residual(self, **solver_options):
+        # 線形緩和の解の各列の人数を切り捨てて、グループのスタッフに先頭から割り当てる
+        counts = [
+            np.floor((var.value() or 0) + self.tolerance) for _, _, var in self.columns
+        ]
+        left = [len(staff) for staff in self.group_staff]
+        covered = {d: 0 for d in self.D}
+        covered_skill = {kd: 0 for kd in self.cover_skill}
+        for (g, pattern, _), count in zip(self.columns, counts):
+            left[g] -= count
+            for j in np.nonzero(pattern)[0]:
+                covered[self.D[j]] += count
+                for k in self.groups[g]["skills"]:
+                    if (k, self.D[j]) in covered_skill:
+                        covered_skill[k, self.D[j]] += count
+        if min(left) < 0:
+            return False
+
+        # 残りのスタッフは、不足する人数を必要人数としてShiftScheduler_8_2のモデルで解く
+        # （同じ条件のスタッフが多いほど残りのスタッフは少なく、すぐに解ける）
+        residual = ShiftScheduler()
+        residual.telemetry = None
+        residual.S = [
+            s
+            for g, staff in enumerate(self.group_staff)
+            for s in staff[len(staff) - int(left[g]) :]
+        ]
+        residual.D = self.D
+        residual.SD = [(s, d) for s in residual.S for d in self.S2dates[s]]
+        residual.S2dates = {s: self.S2dates[s] for s in residual.S}
+        residual.D2staff = {d: [] for d in self.D}
+        for s, d in residual.SD:
+            residual.D2staff[d].append(s)
+        residual.S2min_shift = self.S2min_shift
+        residual.S2max_shift = self.S2max_shift
+        residual.S2penalty_weight = self.S2penalty_weight
+        residual.S2ng_date = self.S2ng_date
+        residual.penalty_off = self.penalty_off
+        residual.K = self.K
+        residual.K2staff = {
+            k: [s for s in staff if s in residual.S2dates]
+            for k, staff in self.K2staff.items()
+        }
+        residual.D2required_staff = {
+            d: max(0, self.D2required_staff[d] - covered[d]) for d in self.D
+        }
+        residual.KD2required = {
+            (k, d): max(0, self.KD2required[k, d] - covered_skill.get((k, d), 0))
+            for k in self.K
+            for d in self.D
+        }
+        residual_staff = set(residual.S)
+        residual.SD2fairness = {
+            (s, d): cost
+            for (s, d), cost in self.SD2fairness.items()
+            if s in residual_staff
+        }
+        residual.SD2leave = {
+            (s, d): kind
+            for (s, d), kind in self.SD2leave.items()
+            if s in residual_staff
+        }
+        residual.work_windows = self.work_windows
+        residual.window_formulation = self.window_formulation
+        residual.build_model()
+        residual.solve(**solver_options)
+        if residual.model.sol_status not in (
+            pulp.LpSolutionOptimal,
+            pulp.LpSolutionIntegerFeasible,
+        ):
+            return False
+
+        # 残りのスタッフの勤務パターンを1人分の列として加え、主問題の解とする
+        S2group = {s: g for g, staff in enumerate(self.group_staff) for s in staff}
+        for (_, _, var), count in zip(self.columns, counts):
+            var.varValue = count
+        for d in self.D:
+            self.artificial[d].varValue = 0
+        for s in residual.S:
+            self.add_column(S2group[s], residual.sch_df.loc[s].to_numpy())
+            self.columns[-1][2].varValue = 1
+        self.status = residual.status
+        self.model.sol_status = residual.model.sol_status
+        return True
+
+    def extract_schedule(self):
+        if self.fallback:
+            super().extract_schedule()
+            return
+        # 各勤務パターンに割り当てられた人数分、グループのスタッフに順に割り当てる
+        rows = {}
+        next_staff = [iter(staff) for staff in self.group_staff]
+        for g, pattern, var in self.columns:
+            for _ in range(round(var.value() or 0)):
+                s = next(next_staff[g], None)
+                if s is not None:
+                    rows[s] = pattern
+        self.sch_df = pd.DataFrame(
+            [rows.get(s, np.zeros(len(self.D), dtype=np.int64)) for s in self.S],
+            index=self.S,
+            columns=self.D,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="列生成法によるシフト表の作成")
+    parser.add_argument("staff", help="スタッフ情報のCSV")
+    parser.add_argument("calendar", help="カレンダー情報のCSV")
+    parser.add_argument("--time-limit", type=float, help="整数解の探索の制限時間[秒]")
+    parser.add_argument("--max-consecutive", type=int, help="最大連続出勤日数")
+    parser.add_argument(
+        "--min-rest",
+        type=int,
+        nargs=2,
+        metavar=("WINDOW", "DAYS"),
+        help="期間内の最低休日数",
+    )
+    parser.add_argument("-o", "--output", default="output.csv")
+    args = parser.parse_args(argv)
+
+    shift_sch = ColumnGenerationScheduler()
+    shift_sch.set_data(
+        *read_instance({"staff": args.staff, "calendar": args.calendar}),
+        max_consecutive=args.max_consecutive,
+        min_rest=tuple(args.min_rest) if args.min_rest else None,
+    )
+    shift_sch.build_model()
+    solver_options = {}
+    if args.time_limit is not None:
+        solver_options["timeLimit"] = args.time_limit
+    shift_sch.solve(**solver_options)
+    print("groups:", len(shift_sch.groups), "staff:", len(shift_sch.S))
+    shift_sch.sch_df.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""貪欲法によるシフト表の作成と目的関数値の下界
+
+日付の順に、出勤可能で連続勤務・休日の規則に違反しないスタッフの中から、
+希望出勤日数と休暇希望に照らして優先度の高いスタッフを、
+責任者などのスキルごとの人数、出勤人数の順に割り当てる。
+その後、1日ごとのスタッフの追加・削除・入れ替えと、休暇希望日などの出勤を
+別の日のスタッフと交換する操作で、目的関数値が下がる限り改善する。
+スタッフごとの計算はすべてNumPyの配列演算で行う。
+
+ShiftScheduler.solve(greedy=True)では、貪欲法の目的関数値が下界に一致すれば
+ソルバーを使わずにその解を返し、一致しなければ初期解としてソルバーに渡す。
+ShiftScheduler.solve(relaxed=True)では、LP緩和の解を同じ手順で丸めて改善する。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class GreedyScheduler:
+    def __init__(self, shift_scheduler, max_passes=3):
+        # set_data済みのShiftSchedulerから、スタッフ×日付の配列を作る
+        sch = shift_scheduler
+        self.S = sch.S
+        self.D = sch.D
+        self.max_passes = max_passes  # 改善を繰り返す最大回数
+        S2index = {s: i for i, s in enumerate(sch.S)}
+        D2index = {d: j for j, d in enumerate(sch.D)}
+
+        self.available = np.zeros((len(sch.S), len(sch.D)), dtype=bool)
+        for s, d in sch.SD:
+            self.available[S2index[s], D2index[d]] = True
+        # 休暇申請の組（出勤不可の組は出勤可能から外す）
+        self.leave = np.zeros((len(sch.S), len(sch.D)), dtype=bool)
+        for (s, d), kind in sch.SD2leave.items():
+            if kind == "unavailable":
+                self.available[S2index[s], D2index[d]] = False
+            else:
+                self.leave[S2index[s], D2index[d]] = True
+        self.skill_matrix = np.zeros((len(sch.K), len(sch.S)), dtype=bool)
+        for k_index, k in enumerate(sch.K):
+            self.skill_matrix[k_index, [S2index[s] for s in sch.K2staff[k]]] = True
+
+        self.min_shift = np.array([sch.S2min_shift[s] for s in sch.S])
+        self.max_shift = np.array([sch.S2max_shift[s] for s in sch.S])
+        self.penalty_weight = np.array([sch.S2penalty_weight[s] for s in sch.S])
+        self.ng_index = np.array([D2index.get(sch.S2ng_date[s], -1) for s in sch.S])
+        self.penalty_off = sch.penalty_off
+        self.required_staff = np.array([sch.D2required_staff[d] for d in sch.D])
+        self.required_skill = np.array(
+            [[sch.KD2required[k, d] for d in sch.D] for k in sch.K], dtype=np.int64
+        ).reshape(len(sch.K), len(sch.D))
+        # 公平性のコストと休暇申請のペナルティ
+        self.fairness = np.zeros((len(sch.S), len(sch.D)))
+        for (s, d), cost in sch.pair_costs().items():
+            self.fairness[S2index[s], D2index[d]] = cost
+        self.windows = sch.active_windows()
+
+        # シフト表と出勤日数
+        self.x = np.zeros((len(sch.S), len(sch.D)), dtype=np.int64)
+        self.total = np.zeros(len(sch.S), dtype=np.int64)
+
+    def penalty(self, n):
+        return self.penalty_weight * (
+            np.maximum(0, self.min_shift - n) + np.maximum(0, n - self.max_shift)
+        )
+
+    def addable(self, j):
+        # 日付jにシフトを追加しても、出勤可能で連続勤務・休日の規則に違反しないスタッフ
+        ok = self.available[:, j] & (self.x[:, j] == 0)
+        cumsum = np.concatenate(
+            [np.zeros((len(self.S), 1), dtype=np.int64), self.x.cumsum(axis=1)], axis=1
+        )
+        for w, m in self.windows:
+            for a in range(max(0, j - w + 1), min(j, len(self.D) - w) + 1):
+                ok &= cumsum[:, a + w] - cumsum[:, a] < m
+        return ok
+
+    def deltas(self, j):
+        # 日付jにシフトを追加・削除した場合の目的関数値の変化
+        extra = self.penalty_off * (self.ng_index == j) + self.fairness[:, j]
+        current = self.penalty(self.total)
+        add = self.penalty(self.total + 1) - current + extra
+        remove = self.penalty(self.total - 1) - current - extra
+        return add, remove
+
+    def set(self, i, j, value):
+        self.total[i] += value - self.x[i, j]
+        self.x[i, j] = value
+
+    def fill(self, j, ok, order, chosen):
+        # 日付jの必要人数に足りない分を、orderの順に出勤可能なスタッフから選ぶ（chosenを更新する）
+        feasible = True
+        # スキルごとの人数（候補の少ないスキルから）
+        num_candidates = (self.skill_matrix & ok).sum(axis=1)
+        for k_index in np.argsort(num_candidates - self.required_skill[:, j]):
+            short = (
+                self.required_skill[k_index, j]
+                - (chosen & self.skill_matrix[k_index]).sum()
+            )
+            if short <= 0:
+                continue
+            candidates = order[self.skill_matrix[k_index, order] & ~chosen[order]]
+            chosen[candidates[:short]] = True
+            feasible &= len(candidates) >= short
+
+        # 出勤人数
+        short = self.required_staff[j] - chosen.sum()
+        candidates = order[~chosen[order]]
+        if short > 0:
+            chosen[candidates[:short]] = True
+            feasible &= len(candidates) >= short
+        return feasible
+
+    def construct(self):
+        # 各日より後の出勤可能日数
+        remaining = self.available[:, ::-1].cumsum(axis=1)[:, ::-1] - self.available
+        feasible = True
+        for j in range(len(self.D)):
+            ok = self.addable(j)
+            add, _ = self.deltas(j)
+
+            # 優先順位（同じ順位なら公平性のコストが小さい順）
+            # 1. 希望最小出勤日数に足りないスタッフ（残りの出勤可能日数に余裕がない順）
+            # 2. 希望最大出勤日数まで余裕があるスタッフ（余裕の割合が大きい順）
+            # 3. 休暇希望日・休暇申請のスタッフと希望最大出勤日数に達したスタッフ（コストが小さい順）
+            category = np.select(
+                [
+                    (self.ng_index == j)
+                    | self.leave[:, j]
+                    | (self.total >= self.max_shift),
+                    self.total < self.min_shift,
+                ],
+                [2, 0],
+                1,
+            )
+            score = np.select(
+                [category == 0, category == 1],
+                [
+                    remaining[:, j] - (self.min_shift - self.total),
+                    -(self.max_shift - self.total) / (remaining[:, j] + 1),
+                ],
+                add,
+            )
+            order = np.lexsort((self.fairness[:, j], score, category))
+            order = order[ok[order]]
+
+            chosen = np.zeros(len(self.S), dtype=bool)
+            feasible &= self.fill(j, ok, order, chosen)
+
+            # 今日出勤しないと希望最小出勤日数に届かないスタッフも割り当てる
+            chosen |= ok & (self.min_shift - self.total > remaining[:, j]) & (add < 0)
+
+            self.x[chosen, j] = 1
+            self.total += chosen
+        return bool(feasible)
+
+    def round(self, values):
+        # LP緩和の解valuesを丸める。0.5以上の組を出勤とし、連続勤務・休日の規則に
+        # 違反する組は除き、必要人数に足りない分は値の大きいスタッフから補う
+        feasible = True
+        for j in range(len(self.D)):
+            ok = self.addable(j)
+            order = np.argsort(-values[:, j], kind="stable")
+            order = order[ok[order]]
+            chosen = ok & (values[:, j] >= 0.5)
+            feasible &= self.fill(j, ok, order, chosen)
+            self.x[chosen, j] = 1
+            self.total += chosen
+        return bool(feasible)
+
+    def best_move(self, j):
+        # 日付jについて、目的関数値が下がる追加・削除・入れ替えを1つ求める
+        add, remove = self.deltas(j)
+        addable = self.addable(j)
+        assigned = self.x[:, j] == 1
+        staff_slack = assigned.sum() - self.required_staff[j]
+        skill_slack = (self.skill_matrix & assigned).sum(axis=1)
+        skill_slack -= self.required_skill[:, j]
+
+        # 追加（必要人数は満たしたまま）
+        add_cost = np.where(addable, add, np.inf)
+        t = int(add_cost.argmin())
+        if add_cost[t] < -1e-9:
+            return None, t
+
+        # 削除（出勤人数と、そのスタッフのスキルごとの人数に余裕がある場合）
+        removable = assigned & (staff_slack > 0)
+        removable &= ~(self.skill_matrix & (skill_slack <= 0)[:, None]).any(axis=0)
+        remove_cost = np.where(removable, remove, np.inf)
+        s = int(remove_cost.argmin())
+        if remove_cost[s] < -1e-9:
+            return s, None
+
+        # 入れ替え（余裕のないスキルは、入れ替え先も持っている必要がある）
+        best_add = add_cost.min()
+        for s in np.nonzero(assigned)[0][np.argsort(remove[assigned])]:
+            if remove[s] + best_add >= -1e-9:
+                break
+            tight = self.skill_matrix[:, s] & (skill_slack <= 0)
+            candidates = addable & self.skill_matrix[tight].all(axis=0)
+            swap_cost = np.where(candidates, add, np.inf)
+            t = int(swap_cost.argmin())
+            if remove[s] + swap_cost[t] < -1e-9:
+                return s, t
+        return None
+
+    def best_exchange(self, j):
+        # 日付jに休暇希望日などでコストのかかるスタッフsと、別の日j2のスタッフtの出勤日を交換する
+        # （出勤日数は変わらないので、希望出勤日数の違反も変わらない）
+        extra = (
+            self.penalty_off * (self.ng_index[:, None] == np.arange(len(self.D)))
+            + self.fairness
+        )
+        assigned = self.x == 1
+        skill_slack = self.skill_matrix.astype(np.int64) @ self.x - self.required_skill
+        addable_j = self.addable(j)
+        for s in np.nonzero(assigned[:, j] & (extra[:, j] > 0))[0]:
+            tight_j = self.skill_matrix[:, s] & (skill_slack[:, j] <= 0)
+            for j2 in range(len(self.D)):
+                if j2 == j or not self.addable(j2)[s]:
+                    continue
+                candidates = (
+                    assigned[:, j2] & addable_j & self.skill_matrix[tight_j].all(axis=0)
+                )
+                # 日付j2で余裕のないtのスキルは、sも持っている必要がある
+                tight_j2 = self.skill_matrix & (skill_slack[:, j2] <= 0)[:, None]
+                candidates &= ~(tight_j2 & ~self.skill_matrix[:, [s]]).any(axis=0)
+                gain = (
+                    extra[s, j]
+                    - extra[s, j2]
+                    + np.where(candidates, extra[:, j2] - extra[:, j], -np.inf)
+                )
+                t = int(gain.argmax())
+                if gain[t] > 1e-9:
+                    return s, t, j2
+        return None
+
+    def improve(self):
+        for _ in range(self.max_passes):
+            improved = False
+            for j in range(len(self.D)):
+                while True:
+                    move = self.best_move(j)
+                    if move is None:
+                        break
+                    s, t = move
+                    if s is not None:
+                        self.set(s, j, 0)
+                    if t is not None:
+                        self.set(t, j, 1)
+                    improved = True
+                while True:
+                    exchange = self.best_exchange(j)
+                    if exchange is None:
+                        break
+                    s, t, j2 = exchange
+                    self.set(s, j, 0)
+                    self.set(t, j2, 0)
+                    self.set(s, j2, 1)
+                    self.set(t, j, 1)
+                    improved = True
+            if not improved:
+                break
+
+    def run(self):
+        feasible = self.construct()
+        self.improve()
+        return pd.DataFrame(self.x, index=self.S, columns=self.D), feasible
+
+
+def greedy_schedule(shift_scheduler):
+    # シフト表と、必要人数（出勤人数・スキルごとの人数）をすべて満たせたかを返す
+    return GreedyScheduler(shift_scheduler).run()
+
+
+def round_schedule(shift_scheduler, values_df):
+    # LP緩和の解（スタッフ×日付のデータフレーム）を丸めて改善したシフト表と、
+    # 必要人数をすべて満たせたかを返す
+    greedy = GreedyScheduler(shift_scheduler)
+    values = values_df.loc[greedy.S, greedy.D].to_numpy(dtype=float)
+    feasible = greedy.round(values)
+    greedy.improve()
+    return pd.DataFrame(greedy.x, index=greedy.S, columns=greedy.D), feasible
+
+
+def lower_bound(shift_scheduler):
+    # 目的関数値の簡単な下界
+    # - 出勤可能日数と連続勤務・休日の規則から、希望最小出勤日数に届かないスタッフの不足
+    # - 必要人数の合計が、各スタッフの希望最大出勤日数（と上限）の合計を超える分の超過
+    sch = shift_scheduler
+    capacity = {}
+    for s in sch.S:
+        n = len(sch.S2dates[s])
+        for w, m in sch.active_windows():
+            n = min(n, len(sch.D) // w * m + min(len(sch.D) % w, m))
+        capacity[s] = n
+    under = sum(
+        sch.S2penalty_weight[s] * max(0, sch.S2min_shift[s] - capacity[s])
+        for s in sch.S
+    )
+    excess = sum(sch.D2required_staff.values()) - sum(
+        min(sch.S2max_shift[s], capacity[s]) for s in sch.S
+    )
+    over = max(0, excess) * min(sch.S2penalty_weight.values(), default=0)
+    return under + over
@@ -0,0 +1,190 @@
+"""過去のシフト表から作るスタッフごとの勤務履歴
+
+月ごとのシフト表（output.csvと同じ形式）を取り込むたびに、スタッフごとの
+取り込んだ月数、出勤日数、土日の出勤日数、休暇希望の違反数の累計をSQLiteに加算する。
+過去のファイルを読み直さないので、何年分の履歴でも読み込みはスタッフ数の行だけで済む。
+読み込んだ履歴はShiftScheduler.set_historyに渡し、目的関数の公平性の項に使う
+（バッチ実行の--history、app_8_2の「過去の勤務履歴で公平性を考慮する」から使える）。
+スタッフIDは文字列として保存し、整数のIDのスタッフ情報とも文字列にして突き合わせる。
+
+使い方:
+    python -m src.shift_scheduler.history output.csv --month 2023-07
+    python -m src.shift_scheduler.history output.csv --month 2023-07 --ng-date ng_date.csv
+    python -m src.shift_scheduler.history output.csv --month 2024-04 --start 2024-04-01
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PATH = "history.sqlite"
+# 保存先を変える環境変数（app_8_2はこの保存先に勤務履歴があれば使えるようにする）
+PATH_ENV = "SHIFT_HISTORY_DB"
+
+COUNTS = ["months", "work_days", "weekend_days", "ng_violations"]
+
+
+def to_date(d, year, start=None):
+    # 「7月1日」形式の文字列、年月日（datetime.dateや「2023-07-01」）、
+    # 期間の開始日startからの整数の日番号（calendar_builderの「日付」列）のいずれかを日付にする
+    if isinstance(d, datetime.date):
+        return pd.Timestamp(d).date()
+    text = str(d).strip()
+    match = re.fullmatch(r"(\d+)月(\d+)日", text)
+    if match is not None:
+        return datetime.date(year, int(match[1]), int(match[2]))
+    if text.isdigit():
+        if start is None:
+            raise ValueError(
+                f"日番号の日付 {d} の曜日を決めるには期間の開始日（start）が必要です"
+            )
+        return pd.Timestamp(start).date() + datetime.timedelta(days=int(text))
+    try:
+        return pd.Timestamp(text).date()
+    except ValueError:
+        raise ValueError(f"日付 {d} を解釈できません")
+
+
+def weekend_dates(dates, year, start=None):
+    # 日付のうち土日のもの（解釈できない日付があればValueError）
+    return [d for d in dates if to_date(d, year, start).weekday() >= 5]
+
+
+def calendar_weekend_dates(calendar_df, year=None):
+    # カレンダー情報の「日付」のうち土日のもの
+    # 「年月日」列（calendar_builderやワークブックの形式）があればその曜日、
+    # なければ「日付」列をyear年（省略すると今年）の日付として解釈する
+    if "年月日" in calendar_df.columns:
+        weekend = pd.to_datetime(calendar_df["年月日"]).dt.dayofweek.to_numpy() >= 5
+        return calendar_df["日付"][weekend].tolist()
+    return weekend_dates(calendar_df["日付"], year or datetime.date.today().year)
+
+
+class HistoryStore:
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_PATH
+        with self._connect() as conn:
+            counts = ", ".join(f"{name} INTEGER NOT NULL" for name in COUNTS)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS staff_history "
+                f"(staff_id TEXT PRIMARY KEY, {counts})"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingested "
+                "(month TEXT PRIMARY KEY, created_at REAL)"
+            )
+
+    @classmethod
+    def default(cls):
+        # 環境変数の保存先（なければ既定の保存先）に取り込み済みの勤務履歴があれば使う
+        path = os.environ.get(PATH_ENV) or DEFAULT_PATH
+        if not os.path.isfile(path):
+            return None
+        return cls(path)
+
+    @contextmanager
+    def _connect(self):
+        # sqlite3の接続のwithはコミットするだけで閉じないため、明示的に閉じる
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def ingest(self, sch_df, month, staff_ng_date=None, start=None):
+        # monthは「2023-07」形式。取り込み済みの月は加算せずFalseを返す
+        # シフト表の列が整数の日番号なら、startに日番号0の日付を指定する
+        year = int(month.split("-")[0])
+        S = sch_df.index.astype(str).tolist()
+        x = (sch_df.to_numpy() > 0).astype(np.int64)
+
+        # スタッフごとの集計（NumPyの配列演算）
+        work_days = x.sum(axis=1)
+        weekend_mask = sch_df.columns.isin(weekend_dates(sch_df.columns, year, start))
+        weekend_days = x[:, weekend_mask].sum(axis=1)
+        ng_violations = np.zeros(len(S), dtype=np.int64)
+        if staff_ng_date:
+            D2index = {str(d): j for j, d in enumerate(sch_df.columns)}
+            ng_lookup = {str(s): d for s, d in staff_ng_date.items()}
+            for i, s in enumerate(S):
+                j = D2index.get(str(ng_lookup.get(s, "すべてOK")))
+                if j is not None:
+                    ng_violations[i] = x[i, j]
+
+        rows = zip(
+            S,
+            [1] * len(S),
+            work_days.tolist(),
+            weekend_days.tolist(),
+            ng_violations.tolist(),
+        )
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in COUNTS)
+        with self._connect() as conn:
+            try:
+                conn.execute(
+                    "INSERT INTO ingested (month, created_at) VALUES (?, ?)",
+                    (month, time.time()),
+                )
+            except sqlite3.IntegrityError:
+                return False
+            conn.executemany(
+                f"INSERT INTO staff_history (staff_id, {', '.join(COUNTS)}) "
+                f"VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT(staff_id) DO UPDATE SET {updates}",
+                rows,
+            )
+        return True
+
+    def months(self):
+        with self._connect() as conn:
+            return [
+                row[0]
+                for row in conn.execute("SELECT month FROM ingested ORDER BY month")
+            ]
+
+    def load(self):
+        # スタッフIDを行とする累計のデータフレーム（スタッフIDは文字列）
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT staff_id, {', '.join(COUNTS)} FROM staff_history"
+            ).fetchall()
+        df = pd.DataFrame(rows, columns=["スタッフID"] + COUNTS)
+        return df.set_index("スタッフID")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="シフト表を勤務履歴に取り込む")
+    parser.add_argument("schedule", help="取り込むシフト表のCSV")
+    parser.add_argument("--month", required=True, help="シフト表の年月（2023-07など）")
+    parser.add_argument("--ng-date", help="スタッフごとの休暇希望日のCSV")
+    parser.add_argument("--db", default=DEFAULT_PATH, help="勤務履歴の保存先")
+    parser.add_argument(
+        "--start", help="日付が整数の日番号の場合の、日番号0の日付（YYYY-MM-DD）"
+    )
+    args = parser.parse_args(argv)
+
+    sch_df = pd.read_csv(args.schedule, index_col=0)
+    sch_df.index = sch_df.index.astype(str)
+    staff_ng_date = None
+    if args.ng_date:
+        ng_date_df = pd.read_csv(args.ng_date)
+        staff_ng_date = dict(
+            zip(ng_date_df["スタッフID"].astype(str), ng_date_df["休暇希望日"])
+        )
+
+    store = HistoryStore(args.db)
+    if not store.ingest(sch_df, args.month, staff_ng_date, args.start):
+        print(f"{args.month}は取り込み済みです")
+    print(store.load().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""ベンチマークや負荷試験用のランダムなインスタンスの生成
+
+staff.csv・calendar.csvと同じ列を持つデータフレームと、
+set_dataに渡すペナルティ・休暇希望をまとめて作成する。
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def date_labels(num_dates, start=datetime.date(2023, 7, 1)):
+    # calendar.csvと同じ「7月1日」形式の日付の文字列
+    dates = [start + datetime.timedelta(days=i) for i in range(num_dates)]
+    return [f"{d.month}月{d.day}日" for d in dates]
+
+
+def generate_instance(
+    num_staff,
+    num_dates,
+    seed=0,
+    leader_ratio=0.3,
+    work_ratio=0.5,
+    ng_ratio=0.3,
+    off_penalty=50,
+    num_skills=0,
+    skill_ratio=0.1,
+):
+    rng = np.random.default_rng(seed)
+    S = [f"S{i:05d}" for i in range(num_staff)]
+    D = date_labels(num_dates)
+
+    # スタッフ情報（責任者は少なくとも1人）
+    leader_flag = (rng.random(num_staff) < leader_ratio).astype(int)
+    leader_flag[0] = 1
+    min_shift = rng.binomial(num_dates, work_ratio * 0.8, num_staff)
+    max_shift = min_shift + rng.integers(0, max(2, num_dates // 7), num_staff)
+    staff_df = pd.DataFrame(
+        {
+            "スタッフID": S,
+            "責任者フラグ": leader_flag,
+            "希望最小出勤日数": min_shift,
+            "希望最大出勤日数": max_shift,
+        }
+    )
+
+    # カレンダー情報（全体の出勤希望と同程度の必要人数）
+    required_staff = rng.binomial(num_staff, work_ratio, num_dates)
+    required_leader = np.minimum(
+        rng.binomial(required_staff, leader_ratio * 0.5), leader_flag.sum()
+    )
+    calendar_df = pd.DataFrame(
+        {"日付": D, "出勤人数": required_staff, "責任者人数": required_leader}
+    )
+
+    # 責任者以外のスキル（各スタッフが一定の割合で持ち、必要人数は少なめ）
+    for k in range(1, num_skills + 1):
+        skill_flag = (rng.random(num_staff) < skill_ratio).astype(int)
+        staff_df[f"スキル{k}フラグ"] = skill_flag
+        calendar_df[f"スキル{k}人数"] = np.minimum(
+            rng.binomial(required_staff, skill_ratio * 0.5), skill_flag.sum()
+        )
+
+    # スタッフごとのペナルティと休暇希望日
+    staff_penalty = dict(zip(S, rng.integers(10, 100, num_staff).tolist()))
+    has_ng = rng.random(num_staff) < ng_ratio
+    ng_dates = rng.integers(0, num_dates, num_staff)
+    staff_ng_date = {
+        s: D[ng_dates[i]] if has_ng[i] else "すべてOK" for i, s in enumerate(S)
+    }
+    return staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty
+
+
+def generate_availability(staff_df, calendar_df, unavailable_ratio=0.4, seed=0):
+    # シフト表と同じ形式の出勤可能表（0の組は出勤不可）
+    rng = np.random.default_rng(seed)
+    available = rng.random((len(staff_df), len(calendar_df))) >= unavailable_ratio
+    return pd.DataFrame(
+        available.astype(int),
+        index=staff_df["スタッフID"],
+        columns=calendar_df["日付"],
+    )
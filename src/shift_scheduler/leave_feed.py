@@ -0,0 +1,211 @@
+"""休暇申請のフィード（JSONL）の取り込み
+
+休暇申請を1行1件のJSONとして追記していくファイル（leave_requests.jsonlなど）を読み、
+ShiftScheduler.apply_leave_requestsで、モデルを作り直さずに目的関数の係数と変数の上限だけを更新する。
+最初の読み込みでファイル全体を取り込み、以降は前回読んだ位置から追記された行だけを読む。
+書き込み途中の行（改行で終わっていない行）は次の読み込みに回す。
+
+1行の形式:
+    {"id": "r-001", "staff_id": "A", "date": "7月3日", "kind": "leave"}
+    {"id": "r-002", "staff_id": "A", "date": "7月3日", "cancel": true}
+kindは"leave"（休暇希望、省略時）または"unavailable"（出勤不可）。
+cancelがtrueの行は、そのスタッフと日付の組の申請を取り消す。
+同じidの行は1回だけ取り込み、同じ組への申請は後の行で上書きする。
+idのない行はファイルの位置で区別し（各位置の行は1回だけ読む）、同じ内容でも別の申請として取り込む
+（休暇→取り消し→同じ休暇の3行目も反映される）。
+
+使い方:
+    python -m src.shift_scheduler.leave_feed leave_requests.jsonl staff.csv calendar.csv
+    python -m src.shift_scheduler.leave_feed leave_requests.jsonl staff.csv calendar.csv \\
+        --follow --interval 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pulp
+
+from src.shift_scheduler.batch import DEFAULT_PENALTY, read_instance
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+# 申請の種類
+KINDS = ["leave", "unavailable"]
+
+
+class LeaveFeed:
+    def __init__(self, path, staff, dates):
+        self.path = path
+        # JSONの値は文字列なので、文字列にしたスタッフID・日付から元の値を引く
+        self.staff_lookup = {str(s): s for s in staff}
+        self.date_lookup = {str(d): d for d in dates}
+        self.offset = 0  # 次に読むファイルの位置[バイト]
+        self.line_number = 0
+        self.seen = set()  # 取り込み済みの行のid
+        self.SD2leave = {}  # 取り込んだ申請（スタッフと日付の組 -> 申請の種類）
+        self.errors = []
+
+    def read_lines(self):
+        # 前回読んだ位置から、改行で終わっている行だけを読む
+        if not os.path.exists(self.path):
+            return []
+        if os.path.getsize(self.path) < self.offset:
+            # ファイルが作り直された場合は先頭から読み直す（取り込み済みのidの行は重複として除く）
+            self.offset = 0
+            self.line_number = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        return data[:end].decode("utf-8").splitlines()
+
+    def parse(self, line):
+        # 1行を（取り込み済みか判定するid, スタッフと日付の組, 申請の種類）にする
+        # idのない行のキーはNone（読む位置が毎回進むため、重複して読むことはない）
+        self.line_number += 1
+        if not line.strip():
+            return None
+        try:
+            record = json.loads(line)
+            staff_id = str(record["staff_id"])
+            date = str(record["date"])
+        except (ValueError, TypeError, KeyError):
+            self.errors.append(f"{self.line_number}行目: 申請として読めません")
+            return None
+        key = str(record["id"]) if "id" in record else None
+        kind = None if record.get("cancel") else record.get("kind", "leave")
+        if staff_id not in self.staff_lookup:
+            self.errors.append(
+                f"{self.line_number}行目: スタッフID {staff_id} がありません"
+            )
+            return None
+        if date not in self.date_lookup:
+            self.errors.append(f"{self.line_number}行目: 日付 {date} がありません")
+            return None
+        if kind is not None and kind not in KINDS:
+            self.errors.append(
+                f"{self.line_number}行目: 申請の種類 {kind} は使えません"
+            )
+            return None
+        return key, (self.staff_lookup[staff_id], self.date_lookup[date]), kind
+
+    def poll(self):
+        # 追記された申請を取り込み、状態が変わった組 -> 申請の種類（取り消しならNone）を返す
+        changes = {}
+        for line in self.read_lines():
+            parsed = self.parse(line)
+            if parsed is None:
+                continue
+            key, pair, kind = parsed
+            if key is not None:
+                if key in self.seen:
+                    continue
+                self.seen.add(key)
+            changes[pair] = kind
+        changes = {
+            pair: kind
+            for pair, kind in changes.items()
+            if self.SD2leave.get(pair) != kind
+        }
+        for pair, kind in changes.items():
+            if kind is None:
+                del self.SD2leave[pair]
+            else:
+                self.SD2leave[pair] = kind
+        return changes
+
+    def follow(self, interval=5.0):
+        # ファイルへの追記を待ち、状態が変わった組があるたびにそれを返す
+        while True:
+            changes = self.poll()
+            if changes:
+                yield changes
+            else:
+                time.sleep(interval)
+
+
+def report(shift_scheduler, changes, elapsed):
+    sch = shift_scheduler
+    violated = sum(
+        int(sch.sch_df.loc[s, d])
+        for (s, d), kind in sch.SD2leave.items()
+        if kind == "leave"
+    )
+    print(
+        "changes:",
+        len(changes),
+        "requests:",
+        len(sch.SD2leave),
+        "status:",
+        pulp.LpStatus[sch.status],
+        "objective:",
+        pulp.value(sch.model.objective),
+        "leave violations:",
+        violated,
+        "time [s]:",
+        round(elapsed, 3),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="休暇申請のフィードの取り込み")
+    parser.add_argument("feed", help="休暇申請のJSONL")
+    parser.add_argument("staff", help="スタッフ情報のCSV")
+    parser.add_argument("calendar", help="カレンダー情報のCSV")
+    parser.add_argument("--penalty", help="スタッフごとのペナルティのCSV")
+    parser.add_argument("--ng-date", help="スタッフごとの休暇希望日のCSV")
+    parser.add_argument("--off-penalty", type=int, default=DEFAULT_PENALTY)
+    parser.add_argument("--max-consecutive", type=int, help="最大連続出勤日数")
+    parser.add_argument(
+        "--follow", action="store_true", help="追記された申請を取り込み続ける"
+    )
+    parser.add_argument("--interval", type=float, default=5.0, help="確認の間隔[秒]")
+    parser.add_argument("-o", "--output", help="シフト表の出力先CSV")
+    args = parser.parse_args(argv)
+
+    instance = {"staff": args.staff, "calendar": args.calendar}
+    if args.penalty:
+        instance["penalty"] = args.penalty
+    if args.ng_date:
+        instance["ng_date"] = args.ng_date
+    instance["off_penalty"] = args.off_penalty
+    shift_scheduler = ShiftScheduler()
+    shift_scheduler.set_data(
+        *read_instance(instance), max_consecutive=args.max_consecutive
+    )
+
+    # ファイル全体の申請を取り込んでからモデルを構築する
+    feed = LeaveFeed(args.feed, shift_scheduler.S, shift_scheduler.D)
+    start = time.perf_counter()
+    changes = feed.poll()
+    shift_scheduler.apply_leave_requests(changes)
+    shift_scheduler.build_model()
+    shift_scheduler.solve()
+    report(shift_scheduler, changes, time.perf_counter() - start)
+    for error in feed.errors:
+        print("error:", error)
+    feed.errors = []
+    if args.output:
+        shift_scheduler.sch_df.to_csv(args.output)
+
+    if args.follow:
+        # 追記された申請は、変わった組の係数と上限だけを更新し、直前の解から解き直す
+        for changes in feed.follow(args.interval):
+            start = time.perf_counter()
+            with shift_scheduler.perf.phase("apply_leave_requests"):
+                shift_scheduler.apply_leave_requests(changes)
+            shift_scheduler.solve(warmStart=True)
+            report(shift_scheduler, changes, time.perf_counter() - start)
+            for error in feed.errors:
+                print("error:", error)
+            feed.errors = []
+            if args.output:
+                shift_scheduler.sch_df.to_csv(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""大規模近傍探索（LNS）によるシフト表の改善
+
+スタッフ数や日数が大きく、CBCで一度に解くと良い解に届かない場合に使う。
+貪欲法で実行可能なシフト表を作り（必要人数を満たせなければ制限時間付きで
+数理モデルを解いて実行可能な解を探し）、一部のスタッフまたは日付だけを自由にして
+ShiftSchedulerの数理モデルで解き直すことを繰り返し、改善したら採用する。
+実行履歴には、部分問題ごとのsolveではなくLNS全体を1行として記録する。
+
+使い方:
+    python -m src.shift_scheduler.lns staff.csv calendar.csv --time-limit 60
+"""
+
+import argparse
+import random
+import time
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.greedy import greedy_schedule
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+
+class LargeNeighborhoodSearch:
+    def __init__(
+        self,
+        shift_scheduler,
+        time_limit=60,
+        iteration_time_limit=10,
+        neighborhood_size=0.2,
+        seed=0,
+        progress_callback=None,
+    ):
+        self.shift_scheduler = shift_scheduler  # set_data済みのShiftScheduler
+        self.time_limit = time_limit  # 全体の制限時間[秒]
+        self.iteration_time_limit = iteration_time_limit  # 1回の部分問題の制限時間[秒]
+        self.neighborhood_size = neighborhood_size  # 自由にするスタッフ・日付の割合
+        self.random = random.Random(seed)
+        self.progress_callback = progress_callback  # (反復回数, 経過時間, 目的関数値)
+
+        # 最適化結果
+        self.sch_df = None  # 最良のシフト表
+        self.objective = None  # 最良の目的関数値
+        self.feasible = False  # 最良のシフト表が制約式をすべて満たすか
+        self.status = None  # ステータス（pulp.LpStatusのキー）
+        self.history = []  # 経過時間と目的関数値の履歴
+
+    def initial_schedule(self):
+        # 貪欲法で、連続勤務・休日の規則を守り必要人数を満たすシフト表を作る
+        sch = self.shift_scheduler
+        sch_df, feasible = greedy_schedule(sch)
+        if feasible:
+            return sch_df
+
+        # 必要人数を満たせなければ、制限時間付きで数理モデルを解いて実行可能な解を探す
+        sch.build_model()
+        with sch.telemetry_paused():
+            sch.solve(timeLimit=self.iteration_time_limit)
+        if sch.status == pulp.LpStatusOptimal:
+            return sch.sch_df
+        if sch.status == pulp.LpStatusInfeasible:
+            self.status = pulp.LpStatusInfeasible
+        return sch_df
+
+    def neighborhood(self, iteration):
+        # 偶数回目はスタッフの一部、奇数回目は連続する日付の一部を自由にする
+        sch = self.shift_scheduler
+        if iteration % 2 == 0:
+            k = max(1, int(len(sch.S) * self.neighborhood_size))
+            staffs = set(self.random.sample(sch.S, k))
+            return {(s, d) for s, d in sch.SD if s in staffs}
+        k = max(1, int(len(sch.D) * self.neighborhood_size))
+        start = self.random.randrange(len(sch.D) - k + 1)
+        dates = set(sch.D[start : start + k])
+        return {(s, d) for s, d in sch.SD if d in dates}
+
+    def run(self):
+        sch = self.shift_scheduler
+        start = time.perf_counter()
+
+        self.sch_df = self.initial_schedule()
+        self.objective = sch.evaluate(self.sch_df)
+        self.feasible = sch.is_feasible(self.sch_df)
+        self._record(0, start)
+
+        # モデルは一度だけ構築し、反復ごとに変数の上下限だけを付け替える
+        sch.build_model()
+        iteration = 0
+        with sch.telemetry_paused():
+            # 実行可能な解がないと分かった場合は探索しない
+            while (
+                self.status != pulp.LpStatusInfeasible
+                and time.perf_counter() - start < self.time_limit
+            ):
+                iteration += 1
+                sch.fix_assignments(self.sch_df, self.neighborhood(iteration))
+                remaining = self.time_limit - (time.perf_counter() - start)
+                sch.solve(
+                    timeLimit=max(1, min(self.iteration_time_limit, remaining)),
+                    warmStart=True,
+                )
+
+                # 最良のシフト表が実行可能でなければ、実行可能な解を目的関数値によらず採用する
+                if sch.status == pulp.LpStatusOptimal:
+                    objective = sch.evaluate(sch.sch_df)
+                    if objective < self.objective or not self.feasible:
+                        self.sch_df = sch.sch_df
+                        self.objective = objective
+                        self.feasible = sch.is_feasible(self.sch_df)
+                self._record(iteration, start)
+
+                # 実行可能で目的関数値が0なら、これ以上改善できない
+                if self.feasible and self.objective == 0:
+                    break
+
+        # 実行可能な解が見つからなければ、ステータスは未求解（または実行不可能）とする
+        optimal = self.feasible and self.objective == 0
+        if self.feasible:
+            self.status = pulp.LpStatusOptimal
+        elif self.status is None:
+            self.status = pulp.LpStatusNotSolved
+        sch.sch_df = self.sch_df
+        sch.status = self.status
+        if sch.telemetry is not None:
+            # 最適と分かる前に止まった場合は制限時間による打ち切りとする
+            sch.record_telemetry(
+                backend="lns",
+                status=pulp.LpStatus[self.status],
+                limit_reached=int(
+                    not optimal and self.status != pulp.LpStatusInfeasible
+                ),
+                objective=float(self.objective) if self.feasible else None,
+                gap=0.0 if optimal else None,
+            )
+        return self.sch_df
+
+    def _record(self, iteration, start):
+        elapsed = time.perf_counter() - start
+        self.history.append(
+            {"iteration": iteration, "time": elapsed, "objective": self.objective}
+        )
+        if self.progress_callback is not None:
+            self.progress_callback(iteration, elapsed, self.objective)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="大規模近傍探索によるシフト表作成")
+    parser.add_argument("staff", help="スタッフ情報のCSV")
+    parser.add_argument("calendar", help="カレンダー情報のCSV")
+    parser.add_argument("-t", "--time-limit", type=float, default=60)
+    parser.add_argument("--compare", action="store_true", help="CBC単体と比較する")
+    args = parser.parse_args(argv)
+
+    staff_df = pd.read_csv(args.staff)
+    calendar_df = pd.read_csv(args.calendar)
+    staff_penalty = {s: 50 for s in staff_df["スタッフID"]}
+    staff_ng_date = {s: "すべてOK" for s in staff_df["スタッフID"]}
+    off_penalty = 50
+
+    shift_sch = ShiftScheduler()
+    shift_sch.set_data(staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty)
+    lns = LargeNeighborhoodSearch(shift_sch, time_limit=args.time_limit)
+    lns.run()
+    print(pd.DataFrame(lns.history).to_string(index=False))
+
+    # 同じ制限時間でCBC単体で解いた場合の目的関数値
+    if args.compare:
+        start = time.perf_counter()
+        shift_sch.build_model()
+        shift_sch.solve(timeLimit=args.time_limit)
+        print("CBC time:", time.perf_counter() - start)
+        print("CBC objective:", shift_sch.evaluate(shift_sch.sch_df))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""構造が同じ数理モデルの再利用（LRUキャッシュ）
+
+日々の実行ではスタッフと日付は変わらず、必要人数やペナルティの数値だけが変わることが多い。
+スタッフID、日付、出勤可能な組、休暇希望日、スキルの必要な組、連続勤務・休日の規則を
+構造のキーとして構築済みのモデルを保持し、同じキーならShiftScheduler.update_modelで
+右辺と目的関数だけを更新して、build_modelによる変数・制約式の作成を省く。
+
+モデルはcheckoutで取り出している間はキャッシュから外れ、releaseで戻すまで他から使われない。
+同じプロセス内ではdefault_cache()を共有するため、Streamlitのセッションをまたいでも再利用される。
+"""
+
+import threading
+from collections import OrderedDict
+
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+from src.shift_scheduler.telemetry import input_hash
+
+DEFAULT_MAXSIZE = 8
+
+# キャッシュに保持するモデルと変数・制約式の属性
+MODEL_ATTRIBUTES = [
+    "model",
+    "x",
+    "y_under",
+    "y_over",
+    "z_over",
+    "cover",
+    "cover_skill",
+    "shift_under",
+    "shift_over",
+]
+
+
+def structure_key(shift_scheduler):
+    # 変数と制約式の組み合わせを決めるデータのハッシュ（数値だけの違いは含めない）
+    sch = shift_scheduler
+    return input_hash(
+        type(sch).__name__,
+        sch.S,
+        sch.D,
+        sch.SD,
+        sch.S2ng_date,
+        sch.K2staff,
+        sorted((k, d) for (k, d), n in sch.KD2required.items() if n > 0),
+        sch.active_windows(),
+        sch.window_formulation,
+    )
+
+
+class ModelCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # 構造のキー -> モデルと変数・制約式
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def checkout(self, shift_scheduler):
+        # set_data済みのShiftSchedulerにモデルを用意する（キャッシュになければbuild_model）
+        sch = shift_scheduler
+        if type(sch) is not ShiftScheduler:
+            # 派生クラスは数値の更新に対応していないため、常に作り直す
+            sch.build_model()
+            return False
+        key = structure_key(sch)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            sch.build_model()
+        else:
+            with sch.perf.phase("model_cache"):
+                for name in MODEL_ATTRIBUTES:
+                    setattr(sch, name, entry[name])
+                sch.update_model()
+            sch.perf.record_pulp_model_size(sch.model)
+        sch.model_cache_key = key
+        sch.model_cache_size = len(sch.model.constraints)
+        return entry is not None
+
+    def release(self, shift_scheduler):
+        # 解き終わったモデルをキャッシュに戻す
+        # solve_poolやrepairで制約式が追加されたモデルは構造が変わっているため戻さない
+        sch = shift_scheduler
+        key = getattr(sch, "model_cache_key", None)
+        if key is None or len(sch.model.constraints) != sch.model_cache_size:
+            return
+        entry = {name: getattr(sch, name) for name in MODEL_ATTRIBUTES}
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        sch.model_cache_key = None
+
+
+_default_cache = None
+
+
+def default_cache():
+    # プロセス内で共有するキャッシュ
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ModelCache()
+    return _default_cache
@@ -0,0 +1,140 @@
+"""シフトスケジューラーの処理時間とモデルサイズの計測
+
+フェーズ（CSV読み込み、set_data、build_model、ソルバー、結果の取り出し）ごとに
+経過時間、CPU時間、Pythonのピークメモリを記録し、
+あわせて数理モデルの変数・制約式・非ゼロ要素の数を記録する。
+CPU時間にはCBCなどの子プロセスの分も含む。
+ピークメモリはtracemallocで計測するため、trace_memory=Trueの場合だけ記録する
+（tracemallocはプロセス全体に効き、モデルの構築が数倍遅くなる）。
+trace_memory・logを指定しない場合は、環境変数SHIFT_PROFILE_MEMORY・SHIFT_PROFILE_LOGが
+空でも"0"でもなければ有効にする（バッチ実行の--profile-memory・--profile-log、
+app_8_2のサイドバーの「メモリ使用量を計測する」からも有効にできる）。
+"""
+
+import functools
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TRACE_MEMORY_ENV = "SHIFT_PROFILE_MEMORY"
+LOG_ENV = "SHIFT_PROFILE_LOG"
+
+
+def env_flag(name):
+    return os.environ.get(name, "") not in ("", "0")
+
+
+def _cpu_time():
+    # 自プロセスと子プロセス（ソルバー）のCPU時間の合計
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class PhaseProfiler:
+    def __init__(self, trace_memory=None, log=None):
+        # Noneなら環境変数の設定に従う
+        if trace_memory is None:
+            trace_memory = env_flag(TRACE_MEMORY_ENV)
+        if log is None:
+            log = env_flag(LOG_ENV)
+        self.trace_memory = trace_memory  # ピークメモリを計測するか
+        self.log = log  # 計測結果をloggingで出力するか
+
+        self.phases = {}  # フェーズごとの計測結果
+        self.model_size = {}  # 数理モデルのサイズ
+
+    @contextmanager
+    def phase(self, name):
+        # 計測中でなければtracemallocを開始し、フェーズの終わりで止める
+        started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+
+        start_wall = time.perf_counter()
+        start_cpu = _cpu_time()
+        try:
+            yield
+        finally:
+            peak_memory = None
+            if tracemalloc.is_tracing():
+                peak_memory = tracemalloc.get_traced_memory()[1] - base_memory
+            if started_tracing:
+                tracemalloc.stop()
+
+            # 同じフェーズが複数回実行された場合は時間を合計する
+            # （1回分の時間はsnapshotとsinceの差分で求める）
+            record = self.phases.setdefault(
+                name, {"wall_time": 0.0, "cpu_time": 0.0, "peak_memory": None}
+            )
+            record["wall_time"] += time.perf_counter() - start_wall
+            record["cpu_time"] += _cpu_time() - start_cpu
+            if peak_memory is not None:
+                record["peak_memory"] = max(record["peak_memory"] or 0, peak_memory)
+
+            if self.log:
+                logger.info(
+                    "%s: wall=%.3fs cpu=%.3fs peak_memory=%s",
+                    name,
+                    record["wall_time"],
+                    record["cpu_time"],
+                    record["peak_memory"],
+                )
+
+    def snapshot(self):
+        # 現在までのフェーズごとの経過時間（sinceで差分をとるために使う）
+        return {name: r["wall_time"] for name, r in self.phases.items()}
+
+    def since(self, snapshot):
+        # snapshotをとった後に計測したフェーズごとの経過時間
+        phases = {}
+        for name, r in self.phases.items():
+            wall_time = r["wall_time"] - snapshot.get(name, 0.0)
+            if wall_time > 0:
+                phases[name] = wall_time
+        return phases
+
+    def record_model_size(self, num_variables, num_constraints, num_nonzeros=None):
+        self.model_size = {
+            "num_variables": num_variables,
+            "num_constraints": num_constraints,
+            "num_nonzeros": num_nonzeros,
+        }
+        if self.log:
+            logger.info("model size: %s", self.model_size)
+
+    def record_pulp_model_size(self, model):
+        self.record_model_size(
+            len(model.variables()),
+            len(model.constraints),
+            sum(len(c) for c in model.constraints.values()),
+        )
+
+    def to_dict(self):
+        return {"phases": self.phases, "model_size": self.model_size}
+
+    def to_frame(self):
+        # フェーズを行とするデータフレーム
+        return pd.DataFrame.from_dict(self.phases, orient="index")
+
+
+def profile_phase(name):
+    # self.perfに対してメソッド全体を1つのフェーズとして計測するデコレーター
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.perf.phase(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
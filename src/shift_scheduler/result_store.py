@@ -0,0 +1,167 @@
+"""最適化結果をローカルディスクに保存する
+
+Streamlitのsession_stateにシフト表の候補や限界値の表をそのまま持つと、
+利用者が入れ替わるたびにサーバーのメモリが増え続ける。
+ResultStoreはデータフレームをParquet（列指向）、バイト列（エクスポート用のファイルなど）を
+そのままのファイルとして結果ごとのディレクトリに保存し、session_stateには
+ハンドル（文字列）だけを持たせる。読み込みはメモリマップで行い、必要な表だけを読む。
+
+最後に読み書きしてから保持期間が過ぎた結果と、合計サイズの上限を超えた分の古い結果は
+保存のたびに削除する。削除された結果を読むとNoneを返すため、アプリでは再度最適化してもらう。
+保存先・保持期間[秒]・合計サイズの上限[バイト]は環境変数
+SHIFT_RESULT_DIR・SHIFT_RESULT_TTL・SHIFT_RESULT_MAX_BYTESで変更できる。
+
+使い方:
+    store = ResultStore.default()
+    handle = store.put({"status": "Optimal", "schedule_0": sch_df})
+    store.meta(handle)["status"]
+    store.frame(handle, "schedule_0")
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "shift_results")
+DEFAULT_TTL = 6 * 60 * 60  # 6時間
+DEFAULT_MAX_BYTES = 512 * 2**20  # 512MB
+
+META_FILE = "meta.json"
+
+
+def _json_default(value):
+    # numpyの数値などJSONにできない値を変換する
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class ResultStore:
+    def __init__(self, root=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or DEFAULT_DIR
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def default(cls):
+        return cls(
+            os.environ.get("SHIFT_RESULT_DIR") or DEFAULT_DIR,
+            float(os.environ.get("SHIFT_RESULT_TTL") or DEFAULT_TTL),
+            int(os.environ.get("SHIFT_RESULT_MAX_BYTES") or DEFAULT_MAX_BYTES),
+        )
+
+    def _path(self, handle, *names):
+        return os.path.join(self.root, handle, *names)
+
+    def put(self, artifacts):
+        # データフレームはParquet、バイト列はファイル、それ以外はmeta.jsonに保存してハンドルを返す
+        handle = uuid.uuid4().hex
+        # 書き込み途中の結果が読まれないように、一時ディレクトリに書いてから名前を変える
+        work = self._path(f".{handle}")
+        os.makedirs(work)
+        meta = {"_frames": {}, "_files": []}
+        for name, value in artifacts.items():
+            if isinstance(value, pd.DataFrame):
+                # Parquetの列名は文字列に限られるため、元の列名はmeta.jsonに残す
+                meta["_frames"][name] = value.columns.tolist()
+                value.set_axis(
+                    [str(c) for c in value.columns], axis="columns"
+                ).to_parquet(os.path.join(work, f"{name}.parquet"))
+            elif isinstance(value, bytes):
+                meta["_files"].append(name)
+                with open(os.path.join(work, f"{name}.bin"), "wb") as f:
+                    f.write(value)
+            else:
+                meta[name] = value
+        with open(os.path.join(work, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, default=_json_default)
+        os.rename(work, self._path(handle))
+        self.cleanup(keep=handle)
+        return handle
+
+    def _touch(self, handle):
+        # 最後に読んだ時刻を保持期間の起点にする
+        os.utime(self._path(handle))
+
+    def meta(self, handle):
+        # データフレームとバイト列以外の値（削除済みならNone）
+        try:
+            with open(self._path(handle, META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+            self._touch(handle)
+        except (OSError, TypeError):
+            return None
+        return meta
+
+    def frame(self, handle, name):
+        # 保存したデータフレーム（削除済みならNone）
+        meta = self.meta(handle)
+        if meta is None or name not in meta["_frames"]:
+            return None
+        try:
+            frame = pd.read_parquet(
+                self._path(handle, f"{name}.parquet"), memory_map=True
+            )
+        except OSError:
+            return None
+        return frame.set_axis(meta["_frames"][name], axis="columns")
+
+    def data(self, handle, name):
+        # 保存したバイト列（削除済みならNone）
+        meta = self.meta(handle)
+        if meta is None or name not in meta["_files"]:
+            return None
+        try:
+            with open(self._path(handle, f"{name}.bin"), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def remove(self, handle):
+        shutil.rmtree(self._path(handle), ignore_errors=True)
+
+    def entries(self):
+        # 保存済みの結果のハンドル、最後に読み書きした時刻、サイズ（古い順）
+        entries = []
+        for handle in os.listdir(self.root):
+            path = self._path(handle)
+            try:
+                accessed = os.path.getmtime(path)
+                size = sum(
+                    os.path.getsize(os.path.join(path, name))
+                    for name in os.listdir(path)
+                )
+            except OSError:
+                continue
+            entries.append((accessed, handle, size))
+        entries.sort()
+        return entries
+
+    def total_bytes(self):
+        return sum(size for _, _, size in self.entries())
+
+    def cleanup(self, keep=None):
+        # 保持期間が過ぎた結果を削除し、合計サイズが上限を超えていれば古い順に削除する
+        # keepのハンドル（保存した直後の結果）は削除しない
+        now = time.time()
+        entries = self.entries()
+        removed = []
+        total = sum(size for _, _, size in entries)
+        for accessed, handle, size in entries:
+            if handle == keep:
+                continue
+            # 書き込み途中の一時ディレクトリも、保持期間が過ぎていれば削除する
+            if now - accessed > self.ttl or (
+                total > self.max_bytes and not handle.startswith(".")
+            ):
+                self.remove(handle)
+                removed.append(handle)
+                total -= size
+        return removed
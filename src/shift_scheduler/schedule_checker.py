@@ -0,0 +1,163 @@
+"""手修正したシフト表の制約を差分で再チェックする
+
+最適化後にシフト表を手で修正する際、1マスの変更ごとにシフト表全体を
+集計し直すと、スタッフ数が多い場合に操作が重くなる。
+ScheduleCheckerはスタッフごとの出勤日数、日ごとの出勤人数・スキル（責任者など）ごとの人数、
+休暇希望の違反数、目的関数値を保持し、1マスの変更をO(1)で反映する。
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.shift_scheduler.ShiftScheduler_8_2 import find_skills
+
+
+class ScheduleChecker:
+    def __init__(
+        self,
+        sch_df,
+        staff_df,
+        calendar_df,
+        staff_ng_date=None,
+        staff_penalty=None,
+        off_penalty=0,
+    ):
+        # リストと位置の対応
+        self.S = staff_df["スタッフID"].tolist()
+        self.D = calendar_df["日付"].tolist()
+        self.S2index = {s: i for i, s in enumerate(self.S)}
+        self.D2index = {d: j for j, d in enumerate(self.D)}
+
+        # 定数（スタッフ・日付の順に並べた配列）
+        self.K = find_skills(staff_df, calendar_df)
+        self.skill_matrix = (
+            staff_df[[f"{k}フラグ" for k in self.K]].to_numpy(dtype=np.int64).T
+        )
+        self.min_shift = staff_df["希望最小出勤日数"].to_numpy(dtype=np.int64)
+        self.max_shift = staff_df["希望最大出勤日数"].to_numpy(dtype=np.int64)
+        self.required_staff = calendar_df["出勤人数"].to_numpy(dtype=np.int64)
+        self.required_skill = (
+            calendar_df[[f"{k}人数" for k in self.K]].to_numpy(dtype=np.int64).T
+        )
+        staff_ng_date = staff_ng_date or {}
+        self.ng_date_index = np.array(
+            [self.D2index.get(staff_ng_date.get(s), -1) for s in self.S]
+        )
+        staff_penalty = staff_penalty or {}
+        self.penalty_weight = np.array([staff_penalty.get(s, 0) for s in self.S])
+        self.penalty_off = off_penalty
+
+        # シフト表（修正前の値も保持しておく）
+        self.x = sch_df.loc[self.S, self.D].to_numpy(dtype=np.int64)
+        self.original_x = self.x.copy()
+        self.edits = {}  # 修正したマス -> 値
+
+        # 集計値
+        self.staff_total = self.x.sum(axis=1)  # スタッフごとの出勤日数
+        self.date_total = self.x.sum(axis=0)  # 日ごとの出勤人数
+        self.date_skill = self.skill_matrix @ self.x  # スキルごと・日ごとの人数
+        has_ng = self.ng_date_index >= 0
+        self.ng_violated = np.zeros(len(self.S), dtype=np.int64)
+        self.ng_violated[has_ng] = self.x[has_ng, self.ng_date_index[has_ng]]
+
+        # 違反数
+        self.num_short_dates = int((self.date_total < self.required_staff).sum())
+        self.num_short_skill_dates = int(
+            (self.date_skill < self.required_skill).any(axis=0).sum()
+        )
+        self.num_out_of_range_staff = int(
+            (
+                (self.staff_total < self.min_shift)
+                | (self.staff_total > self.max_shift)
+            ).sum()
+        )
+        self.num_ng_violations = int(self.ng_violated.sum())
+        self.objective = sum(self._staff_objective(i) for i in range(len(self.S)))
+
+    def _staff_objective(self, i):
+        # スタッフiの希望日数違反と休暇希望違反のペナルティ
+        under = max(0, self.min_shift[i] - self.staff_total[i])
+        over = max(0, self.staff_total[i] - self.max_shift[i])
+        return int(
+            self.penalty_weight[i] * (under + over)
+            + self.penalty_off * self.ng_violated[i]
+        )
+
+    def _out_of_range(self, i):
+        return not (self.min_shift[i] <= self.staff_total[i] <= self.max_shift[i])
+
+    def set(self, s, d, value):
+        # スタッフsの日付dのシフトをvalue（0または1）に変更し、集計値を差分で更新する
+        i, j = self.S2index[s], self.D2index[d]
+        delta = int(value) - self.x[i, j]
+        if delta == 0:
+            return
+
+        # 変更前の状態
+        was_short = self.date_total[j] < self.required_staff[j]
+        was_short_skill = (self.date_skill[:, j] < self.required_skill[:, j]).any()
+        was_out_of_range = self._out_of_range(i)
+        self.objective -= self._staff_objective(i)
+
+        self.x[i, j] += delta
+        self.staff_total[i] += delta
+        self.date_total[j] += delta
+        # スキルの数だけの更新（スタッフ数・日数には依存しない）
+        self.date_skill[:, j] += delta * self.skill_matrix[:, i]
+        if self.ng_date_index[i] == j:
+            self.ng_violated[i] += delta
+            self.num_ng_violations += delta
+
+        # 変更後の状態との差分で違反数を更新
+        self.num_short_dates += int(self.date_total[j] < self.required_staff[j]) - int(
+            was_short
+        )
+        self.num_short_skill_dates += int(
+            (self.date_skill[:, j] < self.required_skill[:, j]).any()
+        ) - int(was_short_skill)
+        self.num_out_of_range_staff += int(self._out_of_range(i)) - int(
+            was_out_of_range
+        )
+        self.objective += self._staff_objective(i)
+
+    def toggle(self, s, d):
+        i, j = self.S2index[s], self.D2index[d]
+        self.set(s, d, 1 - self.x[i, j])
+
+    def sync(self, edits):
+        # 修正前のシフト表に対する修正内容（マス -> 値）に合わせる
+        # 前回から変わったマスだけを反映する（1マスの修正ならO(1)の更新は1回だけ）
+        for s, d in set(self.edits) - set(edits):
+            self.set(s, d, self.original_x[self.S2index[s], self.D2index[d]])
+        for (s, d), value in edits.items():
+            if self.edits.get((s, d)) != value:
+                self.set(s, d, value)
+        self.edits = dict(edits)
+
+    def sync_editor(self, edited_rows):
+        # st.data_editorのedited_rows（行番号 -> 列名 -> 値）に合わせる
+        # 列名は文字列になるため、整数の日番号などはカレンダーの日付に戻す
+        date_lookup = {str(d): d for d in self.D}
+        self.sync(
+            {
+                (self.S[int(row)], date_lookup[str(d)]): int(value)
+                for row, changes in edited_rows.items()
+                for d, value in changes.items()
+            }
+        )
+
+    def summary(self):
+        return {
+            "出勤人数が不足する日数": self.num_short_dates,
+            "スキルの人数が不足する日数": self.num_short_skill_dates,
+            "希望出勤日数の範囲外のスタッフ数": self.num_out_of_range_staff,
+            "休暇希望の違反数": self.num_ng_violations,
+            "目的関数値": self.objective,
+        }
+
+    def date_skill_frame(self):
+        # 日付×スキルの人数
+        return pd.DataFrame(self.date_skill.T, index=self.D, columns=self.K)
+
+    def to_frame(self):
+        return pd.DataFrame(self.x, index=self.S, columns=self.D)
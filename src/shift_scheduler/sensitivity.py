@@ -0,0 +1,106 @@
+"""LP緩和の双対変数（シャドウプライス）による必要人数・希望出勤日数の感度分析
+
+ShiftScheduler_8_2のモデルのLP緩和を1回だけ解き、制約式の双対変数から
+- 各日の出勤人数・責任者などのスキルごとの人数を1人増やしたときの目的関数値の増分
+- 各スタッフの希望最小・最大出勤日数を1日増やしたときの目的関数値の増分
+を求める。「7月6日の出勤人数を1人減らすと目的関数値はいくら下がるか」を、
+日付ごとに解き直さずに一覧できる（減らす場合は符号を反転した値が目安になる）。
+
+双対変数はLP緩和での限界値であり、整数解の目的関数値の変化とは一致しないことがある。
+すべての決定変数が0/1なので、整数解を固定したLPでは必要人数の双対変数が0になり使えない。
+relaxed=Trueで解いた直後なら、そのLPの双対変数をそのまま使い、解き直さない。
+
+使い方:
+    python -m src.shift_scheduler.sensitivity staff.csv calendar.csv
+    python -m src.shift_scheduler.sensitivity staff.csv calendar.csv \\
+        --penalty penalty.csv --ng-date ng_date.csv --off-penalty 50
+"""
+
+import argparse
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.batch import DEFAULT_PENALTY, read_instance
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+
+def solve_relaxation(shift_scheduler, **solver_options):
+    # LP緩和を解き、ステータスと目的関数値を返す
+    # 変数の値とモデルのステータスは解く前に戻す（シフト表の解は変えない）
+    sch = shift_scheduler
+    variables = sch.model.variables()
+    values = [v.varValue for v in variables]
+    status, sol_status = sch.model.status, sch.model.sol_status
+    with sch.perf.phase("sensitivity"):
+        lp_status = sch.model.solve(sch.lp_solver(**solver_options))
+    lp_bound = pulp.value(sch.model.objective)
+    for v, value in zip(variables, values):
+        v.varValue = value
+    sch.model.status, sch.model.sol_status = status, sol_status
+    return lp_status, lp_bound
+
+
+def shadow_prices(shift_scheduler, **solver_options):
+    # build_model済みのShiftSchedulerから、日付ごと・スタッフごとの限界値のデータフレームを作る
+    sch = shift_scheduler
+    lp_bound = sch.lp_bound
+    if lp_bound is None:
+        lp_status, lp_bound = solve_relaxation(sch, **solver_options)
+        if lp_status != pulp.LpStatusOptimal:
+            raise ValueError(f"LP緩和が解けませんでした: {pulp.LpStatus[lp_status]}")
+
+    # 「以上」の制約式の双対変数は、右辺を1増やしたときの目的関数値の増分
+    dates = pd.DataFrame(
+        {"出勤人数": [sch.cover[d].pi or 0.0 for d in sch.D]}, index=sch.D
+    )
+    for k in sch.K:
+        dates[f"{k}人数"] = [
+            sch.cover_skill[k, d].pi or 0.0 if (k, d) in sch.cover_skill else 0.0
+            for d in sch.D
+        ]
+    dates.index.name = "日付"
+
+    # 希望最小出勤日数の制約式は「-出勤日数 - 不足数 <= -希望最小出勤日数」の形なので符号を反転する
+    staff = pd.DataFrame(
+        {
+            "希望最小出勤日数": [0.0 - (sch.shift_under[s].pi or 0.0) for s in sch.S],
+            "希望最大出勤日数": [sch.shift_over[s].pi or 0.0 for s in sch.S],
+        },
+        index=sch.S,
+    )
+    staff.index.name = "スタッフID"
+    return {"lp_bound": lp_bound, "dates": dates, "staff": staff}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="必要人数と希望出勤日数の感度分析")
+    parser.add_argument("staff", help="スタッフ情報のCSV")
+    parser.add_argument("calendar", help="カレンダー情報のCSV")
+    parser.add_argument("--penalty", help="スタッフごとのペナルティのCSV")
+    parser.add_argument("--ng-date", help="スタッフごとの休暇希望日のCSV")
+    parser.add_argument("--off-penalty", type=int, default=DEFAULT_PENALTY)
+    parser.add_argument("--max-consecutive", type=int, help="最大連続出勤日数")
+    args = parser.parse_args(argv)
+
+    instance = {"staff": args.staff, "calendar": args.calendar}
+    if args.penalty:
+        instance["penalty"] = args.penalty
+    if args.ng_date:
+        instance["ng_date"] = args.ng_date
+    instance["off_penalty"] = args.off_penalty
+
+    shift_scheduler = ShiftScheduler()
+    shift_scheduler.set_data(
+        *read_instance(instance), max_consecutive=args.max_consecutive
+    )
+    shift_scheduler.build_model()
+    report = shadow_prices(shift_scheduler)
+
+    print(report["dates"].to_string())
+    print(report["staff"].to_string())
+    print("LP bound:", report["lp_bound"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""1日を複数の時間帯（朝・夕・夜など）に分けたシフト表の作成
+
+カレンダー情報は日付と時間帯の組ごとに1行とし、「時間帯」列と
+出勤人数・責任者人数などの必要人数を持つ。スタッフ情報に「勤務可能時間帯」列
+（「朝,夕」のようにカンマ区切り、空欄ならすべての時間帯）がある場合、
+変数はスタッフが勤務できる日付・時間帯の組に対してだけ作成する。
+
+各スタッフは1日に1つの時間帯までしか入らず、夜の時間帯の翌日に朝の時間帯には入らない。
+希望出勤日数・休暇希望・連続勤務の規則は、ShiftScheduler_8_2と同じく日ごとの出勤で扱う。
+"""
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+
+class SlotShiftScheduler(ShiftScheduler):
+    def __init__(self):
+        super().__init__()
+
+        # リスト
+        self.T = []  # 時間帯のリスト
+        self.DT = []  # 日付と時間帯の組のリスト
+        self.SDT = []  # 変数を作るスタッフ・日付・時間帯の組のリスト
+
+        # 定数
+        self.S2slots = {}  # 各スタッフの勤務可能な時間帯
+        self.DT2required_staff = {}  # 各日・各時間帯の必要人数
+        self.KDT2required = {}  # 各スキル・各日・各時間帯の必要人数
+        # 禁止する時間帯の並び（ある日の前者の翌日に後者には入らない）
+        self.forbidden_transitions = [("夜", "朝")]
+
+        # 変数
+        self.w = {}  # 各スタッフが各日の各時間帯にシフトに入るか否かを表す変数
+
+        # 最適化結果
+        self.slot_df = None  # 各スタッフが各日に入る時間帯を表すデータフレーム
+
+        # 変数を絞り込んだことによるモデルサイズの削減
+        self.sparsity = {}
+
+    def set_data(
+        self,
+        staff_df,
+        calendar_df,
+        staff_penalty,
+        staff_ng_date,
+        off_penalty,
+        max_consecutive=None,
+        min_rest=None,
+        availability=None,
+    ):
+        # 日ごとの出勤などはShiftScheduler_8_2と同じ（必要人数は時間帯の合計）
+        day_calendar_df = (
+            calendar_df.drop(columns="時間帯").groupby("日付", sort=False).sum()
+        ).reset_index()
+        super().set_data(
+            staff_df,
+            day_calendar_df,
+            staff_penalty,
+            staff_ng_date,
+            off_penalty,
+            max_consecutive=max_consecutive,
+            min_rest=min_rest,
+            availability=availability,
+        )
+
+        # 時間帯の設定（カレンダー情報に現れた順）
+        self.T = calendar_df["時間帯"].drop_duplicates().tolist()
+        self.DT = list(zip(calendar_df["日付"], calendar_df["時間帯"]))
+
+        # 勤務可能な時間帯の設定
+        if "勤務可能時間帯" in staff_df.columns:
+            slots = staff_df["勤務可能時間帯"].tolist()
+        else:
+            slots = [None] * len(self.S)
+        self.S2slots = {
+            s: (
+                {t.strip() for t in str(value).split(",")}
+                if pd.notna(value) and str(value).strip()
+                else set(self.T)
+            )
+            for s, value in zip(self.S, slots)
+        }
+
+        # 変数は出勤可能な日の勤務可能な時間帯だけ作る
+        available = set(self.SD)
+        self.SDT = [
+            (s, d, t)
+            for s in self.S
+            for d, t in self.DT
+            if t in self.S2slots[s] and (s, d) in available
+        ]
+
+        # 必要人数の設定
+        self.DT2required_staff = dict(zip(self.DT, calendar_df["出勤人数"]))
+        self.KDT2required = {
+            (k, d, t): n
+            for k in self.K
+            for (d, t), n in zip(self.DT, calendar_df[f"{k}人数"].tolist())
+        }
+
+    def show(self):
+        super().show()
+        print("Slots:", self.T)
+        print("Staff Slots:", self.S2slots)
+        print("Date-Slot Required Staff:", self.DT2required_staff)
+
+    def add_coverage_constraints(self):
+        ### 変数の定義 ###
+        # 勤務可能なスタッフ・日付・時間帯の組に対して、シフトに入るなら1
+        self.w = pulp.LpVariable.dicts("w", self.SDT, cat="Binary")
+
+        DT2staff = {dt: [] for dt in self.DT}
+        SD2slots = {sd: [] for sd in self.SD}
+        S2DT = {s: [] for s in self.S}
+        for s, d, t in self.SDT:
+            DT2staff[d, t].append(s)
+            SD2slots[s, d].append(t)
+            S2DT[s].append((d, t))
+
+        ### 制約式の定義 ###
+        # 各日・各時間帯に対して、必要な人数がシフトに入る
+        for d, t in self.DT:
+            self.model += (
+                pulp.lpSum(self.w[s, d, t] for s in DT2staff[d, t])
+                >= self.DT2required_staff[d, t]
+            )
+
+        # 各スキル・各日・各時間帯に対して、そのスキルを持つスタッフが必要な人数シフトに入る
+        # （スキル行列の非ゼロ要素と変数のある組だけから式を作る）
+        KDT2terms = {kdt: [] for kdt, n in self.KDT2required.items() if n > 0}
+        for k, skill_staff in self.K2staff.items():
+            for s in skill_staff:
+                for d, t in S2DT[s]:
+                    if (k, d, t) in KDT2terms:
+                        KDT2terms[k, d, t].append((self.w[s, d, t], 1))
+        for (k, d, t), terms in KDT2terms.items():
+            self.model += pulp.LpAffineExpression(terms) >= self.KDT2required[k, d, t]
+
+        # 各スタッフ・各日に対して、入る時間帯は1つまでで、x[s, d]はその日に出勤するか否かを表す
+        # （x[s, d]が0/1なので、時間帯の和も1以下になる）
+        for s, d in self.SD:
+            if SD2slots[s, d]:
+                self.model += (
+                    pulp.lpSum(self.w[s, d, t] for t in SD2slots[s, d]) == self.x[s, d]
+                )
+            else:
+                self.x[s, d].upBound = 0
+
+        # 禁止する時間帯の並び（両方の変数がある場合だけ制約式を作る）
+        for s in self.S:
+            for d, next_d in zip(self.D, self.D[1:]):
+                for t, next_t in self.forbidden_transitions:
+                    if (s, d, t) in self.w and (s, next_d, next_t) in self.w:
+                        self.model += self.w[s, d, t] + self.w[s, next_d, next_t] <= 1
+
+        # すべての組に変数を作った場合との比較
+        dense = len(self.S) * len(self.DT)
+        self.sparsity = {
+            "dense_slot_variables": dense,
+            "slot_variables": len(self.SDT),
+            "saved_variables": dense - len(self.SDT),
+            "saved_ratio": 1 - len(self.SDT) / dense if dense else 0.0,
+        }
+
+    def extract_schedule(self):
+        super().extract_schedule()
+
+        # 各スタッフが各日に入る時間帯（入らない日は空文字列）
+        S2D2slot = {s: {d: "" for d in self.D} for s in self.S}
+        for s, d, t in self.SDT:
+            if round(self.w[s, d, t].value() or 0) == 1:
+                S2D2slot[s][d] = t
+        self.slot_df = pd.DataFrame.from_dict(S2D2slot, orient="index")[self.D]
+
+
+if __name__ == "__main__":
+    staff_df = pd.read_csv("staff.csv")
+    calendar_df = pd.read_csv("calendar.csv")
+
+    # 各日の必要人数を朝・夕・夜の時間帯に割り振ったカレンダー情報
+    rows = []
+    for _, row in calendar_df.iterrows():
+        for i, t in enumerate(["朝", "夕", "夜"]):
+            rows.append(
+                {
+                    "日付": row["日付"],
+                    "時間帯": t,
+                    "出勤人数": (row["出勤人数"] + 2 - i) // 3,
+                    "責任者人数": int(i == 0) * row["責任者人数"],
+                }
+            )
+    slot_calendar_df = pd.DataFrame(rows)
+
+    staff_penalty = {s: 50 for s in staff_df["スタッフID"]}
+    staff_ng_date = {s: "すべてOK" for s in staff_df["スタッフID"]}
+    off_penalty = 50
+    shift_sch = SlotShiftScheduler()
+    shift_sch.set_data(
+        staff_df, slot_calendar_df, staff_penalty, staff_ng_date, off_penalty
+    )
+    shift_sch.show()
+
+    shift_sch.build_model()
+    print(
+        "slot variables: {slot_variables} / {dense_slot_variables}"
+        " (saved {saved_ratio:.1%})".format(**shift_sch.sparsity)
+    )
+
+    shift_sch.solve()
+
+    print(shift_sch.slot_df)
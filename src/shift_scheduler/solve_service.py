@@ -0,0 +1,387 @@
+"""ローカルで動かす最適化サービス
+
+各Streamlitセッションが個別にCBCを起動するとマシンが過負荷になるため、
+最適化はこのサービスに集約し、共有のプロセスプールで同時実行数を制限する。
+キューはクライアント（セッション）ごとに分け、ラウンドロビンで取り出すことで
+1人が大量に投入しても他の利用者が待たされすぎないようにする。
+
+起動:
+    python -m src.shift_scheduler.solve_service --port 8765 --workers 4
+
+API:
+    POST /solve   {"client_id": "...", "payload": {...}}  -> 最適化結果
+                  （本文が不正なJSONかpayloadがなければ400）
+    GET  /status  -> キューの状況
+
+サービスに接続できない場合のアプリ内での最適化（solve_local）は、環境変数
+SHIFT_SOLVE_LOCAL_FALLBACKを"1"にした場合だけ行い、同時実行数は
+SHIFT_SOLVE_LOCAL_WORKERS（既定1）までに制限する。
+
+payloadにhistory（HistoryStore.loadの結果）とweekend_dates（土日の日付）があれば、
+過去の勤務履歴による公平性のコストを目的関数に加える（ShiftScheduler.set_history）。
+payloadのprofile_memoryがtrueなら、フェーズごとのピークメモリも計測して結果のperfに含める。
+payloadのsensitivityがtrueなら、必要人数と希望出勤日数の限界値（LP緩和の双対変数）も
+サービス側で求めて結果に含める（lp_bound, sensitivity_dates, sensitivity_staff）。
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pulp
+
+from src.shift_scheduler.model_cache import default_cache
+from src.shift_scheduler.sensitivity import shadow_prices
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+from src.shift_scheduler.tuning import set_max_threads, threads_per_worker
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+LOCAL_FALLBACK_ENV = "SHIFT_SOLVE_LOCAL_FALLBACK"
+LOCAL_WORKERS_ENV = "SHIFT_SOLVE_LOCAL_WORKERS"
+
+_local_slots = (
+    None  # プロセス内で同時に実行できるsolve_localの数（最初の呼び出しで作る）
+)
+_local_lock = threading.Lock()
+
+
+def build_payload(staff_df, calendar_df, staff_penalty, staff_ng_date, off_penalty):
+    # set_dataの引数をJSONで送れる形に変換する
+    return {
+        "staff": json.loads(staff_df.to_json(orient="split", index=False)),
+        "calendar": json.loads(calendar_df.to_json(orient="split", index=False)),
+        "staff_penalty": {str(s): int(v) for s, v in staff_penalty.items()},
+        "staff_ng_date": {str(s): str(v) for s, v in staff_ng_date.items()},
+        "off_penalty": int(off_penalty),
+    }
+
+
+def encode_frame(df):
+    return {
+        "index": df.index.tolist(),
+        "index_name": df.index.name,
+        "columns": df.columns.tolist(),
+        "data": df.values.tolist(),
+    }
+
+
+def decode_frame(frame):
+    df = pd.DataFrame(frame["data"], index=frame["index"], columns=frame["columns"])
+    df.index.name = frame.get("index_name")
+    return df
+
+
+def sensitivity_of(shift_scheduler):
+    # LP緩和が解けなければNone
+    try:
+        return shadow_prices(shift_scheduler)
+    except ValueError:
+        return None
+
+
+def solve_payload(payload):
+    start = time.perf_counter()
+    staff_df = pd.DataFrame(
+        payload["staff"]["data"], columns=payload["staff"]["columns"]
+    )
+    calendar_df = pd.DataFrame(
+        payload["calendar"]["data"], columns=payload["calendar"]["columns"]
+    )
+
+    # JSONのキーは文字列になるため、スタッフIDはスタッフ情報の値（整数のIDなど）に、
+    # 休暇希望日は文字列で送られるため、カレンダーの日付（整数の日番号など）に戻す
+    staff_lookup = {str(s): s for s in staff_df["スタッフID"]}
+    date_lookup = {str(d): d for d in calendar_df["日付"]}
+    staff_penalty = {
+        staff_lookup.get(s, s): v for s, v in payload["staff_penalty"].items()
+    }
+    staff_ng_date = {
+        staff_lookup.get(s, s): date_lookup.get(d, d)
+        for s, d in payload["staff_ng_date"].items()
+    }
+
+    shift_scheduler = ShiftScheduler()
+    if payload.get("profile_memory"):
+        shift_scheduler.perf.trace_memory = True
+    shift_scheduler.set_data(
+        staff_df,
+        calendar_df,
+        staff_penalty,
+        staff_ng_date,
+        payload["off_penalty"],
+    )
+    if "history" in payload:
+        shift_scheduler.set_history(
+            decode_frame(payload["history"]),
+            [date_lookup.get(str(d), d) for d in payload["weekend_dates"]],
+        )
+    # スタッフと日付などの構造が前回と同じなら、構築済みのモデルの数値だけを更新して使う
+    cache = default_cache()
+    cache.checkout(shift_scheduler)
+    # 貪欲法の解が下界に達していればソルバーは使わない
+    solver_options = {"greedy": True, **payload.get("solver_options", {})}
+    # relaxedなら、LP緩和を丸めた下書きのシフト表を1つだけ返す
+    if payload.get("relaxed"):
+        solver_options["relaxed"] = True
+
+    # 限界値はLP緩和の双対変数から求める
+    # 厳密解ではsolve_poolが除外の制約式を加えるため求解の前に、
+    # 下書きでは求解で解いたLP緩和の双対変数をそのまま使うため求解の後に求める
+    sensitivity = None
+    if payload.get("sensitivity") and not payload.get("relaxed"):
+        sensitivity = sensitivity_of(shift_scheduler)
+
+    # pool_sizeが2以上なら、目的関数値が同程度の代替シフト表も列挙する
+    pool_size = 1 if payload.get("relaxed") else payload.get("pool_size", 1)
+    if pool_size > 1:
+        shift_scheduler.solve_pool(
+            pool_size, payload.get("pool_tolerance", 0.0), **solver_options
+        )
+    if pool_size > 1 and shift_scheduler.sch_pool:
+        status = pulp.LpStatus[pulp.LpStatusOptimal]
+        sch_pool = shift_scheduler.sch_pool
+        objectives = shift_scheduler.objective_pool
+    else:
+        if pool_size <= 1:
+            shift_scheduler.solve(**solver_options)
+        status = pulp.LpStatus[shift_scheduler.status]
+        sch_pool = [shift_scheduler.sch_df]
+        objectives = [pulp.value(shift_scheduler.model.objective)]
+    if payload.get("sensitivity") and payload.get("relaxed"):
+        sensitivity = sensitivity_of(shift_scheduler)
+
+    result = {
+        "status": status,
+        "objective": objectives[0],
+        "objectives": objectives,
+        "gap": shift_scheduler.gap,
+        "schedules": [encode_frame(sch_df) for sch_df in sch_pool],
+        "solve_time": time.perf_counter() - start,
+        "perf": shift_scheduler.perf.to_dict(),
+    }
+    if sensitivity is not None:
+        result["lp_bound"] = sensitivity["lp_bound"]
+        result["sensitivity_dates"] = encode_frame(sensitivity["dates"])
+        result["sensitivity_staff"] = encode_frame(sensitivity["staff"])
+    cache.release(shift_scheduler)
+    return result
+
+
+class SolveJob:
+    def __init__(self, client_id, payload):
+        self.client_id = client_id
+        self.payload = payload
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SolveBroker:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count()
+        self.executor = self._new_executor()
+
+        # クライアントごとの待ち行列（挿入順でラウンドロビンする）
+        self.queues = OrderedDict()
+        self.running = 0
+        self.condition = threading.Condition()
+
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def _new_executor(self):
+        # ソルバーのスレッド数は、合計がコア数を超えないようにワーカーごとに制限する
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=set_max_threads,
+            initargs=(threads_per_worker(self.max_workers),),
+        )
+
+    def submit(self, client_id, payload):
+        job = SolveJob(client_id, payload)
+        with self.condition:
+            self.queues.setdefault(client_id, deque()).append(job)
+            self.condition.notify_all()
+        return job
+
+    def status(self):
+        with self.condition:
+            return {
+                "max_workers": self.max_workers,
+                "running": self.running,
+                "queued": {c: len(q) for c, q in self.queues.items()},
+            }
+
+    def _next_job(self):
+        # 先頭のクライアントから1件取り出し、そのクライアントを末尾に回す
+        client_id, queue = next(iter(self.queues.items()))
+        job = queue.popleft()
+        del self.queues[client_id]
+        if queue:
+            self.queues[client_id] = queue
+        return job
+
+    def _dispatch(self):
+        while True:
+            with self.condition:
+                while not self.queues or self.running >= self.max_workers:
+                    self.condition.wait()
+                job = self._next_job()
+                self.running += 1
+
+            job.started_at = time.perf_counter()
+            # 投入に失敗してもディスパッチャーは止めず、このジョブだけを失敗とする
+            # （ワーカーが異常終了してプロセスプールが壊れた場合は作り直す）
+            try:
+                future = self.executor.submit(solve_payload, job.payload)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self.executor = self._new_executor()
+                job.error = str(e) or type(e).__name__
+                self._release(job)
+                continue
+            future.add_done_callback(lambda f, job=job: self._finish(job, f))
+
+    def _finish(self, job, future):
+        try:
+            job.result = future.result()
+            job.result["queue_time"] = job.started_at - job.submitted_at
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+        self._release(job)
+
+    def _release(self, job):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+        job.done.set()
+
+
+class SolveRequestHandler(BaseHTTPRequestHandler):
+    broker = None
+
+    def do_GET(self):
+        if self.path != "/status":
+            self.send_error(404)
+            return
+        self._send_json(200, self.broker.status())
+
+    def do_POST(self):
+        if self.path != "/solve":
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            payload = request["payload"]
+            if not isinstance(payload, dict):
+                raise TypeError("payload")
+        except (ValueError, KeyError, TypeError):
+            self._send_json(
+                400,
+                {
+                    "error": 'リクエストの本文は{"client_id": ..., "payload": {...}}のJSONにしてください'
+                },
+            )
+            return
+
+        job = self.broker.submit(request.get("client_id", "anonymous"), payload)
+        job.done.wait()
+        if job.error is not None:
+            self._send_json(500, {"error": job.error})
+        else:
+            self._send_json(200, job.result)
+
+    def _send_json(self, code, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def submit(payload, client_id="anonymous", url=None, timeout=None):
+    # サービスに最適化を依頼し、結果（sch_dfを含む辞書）を返す
+    url = url or os.environ.get("SHIFT_SOLVE_SERVICE_URL", DEFAULT_URL)
+    request = urllib.request.Request(
+        f"{url}/solve",
+        data=json.dumps({"client_id": client_id, "payload": payload}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.loads(e.read()).get("error", str(e))) from e
+
+    return _to_result(result)
+
+
+def local_fallback_enabled():
+    # サービスに接続できない場合に、アプリ内で最適化してよいか
+    return os.environ.get(LOCAL_FALLBACK_ENV, "") not in ("", "0")
+
+
+def solve_local(payload):
+    # サービスが起動していない場合に同じ処理をプロセス内で実行する
+    # セッションごとにCBCが並ばないように、同時実行数を制限する（空くまで待つ）
+    global _local_slots
+    with _local_lock:
+        if _local_slots is None:
+            workers = int(os.environ.get(LOCAL_WORKERS_ENV) or 1)
+            _local_slots = threading.BoundedSemaphore(max(1, workers))
+    with _local_slots:
+        return _to_result(solve_payload(payload))
+
+
+def _to_result(result):
+    result["sch_pool"] = [
+        decode_frame(schedule) for schedule in result.pop("schedules")
+    ]
+    result["sch_df"] = result["sch_pool"][0]
+    for name in ["sensitivity_dates", "sensitivity_staff"]:
+        if name in result:
+            result[name] = decode_frame(result[name])
+    return result
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, max_workers=None):
+    SolveRequestHandler.broker = SolveBroker(max_workers)
+    server = ThreadingHTTPServer((host, port), SolveRequestHandler)
+    print(
+        f"solve service: http://{host}:{port} (workers={SolveRequestHandler.broker.max_workers})"
+    )
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="シフト最適化サービス")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="同時実行数の上限"
+    )
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
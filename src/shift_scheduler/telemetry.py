@@ -0,0 +1,106 @@
+"""最適化の実行履歴（テレメトリ）をSQLiteに保存する
+
+ShiftSchedulerのsolveごとに、入力データのハッシュ、インスタンスの大きさ、
+ソルバー、フェーズごとの処理時間、ステータス、目的関数値などを1行追加する。
+保存先は環境変数SHIFT_TELEMETRY_DBで変更でき、空文字列にすると記録しない。
+TelemetryStoreを作っただけではファイルを開かず、記録・読み込みのたびに接続を開いて
+（テーブルがなければ作り）、終わったら閉じる。
+LNSやsolve_poolのように内部でsolveを繰り返す処理も、呼び出し1回につき1行とする。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+DEFAULT_PATH = "telemetry.sqlite"
+
+COLUMNS = [
+    ("created_at", "REAL"),  # 記録時刻（UNIX時間）
+    ("instance_name", "TEXT"),  # 店舗名などのインスタンス名
+    ("input_hash", "TEXT"),  # 入力データのハッシュ
+    ("num_staff", "INTEGER"),  # スタッフ数
+    ("num_dates", "INTEGER"),  # 日数
+    ("backend", "TEXT"),  # ソルバー
+    ("num_variables", "INTEGER"),
+    ("num_constraints", "INTEGER"),
+    ("num_nonzeros", "INTEGER"),
+    ("phases", "TEXT"),  # フェーズごとの処理時間（JSON）
+    ("total_time", "REAL"),  # フェーズの経過時間の合計[秒]
+    ("status", "TEXT"),  # 最適化のステータス
+    ("mode", "TEXT"),  # 解き方（exact: 整数計画、relaxed: LP緩和の丸めによる下書き）
+    ("limit_reached", "INTEGER"),  # 制限時間などで打ち切られたか
+    ("objective", "REAL"),
+    ("gap", "REAL"),  # 目的関数値と下界の相対ギャップ（不明ならNULL）
+    ("solver_settings", "TEXT"),  # ソルバーに渡した設定（JSON）
+]
+
+
+def input_hash(*items):
+    # データフレームや辞書をまとめて1つのハッシュ値にする
+    h = hashlib.sha256()
+    for item in items:
+        if isinstance(item, pd.DataFrame):
+            h.update(item.to_csv(index=False).encode("utf-8"))
+        else:
+            h.update(json.dumps(item, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class TelemetryStore:
+    def __init__(self, path=None):
+        # ファイルは記録・読み込みまで開かない
+        self.path = path or DEFAULT_PATH
+
+    def _create_table(self, conn):
+        columns = ", ".join(f"{name} {type_}" for name, type_ in COLUMNS)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS solves ({columns})")
+        # 以前のバージョンで作ったファイルには、後から追加した列を足す
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(solves)")}
+        for name, type_ in COLUMNS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE solves ADD COLUMN {name} {type_}")
+
+    @classmethod
+    def default(cls):
+        # 環境変数で無効化されていなければ既定の保存先を使う
+        path = os.environ.get("SHIFT_TELEMETRY_DB", DEFAULT_PATH)
+        if not path:
+            return None
+        return cls(path)
+
+    @contextmanager
+    def _connect(self):
+        # バッチ実行では複数プロセスから同時に書き込むため、ロック待ちを長めにする
+        # （sqlite3の接続のwithはコミットするだけで閉じないため、明示的に閉じる）
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                self._create_table(conn)
+                yield conn
+        finally:
+            conn.close()
+
+    def append(self, record):
+        record = dict(record, created_at=record.get("created_at", time.time()))
+        for name in ["phases", "solver_settings"]:
+            if isinstance(record.get(name), dict):
+                record[name] = json.dumps(record[name])
+        names = [name for name, _ in COLUMNS if name in record]
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO solves ({', '.join(names)}) "
+                f"VALUES ({', '.join('?' for _ in names)})",
+                [record[name] for name in names],
+            )
+
+    def load(self):
+        with self._connect() as conn:
+            df = pd.read_sql_query("SELECT * FROM solves ORDER BY created_at", conn)
+        df["created_at"] = pd.to_datetime(df["created_at"], unit="s")
+        df["size"] = df["num_staff"] * df["num_dates"]
+        return df
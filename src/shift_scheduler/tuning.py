@@ -0,0 +1,105 @@
+"""インスタンスの特徴量によるソルバー設定の自動選択
+
+set_data済みのShiftSchedulerから、モデルを解かずに求まる特徴量
+（大きさ、休暇希望の密度、必要人数の厳しさなど）を計算し、
+ルールファイル（solver_rules.json）の条件に最初に一致した設定をPULP_CBC_CMDに渡す。
+ルールファイルはbenchmarks/fit_solver_rules.pyでベンチマークの結果から作成する。
+
+ルールで選ぶのは解の値を変えない設定（スレッド数、presolve、cuts）だけとし、
+timeLimitやgapRelは呼び出し側がsolver_optionsで指定した場合にだけ使う。
+スレッド数は環境変数SHIFT_SOLVER_MAX_THREADSの値（なければCPU数）を上限とする。
+バッチ実行や最適化サービスのプロセスプールは、CPU数をワーカー数で割った値を各ワーカーに設定する。
+
+ルールファイルの形式:
+    {"rules": [
+        {"if": {"num_variables": [null, 2000]}, "settings": {"threads": 1, ...}},
+        {"if": {}, "settings": {...}}
+    ]}
+条件は特徴量ごとの[下限, 上限)の範囲で、nullは上限・下限なしを表す。
+"""
+
+import json
+import os
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "solver_rules.json")
+
+# ルールに使える設定（PULP_CBC_CMDの引数のうち、最適値を変えないもの）
+SETTINGS = ["threads", "presolve", "cuts"]
+
+MAX_THREADS_ENV = "SHIFT_SOLVER_MAX_THREADS"
+
+
+def instance_features(shift_scheduler):
+    sch = shift_scheduler
+    dates = set(sch.D)
+    # 各スタッフが出勤できる日数の上限（希望最大出勤日数と出勤可能日数の小さいほう）
+    capacity = sum(min(sch.S2max_shift[s], len(sch.S2dates[s])) for s in sch.S)
+    skill_tightness = [
+        sum(sch.KD2required[k, d] for d in sch.D)
+        / max(1, sum(len(sch.S2dates[s]) for s in sch.K2staff[k]))
+        for k in sch.K
+    ]
+    return {
+        "num_staff": len(sch.S),
+        "num_dates": len(sch.D),
+        "num_variables": len(sch.SD),
+        # 出勤可能な組の割合
+        "density": len(sch.SD) / max(1, len(sch.S) * len(sch.D)),
+        # 期間内に休暇希望日があるスタッフの割合
+        "ng_ratio": sum(sch.S2ng_date[s] in dates for s in sch.S) / max(1, len(sch.S)),
+        # 必要人数の合計と、希望最大出勤日数まで出勤した場合の延べ人数の比
+        "coverage_tightness": sum(sch.D2required_staff.values()) / max(1, capacity),
+        # スキルを持つスタッフの出勤可能日数に対するスキルごとの必要人数の比の最大値
+        "skill_tightness": max(skill_tightness, default=0.0),
+        "num_windows": len(sch.active_windows()),
+    }
+
+
+def load_rules(path=None):
+    # ルールファイルがなければNone（自動選択しない）
+    path = path or DEFAULT_RULES_PATH
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["rules"]
+
+
+def matches(condition, features):
+    for name, (low, high) in condition.items():
+        value = features[name]
+        if low is not None and value < low:
+            return False
+        if high is not None and value >= high:
+            return False
+    return True
+
+
+def max_threads():
+    # 1回の求解に使ってよいスレッド数
+    value = os.environ.get(MAX_THREADS_ENV)
+    return int(value) if value else os.cpu_count() or 1
+
+
+def set_max_threads(threads):
+    # プロセスプールのinitializerとして各ワーカーで呼ぶ
+    os.environ[MAX_THREADS_ENV] = str(threads)
+
+
+def threads_per_worker(workers):
+    # ワーカーを並べても合計がCPU数を超えないようにする
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def select_settings(features, rules):
+    # 条件に最初に一致したルールの設定（値がnullの設定はソルバーの既定値を使う）
+    for rule in rules or []:
+        if matches(rule["if"], features):
+            settings = {
+                name: value
+                for name, value in rule["settings"].items()
+                if name in SETTINGS and value is not None
+            }
+            if "threads" in settings:
+                settings["threads"] = min(settings["threads"], max_threads())
+            return settings
+    return {}
@@ -0,0 +1,194 @@
+"""外部で作成されたシフト表の検証と採点
+
+output.csvと同じ形式（行がスタッフID、列が日付、値が0/1）のシフト表を
+staff.csv・calendar.csvと突き合わせ、出勤人数・責任者などのスキルごとの人数の充足、
+希望出勤日数、休暇希望を検証し、ShiftScheduler_8_2と同じ目的関数値を計算する。
+集計はすべてNumPyの配列演算で行う。
+
+使い方:
+    python -m src.shift_scheduler.validator output.csv staff.csv calendar.csv
+    python -m src.shift_scheduler.validator output.csv staff.csv calendar.csv \\
+        --penalty penalty.csv --ng-date ng_date.csv --off-penalty 50
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src.shift_scheduler.batch import DEFAULT_PENALTY, read_instance
+from src.shift_scheduler.ShiftScheduler_8_2 import find_skills
+
+
+def load_schedule(path_or_buffer):
+    # 1列目をスタッフIDとしてシフト表を読み込む
+    sch_df = pd.read_csv(path_or_buffer, index_col=0)
+    sch_df.index = sch_df.index.astype(str)
+    return sch_df
+
+
+def validate(
+    sch_df,
+    staff_df,
+    calendar_df,
+    staff_penalty=None,
+    staff_ng_date=None,
+    off_penalty=DEFAULT_PENALTY,
+    max_consecutive=None,
+    min_rest=None,
+):
+    S = staff_df["スタッフID"].astype(str).to_numpy()
+    D = calendar_df["日付"].astype(str).to_numpy()
+    errors = []
+
+    # シフト表をスタッフ・日付の順に並べ替える（存在しない行・列は0として扱う）
+    sch_df = sch_df.copy()
+    sch_df.index = sch_df.index.astype(str)
+    sch_df.columns = sch_df.columns.astype(str)
+    unknown_staff = sch_df.index.difference(S)
+    unknown_dates = sch_df.columns.difference(D)
+    if len(unknown_staff) > 0:
+        errors.append(f"スタッフ情報にないスタッフ: {list(unknown_staff)}")
+    if len(unknown_dates) > 0:
+        errors.append(f"カレンダー情報にない日付: {list(unknown_dates)}")
+    missing_staff = pd.Index(S).difference(sch_df.index)
+    if len(missing_staff) > 0:
+        errors.append(f"シフト表にないスタッフ: {list(missing_staff)}")
+    x = sch_df.reindex(index=S, columns=D, fill_value=0).to_numpy()
+    if not np.isin(x, [0, 1]).all():
+        errors.append("シフト表に0/1以外の値があります")
+    x = (x > 0).astype(np.int64)
+
+    # 定数の配列
+    K = find_skills(staff_df, calendar_df)
+    skill_matrix = staff_df[[f"{k}フラグ" for k in K]].to_numpy(dtype=np.int64).T
+    required_skill = calendar_df[[f"{k}人数" for k in K]].to_numpy(dtype=np.int64).T
+    min_shift = staff_df["希望最小出勤日数"].to_numpy(dtype=np.int64)
+    max_shift = staff_df["希望最大出勤日数"].to_numpy(dtype=np.int64)
+    required_staff = calendar_df["出勤人数"].to_numpy(dtype=np.int64)
+    staff_penalty = staff_penalty or {}
+    penalty_weight = np.array(
+        [staff_penalty.get(s, DEFAULT_PENALTY) for s in staff_df["スタッフID"]]
+    )
+
+    # 休暇希望日のマスク（スタッフ×日付）
+    ng_mask = np.zeros_like(x, dtype=bool)
+    if staff_ng_date:
+        D2index = {d: j for j, d in enumerate(D)}
+        rows, cols = [], []
+        for i, s in enumerate(staff_df["スタッフID"]):
+            j = D2index.get(str(staff_ng_date.get(s, "すべてOK")))
+            if j is not None:
+                rows.append(i)
+                cols.append(j)
+        ng_mask[rows, cols] = True
+
+    # 日ごとの充足
+    date_total = x.sum(axis=0)
+    date_short = np.maximum(0, required_staff - date_total)
+    # スキル（責任者を含む）ごとの人数はスキル行列とシフト表の積で求める
+    date_skill = skill_matrix @ x
+    skill_short = np.maximum(0, required_skill - date_skill)
+
+    # スタッフごとの希望違反
+    staff_total = x.sum(axis=1)
+    under = np.maximum(0, min_shift - staff_total)
+    over = np.maximum(0, staff_total - max_shift)
+    ng_violations = (x & ng_mask).sum(axis=1)
+    penalty = penalty_weight * (under + over) + off_penalty * ng_violations
+
+    # 連続勤務・休日の規則（期間の長さ, 最大出勤日数）に違反する期間の数
+    windows = []
+    if max_consecutive is not None:
+        windows.append((max_consecutive + 1, max_consecutive))
+    if min_rest is not None:
+        windows.append((min_rest[0], min_rest[0] - min_rest[1]))
+    cumsum = np.concatenate(
+        [np.zeros((len(S), 1), dtype=np.int64), x.cumsum(axis=1)], axis=1
+    )
+    window_violations = np.zeros(len(S), dtype=np.int64)
+    for w, m in windows:
+        if w <= len(D):
+            window_violations += (cumsum[:, w:] - cumsum[:, :-w] > m).sum(axis=1)
+
+    staff_report = pd.DataFrame(
+        {
+            "出勤日数": staff_total,
+            "希望最小出勤日数": min_shift,
+            "希望最大出勤日数": max_shift,
+            "不足日数": under,
+            "超過日数": over,
+            "休暇希望違反": ng_violations,
+            "連続勤務・休日の違反": window_violations,
+            "ペナルティ": penalty,
+        },
+        index=staff_df["スタッフID"],
+    )
+    date_report = pd.DataFrame(
+        {
+            "出勤人数": date_total,
+            "必要人数": required_staff,
+            "不足人数": date_short,
+        },
+        index=calendar_df["日付"],
+    )
+    for i, k in enumerate(K):
+        date_report[f"{k}人数"] = date_skill[i]
+        date_report[f"必要{k}人数"] = required_skill[i]
+        date_report[f"{k}不足人数"] = skill_short[i]
+    return {
+        # 出勤人数・スキルごとの人数はShiftSchedulerでは必ず満たす制約
+        "feasible": not errors
+        and date_short.sum() == 0
+        and skill_short.sum() == 0
+        and window_violations.sum() == 0,
+        "objective": float(penalty.sum()),
+        "errors": errors,
+        "staff": staff_report,
+        "dates": date_report,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="シフト表の検証と採点")
+    parser.add_argument("schedule", help="検証するシフト表のCSV")
+    parser.add_argument("staff", help="スタッフ情報のCSV")
+    parser.add_argument("calendar", help="カレンダー情報のCSV")
+    parser.add_argument("--penalty", help="スタッフごとのペナルティのCSV")
+    parser.add_argument("--ng-date", help="スタッフごとの休暇希望日のCSV")
+    parser.add_argument("--off-penalty", type=int, default=DEFAULT_PENALTY)
+    parser.add_argument("--max-consecutive", type=int, help="最大連続出勤日数")
+    parser.add_argument(
+        "--min-rest",
+        type=int,
+        nargs=2,
+        metavar=("WINDOW", "DAYS"),
+        help="期間内の最低休日数",
+    )
+    args = parser.parse_args(argv)
+
+    instance = {"staff": args.staff, "calendar": args.calendar}
+    if args.penalty:
+        instance["penalty"] = args.penalty
+    if args.ng_date:
+        instance["ng_date"] = args.ng_date
+    instance["off_penalty"] = args.off_penalty
+    report = validate(
+        load_schedule(args.schedule),
+        *read_instance(instance),
+        max_consecutive=args.max_consecutive,
+        min_rest=args.min_rest,
+    )
+
+    for error in report["errors"]:
+        print("error:", error)
+    print(report["dates"].to_string())
+    print(report["staff"].to_string())
+    print("feasible:", report["feasible"])
+    print("objective:", report["objective"])
+    return 0 if report["feasible"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""1つのExcelワークブック（xlsx）からスタッフ・カレンダー・ペナルティ・休暇希望を読む
+
+シート名と列はCSVと同じ形式とする。
+- スタッフ（必須）: staff.csvと同じ列
+- カレンダー（必須）: calendar.csvと同じ列
+- ペナルティ（任意）: スタッフID, ペナルティ
+- 休暇希望（任意）: スタッフID, 休暇希望日
+
+openpyxlの読み取り専用モードで行ごとに値だけを読み、セルのオブジェクトを作らない。
+カレンダーの日付がExcelの日付型なら、calendar_builderと同じく整数の日番号を「日付」、
+実際の日付を「年月日」とし、休暇希望日も日番号に変換する。
+読み込んだ結果はファイルの内容のハッシュでキャッシュするため、
+Streamlitの再実行で同じファイルを何度読んでも解析は1回で済む。
+
+ペナルティと休暇希望日は、シートにあるスタッフの分だけの辞書として返す
+（ないスタッフの既定値はbatch.read_instanceやアプリの側で補う）。
+
+使い方:
+    staff_df, calendar_df, staff_penalty, staff_ng_date = read_workbook("shift.xlsx")
+"""
+
+import datetime
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+SHEETS = {
+    "staff": "スタッフ",
+    "calendar": "カレンダー",
+    "penalty": "ペナルティ",
+    "ng_date": "休暇希望",
+}
+
+DEFAULT_CACHE_SIZE = 8
+
+_cache = OrderedDict()  # ファイルのハッシュ -> 読み込んだ結果
+_lock = threading.Lock()
+
+
+def read_sheet(worksheet):
+    # 1行目を列名とし、空の行と列名のない列を除いたデータフレーム
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    keep = [j for j, name in enumerate(header) if name is not None]
+    records = [
+        [row[j] if j < len(row) else None for j in keep]
+        for row in rows
+        if any(value is not None for value in row)
+    ]
+    columns = [str(header[j]).strip() for j in keep]
+    if not records:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(
+        {name: list(values) for name, values in zip(columns, zip(*records))}
+    )
+
+
+def parse_workbook(data):
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        missing = [
+            SHEETS[key]
+            for key in ["staff", "calendar"]
+            if SHEETS[key] not in workbook.sheetnames
+        ]
+        if missing:
+            raise ValueError(f"ワークブックに必要なシートがありません: {missing}")
+        frames = {
+            key: read_sheet(workbook[name])
+            for key, name in SHEETS.items()
+            if name in workbook.sheetnames
+        }
+    finally:
+        workbook.close()
+
+    staff_df = frames["staff"]
+    staff_df["スタッフID"] = staff_df["スタッフID"].astype(str)
+    calendar_df = frames["calendar"]
+
+    # Excelの日付型の日付は、整数の日番号と年月日に分ける
+    date2index = {}
+    dates = calendar_df["日付"]
+    if len(dates) > 0 and dates.map(lambda d: isinstance(d, datetime.date)).all():
+        calendar_df.insert(1, "年月日", pd.to_datetime(dates))
+        calendar_df["日付"] = np.arange(len(calendar_df))
+        date2index = dict(zip(calendar_df["年月日"], calendar_df["日付"]))
+    # 人数の列は整数にする（空のセルは0）
+    for column in calendar_df.columns:
+        if column.endswith("人数"):
+            calendar_df[column] = calendar_df[column].fillna(0).astype(np.int64)
+
+    staff_penalty = {}
+    if "penalty" in frames:
+        penalty_df = frames["penalty"].dropna()
+        staff_penalty.update(
+            zip(
+                penalty_df["スタッフID"].astype(str),
+                penalty_df["ペナルティ"].astype(np.int64),
+            )
+        )
+
+    staff_ng_date = {}
+    if "ng_date" in frames:
+        ng_date_df = frames["ng_date"].dropna()
+        for s, d in zip(ng_date_df["スタッフID"].astype(str), ng_date_df["休暇希望日"]):
+            if isinstance(d, datetime.date):
+                d = date2index.get(pd.Timestamp(d), "すべてOK")
+            staff_ng_date[s] = d
+    return staff_df, calendar_df, staff_penalty, staff_ng_date
+
+
+def read_workbook(path_or_bytes, cache_size=DEFAULT_CACHE_SIZE):
+    # パスかファイルの内容（bytes）から、スタッフ・カレンダーのデータフレームと
+    # ペナルティ・休暇希望日の辞書を返す
+    if isinstance(path_or_bytes, bytes):
+        data = path_or_bytes
+    else:
+        with open(path_or_bytes, "rb") as f:
+            data = f.read()
+    key = hashlib.sha256(data).hexdigest()
+    with _lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+    if result is None:
+        result = parse_workbook(data)
+        with _lock:
+            _cache[key] = result
+            while len(_cache) > cache_size:
+                _cache.popitem(last=False)
+
+    # キャッシュした結果が呼び出し側で書き換えられないようにコピーを返す
+    staff_df, calendar_df, staff_penalty, staff_ng_date = result
+    return staff_df.copy(), calendar_df.copy(), dict(staff_penalty), dict(staff_ng_date)
@@ -0,0 +1,28 @@
+import datetime
+
+import pytest
+
+from src.shift_scheduler.calendar_builder import build_calendar
+from src.shift_scheduler.history import calendar_weekend_dates, weekend_dates
+
+
+def test_weekend_dates():
+    assert weekend_dates(["7月1日", "7月2日", "7月3日"], 2023) == ["7月1日", "7月2日"]
+    assert weekend_dates([datetime.date(2024, 4, 6), "2024-04-08"], 2024) == [
+        datetime.date(2024, 4, 6)
+    ]
+    # 整数の日番号は期間の開始日から数える（2024-04-01は月曜日）
+    assert weekend_dates(range(7), 2024, start="2024-04-01") == [5, 6]
+    assert weekend_dates(["5", "6", "7"], 2024, start="2024-04-01") == ["5", "6"]
+    with pytest.raises(ValueError):
+        weekend_dates(range(7), 2024)
+    with pytest.raises(ValueError):
+        weekend_dates(["不明"], 2024)
+
+
+def test_calendar_weekend_dates():
+    # calendar_builderのカレンダーは「年月日」列の曜日から土日を決める
+    calendar_df = build_calendar(
+        "2024-04-01", "2024-04-14", {"既定": {"出勤人数": 1, "責任者人数": 1}}
+    )
+    assert calendar_weekend_dates(calendar_df) == [5, 6, 12, 13]
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from src.shift_scheduler.calendar_builder import build_calendar
+from src.shift_scheduler.history import HistoryStore, calendar_weekend_dates
+from src.shift_scheduler.ShiftScheduler_8_2 import ShiftScheduler
+
+
+def test_history_with_integer_staff_ids(tmp_path):
+    # 整数のスタッフIDでも、取り込んだ履歴がset_historyで使われる
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    sch_df = pd.DataFrame(
+        [[1, 1, 1, 1, 1, 1, 1], [0, 0, 0, 0, 0, 1, 0]],
+        index=[101, 102],
+        columns=range(7),
+    )
+    assert store.ingest(sch_df, "2024-03", {101: 5}, start="2024-03-01")
+    assert not store.ingest(sch_df, "2024-03", start="2024-03-01")
+    history_df = store.load()
+    assert history_df.loc["101", "ng_violations"] == 1
+
+    staff_df = pd.DataFrame(
+        {
+            "スタッフID": [101, 102],
+            "責任者フラグ": [1, 1],
+            "希望最小出勤日数": [0, 0],
+            "希望最大出勤日数": [7, 7],
+        }
+    )
+    calendar_df = build_calendar(
+        "2024-04-01", "2024-04-07", {"既定": {"出勤人数": 1, "責任者人数": 0}}
+    )
+    shift_scheduler = ShiftScheduler()
+    shift_scheduler.telemetry = None
+    shift_scheduler.set_data(
+        staff_df, calendar_df, {101: 50, 102: 50}, {101: 5, 102: "すべてOK"}, 50
+    )
+    shift_scheduler.set_history(history_df, calendar_weekend_dates(calendar_df))
+    assert {s for s, _ in shift_scheduler.SD2fairness} == {101}
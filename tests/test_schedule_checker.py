@@ -0,0 +1,37 @@
+import pandas as pd
+
+from src.shift_scheduler.calendar_builder import build_calendar
+from src.shift_scheduler.schedule_checker import ScheduleChecker
+
+
+def make_checker():
+    # 日付が整数の日番号のカレンダー（calendar_builderやワークブックの形式）
+    staff_df = pd.DataFrame(
+        {
+            "スタッフID": ["A", "B"],
+            "責任者フラグ": [1, 0],
+            "希望最小出勤日数": [1, 1],
+            "希望最大出勤日数": [3, 3],
+        }
+    )
+    calendar_df = build_calendar(
+        "2024-04-01", "2024-04-07", {"既定": {"出勤人数": 1, "責任者人数": 1}}
+    )
+    sch_df = pd.DataFrame(0, index=staff_df["スタッフID"], columns=calendar_df["日付"])
+    return ScheduleChecker(sch_df, staff_df, calendar_df)
+
+
+def test_sync_editor_with_integer_dates():
+    checker = make_checker()
+    # st.data_editorのedited_rowsでは、行番号も列名も文字列になる
+    checker.sync_editor({"0": {"3": True}, "1": {"0": True, "6": True}})
+    assert checker.to_frame().loc["A", 3] == 1
+    assert checker.to_frame().loc["B", 0] == 1
+    assert checker.to_frame().loc["B", 6] == 1
+    assert checker.staff_total.tolist() == [1, 2]
+
+    # 修正を取り消したマスは元の値に戻る
+    checker.sync_editor({"1": {"0": True}})
+    assert checker.to_frame().loc["A", 3] == 0
+    assert checker.to_frame().loc["B", 6] == 0
+    assert checker.staff_total.tolist() == [0, 1]